@@ -0,0 +1,57 @@
+"""
+Local analytical store for adherence events (stand-in for BigQuery).
+
+Rows arrive as columnar buffers (one list per column) and each batch is
+written with a single executemany in a single transaction. event_id is the
+primary key, so events redelivered by Pub/Sub or the event log
+(at-least-once) are counted as duplicates instead of being stored twice.
+"""
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List
+
+ANALYTICS_DB_PATH = os.getenv("ANALYTICS_DB_PATH", "./analytics.db")
+
+COLUMNS = ("event_id", "user_id", "medication_id", "status", "timestamp", "ingested_at")
+
+
+class AdherenceStore:
+    def __init__(self, path: str = ANALYTICS_DB_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS adherence_events ("
+            " event_id TEXT PRIMARY KEY,"
+            " user_id TEXT NOT NULL,"
+            " medication_id TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " timestamp TEXT,"
+            " ingested_at TEXT NOT NULL)"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def insert_columns(self, columns: Dict[str, List[Any]]) -> int:
+        """Bulk-insert one batch; returns how many rows were new."""
+        rows = list(zip(*(columns[name] for name in COLUMNS)))
+        if not rows:
+            return 0
+        with self._lock:
+            before = self._conn.total_changes
+            with self._conn:
+                self._conn.executemany(
+                    f"INSERT OR IGNORE INTO adherence_events ({', '.join(COLUMNS)})"
+                    f" VALUES ({', '.join('?' for _ in COLUMNS)})",
+                    rows,
+                )
+            return self._conn.total_changes - before
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM adherence_events").fetchone()[0]
+
+    def close(self) -> None:
+        self._conn.close()
@@ -1,29 +1,135 @@
-import base64
+import binascii
 import json
 import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from adherence_store import COLUMNS, AdherenceStore
+
+ADHERENCE_TOPIC = "medication.adherence"
+CONSUMER_GROUP = os.getenv("ANALYTICS_CONSUMER_GROUP", "analytics")
+POLL_INTERVAL_SECONDS = float(os.getenv("ANALYTICS_POLL_INTERVAL_SECONDS", "1"))
+ANALYTICS_BATCH_SIZE = int(os.getenv("ANALYTICS_BATCH_SIZE", "5000"))
+DEAD_LETTER_PATH = os.getenv("ANALYTICS_DEAD_LETTER_PATH", "./dead_letter.jsonl")
+
+_store: Optional[AdherenceStore] = None
+
+
+def get_store() -> AdherenceStore:
+    global _store
+    if _store is None:
+        _store = AdherenceStore()
+    return _store
+
+
+def _utc_now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def decode_envelope(envelope: dict) -> Tuple[str, dict]:
+    """(event_id, message) from a Pub/Sub-style envelope with base64 ``data``."""
+    event_id = envelope.get("message_id") or envelope.get("messageId") or envelope.get("event_id")
+    if not event_id:
+        raise ValueError("envelope has no message id")
+    message = json.loads(binascii.a2b_base64(envelope["data"]))
+    if not isinstance(message, dict):
+        raise ValueError("message is not a JSON object")
+    return event_id, message
+
+
+def build_columns(messages: List[Tuple[str, dict]], ingested_at: str) -> Tuple[Dict[str, List[Any]], List[dict]]:
+    """
+    Columnar buffers for a batch of decoded messages, plus a dead-letter
+    entry for each message missing a required field.
+    """
+    columns: Dict[str, List[Any]] = {name: [] for name in COLUMNS}
+    failures: List[dict] = []
+    for event_id, message in messages:
+        data = message.get("data")
+        if not isinstance(data, dict):
+            data = {}
+        user_id, medication_id, status = message.get("user_id"), data.get("medication_id"), data.get("status")
+        if not (user_id and medication_id and status):
+            failures.append({"event_id": event_id, "error": "missing user_id, medication_id or status",
+                             "message": message})
+            continue
+        columns["event_id"].append(event_id)
+        columns["user_id"].append(user_id)
+        columns["medication_id"].append(medication_id)
+        columns["status"].append(status)
+        columns["timestamp"].append(message.get("timestamp"))
+        columns["ingested_at"].append(ingested_at)
+    return columns, failures
+
+
+def write_dead_letters(failures: List[dict]) -> None:
+    if not failures:
+        return
+    failed_at = _utc_now()
+    with open(DEAD_LETTER_PATH, "a") as f:
+        f.write("".join(json.dumps(dict(entry, failed_at=failed_at), default=str) + "\n" for entry in failures))
+
+
+def ingest_messages(messages: List[Tuple[str, dict]], store: Optional[AdherenceStore] = None,
+                    failures: Optional[List[dict]] = None) -> Dict[str, int]:
+    """Write a batch of decoded (event_id, message) pairs with one bulk insert."""
+    failures = list(failures or [])
+    received = len(messages) + len(failures)
+    columns, invalid = build_columns(messages, _utc_now())
+    failures.extend(invalid)
+    write_dead_letters(failures)
+    inserted = (store or get_store()).insert_columns(columns)
+    return {"received": received, "inserted": inserted,
+            "duplicates": len(columns["event_id"]) - inserted, "dead_lettered": len(failures)}
+
+
+def ingest_adherence_batch(envelopes: List[dict], store: Optional[AdherenceStore] = None) -> Dict[str, int]:
+    """
+    Batch entry point: decodes a list of Pub/Sub-style envelopes
+    (``{"message_id": ..., "data": <base64 JSON>}``) and bulk-inserts them.
+    Envelopes that fail to decode or validate go to the dead-letter file.
+    """
+    messages: List[Tuple[str, dict]] = []
+    failures: List[dict] = []
+    for envelope in envelopes:
+        try:
+            messages.append(decode_envelope(envelope))
+        except (KeyError, ValueError, TypeError, AttributeError) as e:
+            failures.append({"error": repr(e), "envelope": envelope})
+    return ingest_messages(messages, store, failures)
+
 
 def ingest_adherence_event(event, context):
     """Triggered from a message on a Cloud Pub/Sub topic."""
-    try:
-        if 'data' in event:
-            pubsub_message = base64.b64decode(event['data']).decode('utf-8')
-            message_json = json.loads(pubsub_message)
-            
-            print(f"Processing event: {message_json['event_type']}")
-            
-            # Transform for BigQuery
-            row = {
-                "event_id": context.event_id if hasattr(context, 'event_id') else "mock_id",
-                "user_id": message_json.get("user_id"),
-                "medication_id": message_json.get("data", {}).get("medication_id"),
-                "status": message_json.get("data", {}).get("status"),
-                "timestamp": message_json.get("timestamp"),
-                "ingested_at": "2023-10-27T10:00:00Z"
-            }
-            
-            print(f"[BigQuery] Inserted row: {row}")
-            return "Success"
-            
-    except Exception as e:
-        print(f"Error: {e}")
-        raise
+    envelope = dict(event, message_id=getattr(context, 'event_id', None) or event.get('message_id'))
+    result = ingest_adherence_batch([envelope])
+    print(f"[Analytics] Ingested adherence event: {result}")
+    return "Success"
+
+
+def consume_adherence_log(consumer=None, max_events: int = ANALYTICS_BATCH_SIZE) -> int:
+    """
+    Local counterpart of the Pub/Sub trigger: ingests the next batch of
+    adherence events from the event_bus log, then commits the consumer
+    position. Returns the number of events processed.
+    """
+    import event_bus
+
+    consumer = consumer or event_bus.Consumer(ADHERENCE_TOPIC, CONSUMER_GROUP)
+    events = consumer.poll(max_events)
+    if events:
+        result = ingest_messages([(event["id"], event["data"]) for event in events])
+        print(f"[Analytics] Ingested batch: {result}")
+    consumer.commit()
+    return len(events)
+
+
+if __name__ == "__main__":
+    import event_bus
+
+    consumer = event_bus.Consumer(ADHERENCE_TOPIC, CONSUMER_GROUP)
+    print(f"Consuming {ADHERENCE_TOPIC} from {event_bus.EVENT_LOG_DIR} as {CONSUMER_GROUP}")
+    while True:
+        if not consume_adherence_log(consumer):
+            time.sleep(POLL_INTERVAL_SECONDS)
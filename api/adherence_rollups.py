@@ -0,0 +1,217 @@
+"""
+Daily and weekly adherence rollups per (user, medication).
+
+``record`` adds one adherence event to both rollup tables with an upsert
+in the caller's session, so the counts commit in the same transaction as the
+raw AdherenceLog row. ``summary`` reads only the rollup tables, so its cost
+grows with the number of days in the window, not the number of events.
+
+``rebuild`` recomputes the rollups from adherence_logs, for backfills and
+repairs:
+
+    python -m api.adherence_rollups rebuild [--since YYYY-MM-DD]
+
+It deletes the affected rollup rows before reading the logs, so on SQLite
+it holds the write lock and concurrent adherence writes wait for it.
+"""
+import argparse
+import asyncio
+import os
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, inspect, select, text, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import database, models
+
+REBUILD_CHUNK_ROWS = int(os.getenv("ADHERENCE_REBUILD_CHUNK_ROWS", "50000"))
+
+TAKEN = "taken"
+ROLLUPS = {"day": models.AdherenceDailyRollup, "week": models.AdherenceWeeklyRollup}
+_KEY_COLUMNS = ("user_id", "medication_id", "period_start")
+
+
+def ensure_schema(conn: Connection) -> None:
+    """Add adherence_logs.user_id to a table created by an older build."""
+    columns = {column["name"] for column in inspect(conn).get_columns("adherence_logs")}
+    if "user_id" not in columns:
+        conn.execute(text("ALTER TABLE adherence_logs ADD COLUMN user_id VARCHAR"))
+
+
+database.schema_upgrades.append(ensure_schema)
+
+
+def parse_timestamp(timestamp: Optional[str]) -> Optional[datetime]:
+    """Naive UTC datetime of an ISO-8601 string, or None."""
+    try:
+        when = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+    if when.tzinfo is not None:
+        when = when.astimezone(timezone.utc).replace(tzinfo=None)
+    return when
+
+
+def period_starts(when: datetime) -> Tuple[str, str]:
+    """(day, Monday of its week) as YYYY-MM-DD."""
+    day = when.date()
+    return day.isoformat(), (day - timedelta(days=day.weekday())).isoformat()
+
+
+def _upsert(dialect: str, model, values: Dict[str, Any]):
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+    stmt = dialect_insert(model).values(**values)
+    return stmt.on_conflict_do_update(
+        index_elements=list(_KEY_COLUMNS),
+        set_={name: getattr(model, name) + getattr(stmt.excluded, name) for name in ("taken", "missed", "total")},
+    )
+
+
+async def record(db: AsyncSession, user_id: Optional[str], medication_id: Optional[str], status: Optional[str],
+                 timestamp: Optional[str]) -> None:
+    """
+    Count one adherence event in the daily and weekly rollups. Does not
+    commit; the caller commits it together with the AdherenceLog row. An
+    event with an unparseable timestamp is not counted, as in ``rebuild``.
+    """
+    when = parse_timestamp(timestamp)
+    if when is None:
+        return
+    taken = int(status == TAKEN)
+    dialect = db.bind.dialect.name
+    for model, start in zip(ROLLUPS.values(), period_starts(when)):
+        key = {"user_id": user_id or "", "medication_id": medication_id or "", "period_start": start}
+        counts = {"taken": taken, "missed": 1 - taken, "total": 1}
+        stmt = _upsert(dialect, model, dict(key, **counts))
+        if stmt is not None:
+            await db.execute(stmt)
+            continue
+        result = await db.execute(
+            update(model).where(*(getattr(model, name) == value for name, value in key.items()))
+            .values({name: getattr(model, name) + value for name, value in counts.items()})
+        )
+        if not result.rowcount:
+            await db.execute(insert(model).values(dict(key, **counts)))
+
+
+async def summary(db: AsyncSession, days: int = 30, granularity: str = "day", user_id: Optional[str] = None,
+                  medication_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Per-medication counts and adherence rate per period, read from the
+    rollups only, for one user ("" is anonymous logs) or, with None, everyone.
+    """
+    model = ROLLUPS[granularity]
+    first = datetime.utcnow().date() - timedelta(days=days - 1)
+    if granularity == "week":
+        first -= timedelta(days=first.weekday())
+    query = select(
+        model.medication_id, model.period_start,
+        func.sum(model.taken), func.sum(model.missed), func.sum(model.total),
+    ).where(model.period_start >= first.isoformat()) \
+        .group_by(model.medication_id, model.period_start) \
+        .order_by(model.medication_id, model.period_start)
+    if user_id is not None:
+        query = query.where(model.user_id == user_id)
+    if medication_id:
+        query = query.where(model.medication_id == medication_id)
+
+    medications: Dict[str, Dict[str, Any]] = {}
+    for med_id, period_start, taken, missed, total in (await db.execute(query)).all():
+        entry = medications.setdefault(med_id, {"medication_id": med_id, "taken": 0, "missed": 0, "total": 0,
+                                                "periods": []})
+        entry["taken"] += taken
+        entry["missed"] += missed
+        entry["total"] += total
+        entry["periods"].append({"period_start": period_start, "taken": taken, "missed": missed, "total": total,
+                                 "adherence_rate": _rate(taken, total)})
+
+    names = {}
+    if medications:
+        result = await db.execute(select(models.Medication.id, models.Medication.name)
+                                  .where(models.Medication.id.in_(list(medications))))
+        names = dict(result.all())
+    for entry in medications.values():
+        entry["adherence_rate"] = _rate(entry["taken"], entry["total"])
+        entry["name"] = names.get(entry["medication_id"])
+    return {"granularity": granularity, "days": days, "since": first.isoformat(),
+            "medications": list(medications.values())}
+
+
+def _rate(taken: int, total: int) -> Optional[float]:
+    return round(taken / total, 4) if total else None
+
+
+async def rebuild(db: AsyncSession, since: Optional[date] = None) -> Dict[str, int]:
+    """
+    Recompute the rollups from adherence_logs, all of them or from the week
+    containing ``since`` onwards, and commit. Logs whose timestamp cannot be
+    parsed are skipped.
+    """
+    start = since - timedelta(days=since.weekday()) if since else None
+    for model in ROLLUPS.values():
+        stmt = delete(model)
+        if start:
+            stmt = stmt.where(model.period_start >= start.isoformat())
+        await db.execute(stmt)
+
+    log = models.AdherenceLog
+    query = select(log.user_id, log.medication_id, log.status, log.timestamp)
+    if start:
+        # ISO strings compare by date prefix; a day early allows for UTC offsets.
+        query = query.where(log.timestamp >= (start - timedelta(days=1)).isoformat())
+    counts: List[Dict[Tuple[str, str, str], List[int]]] = [{} for _ in ROLLUPS]
+    events = skipped = 0
+    result = await db.stream(query.execution_options(yield_per=REBUILD_CHUNK_ROWS))
+    async for rows in result.partitions():
+        for user_id, medication_id, status, timestamp in rows:
+            when = parse_timestamp(timestamp)
+            if when is None:
+                skipped += 1
+                continue
+            starts = period_starts(when)
+            if start and starts[0] < start.isoformat():
+                continue
+            events += 1
+            taken = int(status == TAKEN)
+            for table, period_start in zip(counts, starts):
+                cell = table.setdefault((user_id or "", medication_id or "", period_start), [0, 0, 0])
+                cell[0] += taken
+                cell[1] += 1 - taken
+                cell[2] += 1
+
+    stats = {"events": events, "skipped": skipped}
+    for (granularity, model), table in zip(ROLLUPS.items(), counts):
+        rows = [dict(zip(_KEY_COLUMNS, key), taken=t, missed=m, total=n) for key, (t, m, n) in table.items()]
+        for i in range(0, len(rows), REBUILD_CHUNK_ROWS):
+            await db.execute(insert(model), rows[i:i + REBUILD_CHUNK_ROWS])
+        stats[f"{granularity}_rows"] = len(rows)
+    await db.commit()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m api.adherence_rollups")
+    commands = parser.add_subparsers(dest="command", required=True)
+    rebuild_parser = commands.add_parser("rebuild", help="recompute rollups from adherence_logs")
+    rebuild_parser.add_argument("--since", type=date.fromisoformat,
+                                help="only rebuild from the week containing this date (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    async def run():
+        await database.init_db()
+        async with database.SessionLocal() as db:
+            print(await rebuild(db, args.since))
+        await database.engine.dispose()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
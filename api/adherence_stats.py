@@ -0,0 +1,254 @@
+"""
+Adherence statistics computed with NumPy.
+
+Adherence events are loaded into arrays: epoch seconds (int64),
+medication codes and a taken/not-taken mask. Every statistic is then a
+handful of whole-array operations instead of a Python loop per row:
+
+  * daily taken/total counts per medication (one ``bincount`` each) and a
+    rolling adherence rate over the last ``rolling_days`` days (cumulative
+    sums along the day axis);
+  * streaks: events are sorted by (medication, time) and split into runs of
+    equal outcome, so the current and longest "taken" streak per medication
+    come from the run lengths;
+  * missed-dose clusters: runs of at least ADHERENCE_MISSED_CLUSTER_MIN
+    consecutive doses that were not taken.
+
+Any status other than "taken" counts as a missed dose.
+"""
+import os
+import warnings
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+
+ADHERENCE_MISSED_CLUSTER_MIN = int(os.getenv("ADHERENCE_MISSED_CLUSTER_MIN", "2"))
+MAX_WINDOW_DAYS = int(os.getenv("ADHERENCE_MAX_WINDOW_DAYS", "365"))
+
+TAKEN = "taken"
+DAY_SECONDS = 86400
+
+
+def to_epoch_seconds(values: Sequence[Optional[str]]) -> np.ndarray:
+    """ISO-8601 strings to int64 epoch seconds (UTC); unparseable values become -1."""
+    epoch = np.full(len(values), -1, dtype=np.int64)
+    if not len(values):
+        return epoch
+    try:
+        raw = np.array(values, dtype=f"S{_RAW_WIDTH}")
+    except (UnicodeEncodeError, ValueError):
+        raw = None
+    if raw is not None:
+        fast, ok = _parse_fixed(raw)
+        epoch[ok] = fast[ok]
+        rest = np.flatnonzero(~ok)
+    else:
+        rest = np.arange(len(values))
+    if len(rest):
+        epoch[rest] = _parse_general([values[i] for i in rest])
+    return epoch
+
+
+_RAW_WIDTH = 32
+_DIGITS = [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18]
+_TAIL_ALLOWED = np.zeros(256, dtype=bool)
+_TAIL_ALLOWED[[0, ord("."), ord("Z")] + list(range(ord("0"), ord("9") + 1))] = True
+
+
+def _parse_fixed(raw: np.ndarray):
+    """
+    Parse "YYYY-MM-DDTHH:MM:SS[.fff][Z]" straight from the bytes, which is
+    much faster than NumPy's datetime parser (slow on the "Z" suffix).
+    Returns (epoch, ok); rows in another format have ok=False.
+    """
+    b = raw.view(np.uint8).reshape(len(raw), _RAW_WIDTH)
+    ok = (b[:, 4] == ord("-")) & (b[:, 7] == ord("-")) & ((b[:, 10] == ord("T")) | (b[:, 10] == ord(" "))) \
+        & (b[:, 13] == ord(":")) & (b[:, 16] == ord(":"))
+    digits = b[:, _DIGITS] - np.uint8(48)  # wraps around for anything below "0"
+    ok &= (digits < 10).all(axis=1)
+    # Fractional seconds and a "Z" are fine; a numeric UTC offset goes to the general parser.
+    ok &= _TAIL_ALLOWED[b[:, 19:]].all(axis=1)
+    d = digits.astype(np.int64)
+    year = d[:, 0] * 1000 + d[:, 1] * 100 + d[:, 2] * 10 + d[:, 3]
+    month, day = d[:, 4] * 10 + d[:, 5], d[:, 6] * 10 + d[:, 7]
+    hour, minute, second = d[:, 8] * 10 + d[:, 9], d[:, 10] * 10 + d[:, 11], d[:, 12] * 10 + d[:, 13]
+    ok &= (month >= 1) & (month <= 12) & (day >= 1) & (day <= 31) & (hour < 24) & (minute < 60) & (second < 61)
+    # Days since 1970-01-01 for a proleptic Gregorian date (H. Hinnant's days_from_civil)
+    y = year - (month <= 2)
+    era = y // 400
+    yoe = y - era * 400
+    doy = (153 * ((month + 9) % 12) + 2) // 5 + day - 1
+    days = era * 146097 + yoe * 365 + yoe // 4 - yoe // 100 + doy - 719468
+    return days * DAY_SECONDS + hour * 3600 + minute * 60 + second, ok
+
+
+def _parse_general(values: Sequence[Optional[str]]) -> np.ndarray:
+    with warnings.catch_warnings():
+        # NumPy warns that it converts UTC offsets ("+05:30") to naive UTC, which is what we want.
+        warnings.simplefilter("ignore")
+        try:
+            parsed = np.array(values, dtype="datetime64[s]")
+        except ValueError:
+            parsed = np.array([_parse_one(v) for v in values], dtype="datetime64[s]")
+    epoch = parsed.astype(np.int64)
+    epoch[np.isnat(parsed)] = -1
+    return epoch
+
+
+def _parse_one(value: Optional[str]) -> Optional[str]:
+    try:
+        np.datetime64(value, "s")
+        return value
+    except (ValueError, TypeError):
+        return None
+
+
+def compute_stats(medication_ids: Sequence[str], statuses: Sequence[str], timestamps: Sequence[Optional[str]],
+                  now: datetime, days: int = 30, rolling_days: int = 7,
+                  cluster_min: int = ADHERENCE_MISSED_CLUSTER_MIN) -> List[Dict[str, Any]]:
+    """Per-medication adherence over the ``days`` days ending at ``now`` (naive UTC)."""
+    end = int(now.replace(tzinfo=timezone.utc).timestamp())
+    start_day = (end // DAY_SECONDS) - days + 1
+    start = start_day * DAY_SECONDS
+
+    epoch = to_epoch_seconds(timestamps)
+    ids = np.asarray(medication_ids, dtype=object)
+    in_window = (epoch >= start) & (epoch <= end) & np.not_equal(ids, None)
+    if not in_window.any():
+        return []
+    epoch = epoch[in_window]
+    med_labels, med = _factorize(ids[in_window])
+    taken = np.asarray(statuses, dtype=object)[in_window] == TAKEN
+    n_meds = len(med_labels)
+
+    # Daily counts and rolling rate, shape (n_meds, days)
+    day = (epoch // DAY_SECONDS - start_day).astype(np.int64)
+    cell = med * days + day
+    total_daily = np.bincount(cell, minlength=n_meds * days).reshape(n_meds, days)
+    taken_daily = np.bincount(cell, weights=taken, minlength=n_meds * days).reshape(n_meds, days).astype(np.int64)
+    window = min(rolling_days, days)
+    total_cum = np.concatenate([np.zeros((n_meds, 1), np.int64), np.cumsum(total_daily, axis=1)], axis=1)
+    taken_cum = np.concatenate([np.zeros((n_meds, 1), np.int64), np.cumsum(taken_daily, axis=1)], axis=1)
+    lower = np.maximum(np.arange(1, days + 1) - window, 0)
+    rolling_total = total_cum[:, 1:] - total_cum[:, lower]
+    rolling_taken = taken_cum[:, 1:] - taken_cum[:, lower]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rolling_rate = np.where(rolling_total > 0, rolling_taken / rolling_total, np.nan)
+
+    # Runs of equal outcome within each medication, in time order
+    order = np.lexsort((epoch, med))
+    med_sorted, taken_sorted, epoch_sorted = med[order], taken[order], epoch[order]
+    n = len(order)
+    run_start = np.empty(n, dtype=bool)
+    run_start[0] = True
+    run_start[1:] = (med_sorted[1:] != med_sorted[:-1]) | (taken_sorted[1:] != taken_sorted[:-1])
+    starts = np.flatnonzero(run_start)
+    lengths = np.diff(np.append(starts, n))
+    run_med, run_taken = med_sorted[starts], taken_sorted[starts]
+
+    longest = np.zeros(n_meds, dtype=np.int64)
+    np.maximum.at(longest, run_med[run_taken], lengths[run_taken])
+    last_run = np.append(np.flatnonzero(run_med[1:] != run_med[:-1]), len(starts) - 1)
+    current = np.where(run_taken[last_run], lengths[last_run], 0)
+
+    clusters = ~run_taken & (lengths >= cluster_min)
+    cluster_count = np.bincount(run_med[clusters], minlength=n_meds)
+    largest_cluster = np.zeros(n_meds, dtype=np.int64)
+    np.maximum.at(largest_cluster, run_med[clusters], lengths[clusters])
+    # Most recent cluster per medication: the last qualifying run (runs are in time order)
+    recent = np.full(n_meds, -1, dtype=np.int64)
+    np.maximum.at(recent, run_med[clusters], np.flatnonzero(clusters))
+
+    totals = total_daily.sum(axis=1)
+    takens = taken_daily.sum(axis=1)
+    dates = [(date(1970, 1, 1) + timedelta(days=int(start_day + i))).isoformat() for i in range(days)]
+    results = []
+    for i, label in enumerate(med_labels):
+        latest_cluster = None
+        if recent[i] >= 0:
+            first = starts[recent[i]]
+            last = first + lengths[recent[i]] - 1
+            latest_cluster = {
+                "missed_doses": int(lengths[recent[i]]),
+                "start": _iso(epoch_sorted[first]),
+                "end": _iso(epoch_sorted[last]),
+            }
+        results.append({
+            "medication_id": label,
+            "taken": int(takens[i]),
+            "missed": int(totals[i] - takens[i]),
+            "total": int(totals[i]),
+            "adherence_rate": round(float(takens[i] / totals[i]), 4),
+            "current_streak": int(current[i]),
+            "longest_streak": int(longest[i]),
+            "missed_clusters": int(cluster_count[i]),
+            "largest_missed_cluster": int(largest_cluster[i]),
+            "latest_missed_cluster": latest_cluster,
+            "daily": [
+                {
+                    "date": dates[d],
+                    "taken": int(taken_daily[i, d]),
+                    "total": int(total_daily[i, d]),
+                    "rolling_rate": None if np.isnan(rolling_rate[i, d]) else round(float(rolling_rate[i, d]), 4),
+                }
+                for d in range(days)
+            ],
+        })
+    return results
+
+
+def _factorize(values: np.ndarray):
+    """(labels, int64 codes) for a categorical column, labels in first-seen order."""
+    codes: Dict[Any, int] = {}
+    encoded = np.fromiter((codes.setdefault(v, len(codes)) for v in values), dtype=np.int64, count=len(values))
+    return [str(label) for label in codes], encoded
+
+
+def _iso(epoch: int) -> str:
+    return datetime.fromtimestamp(int(epoch), tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+async def load_events(db: AsyncSession, since: datetime, medication_id: Optional[str] = None, user_id: str = ""):
+    """
+    (medication_ids, statuses, timestamps) of ``user_id``'s adherence logs
+    that may fall after ``since``; user "" is the logs recorded anonymously.
+    """
+    log = models.AdherenceLog
+    # Timestamps are ISO strings; compare on the date prefix (a day early to allow for UTC offsets).
+    query = select(log.medication_id, log.status, log.timestamp) \
+        .where(log.timestamp >= (since - timedelta(days=1)).date().isoformat())
+    query = query.where(log.user_id == user_id) if user_id else \
+        query.where(or_(log.user_id.is_(None), log.user_id == ""))
+    if medication_id:
+        query = query.where(models.AdherenceLog.medication_id == medication_id)
+    rows = (await db.execute(query)).all()
+    if not rows:
+        return [], [], []
+    medication_ids, statuses, timestamps = zip(*rows)
+    return medication_ids, statuses, timestamps
+
+
+async def adherence_stats(db: AsyncSession, days: int = 30, rolling_days: int = 7,
+                          medication_id: Optional[str] = None, user_id: str = "") -> Dict[str, Any]:
+    """Statistics over one user's adherence logs (see load_events)."""
+    now = datetime.utcnow()
+    since = now - timedelta(days=days)
+    medication_ids, statuses, timestamps = await load_events(db, since, medication_id, user_id)
+    stats = compute_stats(medication_ids, statuses, timestamps, now, days, rolling_days) if timestamps else []
+
+    names = {}
+    if stats:
+        result = await db.execute(select(models.Medication.id, models.Medication.name)
+                                  .where(models.Medication.id.in_([s["medication_id"] for s in stats])))
+        names = dict(result.all())
+    for entry in stats:
+        entry["name"] = names.get(entry["medication_id"])
+    return {
+        "window": {"days": days, "rolling_days": rolling_days, "end": now.strftime("%Y-%m-%dT%H:%M:%SZ")},
+        "medications": stats,
+    }
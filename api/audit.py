@@ -0,0 +1,299 @@
+"""
+Group-commit audit log writer.
+
+Handlers enqueue audit records instead of committing them inline. A
+background task drains the bounded queue and writes each batch in a single
+transaction every AUDIT_FLUSH_INTERVAL_MS or AUDIT_BATCH_SIZE rows, whichever
+comes first. Records still queued are flushed on shutdown.
+
+A batch that fails to commit is retried AUDIT_WRITE_RETRIES times with
+exponential backoff. If it still fails, it is appended to AUDIT_SPILL_PATH
+(JSON lines) and replayed into the table after the next successful write.
+Only records that could not be written or spilled are dropped, and
+get_stats() counts them.
+
+If the writer is not running (e.g. no lifespan events), records are written
+synchronously so nothing is lost.
+
+Reads are keyset-paginated on (timestamp, id), newest first, so a page costs
+the same however large the table grows.
+"""
+import asyncio
+import base64
+import json
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import String, inspect, select, text, tuple_
+from sqlalchemy.engine import Connection, Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import database, models
+
+FLUSH_INTERVAL_MS = int(os.getenv("AUDIT_FLUSH_INTERVAL_MS", "200"))
+BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = int(os.getenv("AUDIT_MAX_PAGE_SIZE", "200"))
+WRITE_RETRIES = int(os.getenv("AUDIT_WRITE_RETRIES", "3"))
+RETRY_BACKOFF_MS = int(os.getenv("AUDIT_RETRY_BACKOFF_MS", "200"))
+SPILL_PATH = os.getenv("AUDIT_SPILL_PATH", "./audit_spill.jsonl")
+
+_STOP = object()
+
+
+async def write_batch(records: List[Dict[str, Any]]) -> None:
+    """Insert audit records in one transaction."""
+    await database.init_db()
+    async with database.SessionLocal() as db:
+        db.add_all([models.AuditLog(**record) for record in records])
+        await db.commit()
+
+
+def _append_spill(path: str, records: List[Dict[str, Any]]) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(dict(record, timestamp=record["timestamp"].isoformat())) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _take_spill(path: str) -> List[Dict[str, Any]]:
+    """Read and remove the spill file (records that fail again are spilled anew)."""
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    os.remove(path)
+    for record in records:
+        record["timestamp"] = datetime.fromisoformat(record["timestamp"])
+    return records
+
+
+class AuditSink:
+    def __init__(self, flush_interval_ms: int = FLUSH_INTERVAL_MS, batch_size: int = BATCH_SIZE,
+                 queue_size: int = QUEUE_SIZE, write_retries: int = WRITE_RETRIES,
+                 retry_backoff_ms: int = RETRY_BACKOFF_MS, spill_path: str = SPILL_PATH):
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.write_retries = write_retries
+        self.retry_backoff = retry_backoff_ms / 1000
+        self.spill_path = spill_path
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"enqueued": 0, "written": 0, "batches": 0, "sync_writes": 0, "errors": 0,
+                      "retries": 0, "spilled": 0, "replayed": 0, "dropped": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        """Stop the writer after it has flushed everything still queued."""
+        if not self.running:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    async def log(self, action: str, user: str, status: str) -> None:
+        record = {
+            "timestamp": datetime.utcnow(),
+            "action": action,
+            "user": user,
+            "status": status,
+        }
+        if not self.running:
+            self.stats["sync_writes"] += 1
+            await write_batch([record])
+            return
+        # Blocks (backpressure) only when the writer has fallen QUEUE_SIZE records behind.
+        await self._queue.put(record)
+        self.stats["enqueued"] += 1
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._write(batch)
+
+    async def _write(self, batch: List[Dict[str, Any]]) -> None:
+        for attempt in range(self.write_retries + 1):
+            if attempt:
+                self.stats["retries"] += 1
+                await asyncio.sleep(self.retry_backoff * 2 ** (attempt - 1))
+            try:
+                await write_batch(batch)
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"Error writing {len(batch)} audit records (attempt {attempt + 1}): {e}")
+                continue
+            self.stats["written"] += len(batch)
+            self.stats["batches"] += 1
+            if os.path.exists(self.spill_path):
+                await self._replay_spill()
+            return
+        await self._spill(batch)
+
+    async def _spill(self, batch: List[Dict[str, Any]]) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, _append_spill, self.spill_path, batch)
+            self.stats["spilled"] += len(batch)
+            print(f"Spilled {len(batch)} audit records to {self.spill_path}")
+        except Exception as e:
+            self.stats["dropped"] += len(batch)
+            print(f"Dropped {len(batch)} audit records, spill to {self.spill_path} failed: {e}")
+
+    async def _replay_spill(self) -> None:
+        """Write records spilled by earlier failures now that the database accepts writes again."""
+        loop = asyncio.get_running_loop()
+        try:
+            records = await loop.run_in_executor(None, _take_spill, self.spill_path)
+        except Exception as e:
+            print(f"Could not read audit spill file {self.spill_path}: {e}")
+            return
+        for start in range(0, len(records), self.batch_size):
+            chunk = records[start:start + self.batch_size]
+            try:
+                await write_batch(chunk)
+            except Exception as e:
+                print(f"Replaying spilled audit records failed, keeping them for later: {e}")
+                await self._spill(records[start:])
+                return
+            self.stats["replayed"] += len(chunk)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["queued"] = self._queue.qsize() if self._queue is not None else 0
+        stats["running"] = self.running
+        return stats
+
+
+sink = AuditSink()
+
+
+def ensure_schema(conn: Connection) -> None:
+    """
+    Upgrade an audit_logs table created by an older build: add the paging
+    indexes and, once per database, convert its ISO string timestamps.
+    """
+    for index in models.AuditLog.__table__.indexes:
+        index.create(bind=conn, checkfirst=True)
+    database.run_once(conn, "audit_logs_datetime_timestamps", _convert_timestamps)
+
+
+def _convert_timestamps(conn: Connection) -> None:
+    """
+    Older builds stored timestamps as ISO strings. On SQLite, rewrite their
+    'T' separator into the format the DateTime column uses so old and new rows
+    sort together; elsewhere, change a string column to TIMESTAMP.
+    """
+    if conn.dialect.name == "sqlite":
+        conn.execute(text(
+            "UPDATE audit_logs SET timestamp = replace(timestamp, 'T', ' ') WHERE timestamp LIKE '%T%'"
+        ))
+        return
+    column = next(c for c in inspect(conn).get_columns("audit_logs") if c["name"] == "timestamp")
+    if not isinstance(column["type"], String):
+        return
+    if conn.dialect.name == "postgresql":
+        conn.execute(text(
+            'ALTER TABLE audit_logs ALTER COLUMN "timestamp" TYPE TIMESTAMP USING "timestamp"::timestamp'
+        ))
+    else:
+        print(f"audit_logs.timestamp is still a string column on {conn.dialect.name}; convert it to DATETIME")
+
+
+database.schema_upgrades.append(ensure_schema)
+
+
+def encode_cursor(timestamp: datetime, record_id: str) -> str:
+    raw = f"{timestamp.isoformat()}|{record_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        stamp, record_id = raw.decode("utf-8").split("|", 1)
+        return datetime.fromisoformat(stamp), record_id
+    except ValueError as e:
+        raise ValueError("Invalid audit log cursor") from e
+
+
+def _naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _as_dict(record: Row) -> Dict[str, Any]:
+    return {
+        "id": record.id,
+        "timestamp": record.timestamp.isoformat() if record.timestamp else None,
+        "action": record.action,
+        "user": record.user,
+        "status": record.status,
+    }
+
+
+async def query_page(db: AsyncSession, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+               user: Optional[str] = None, action: Optional[str] = None,
+               since: Optional[datetime] = None, until: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    One page of audit records, newest first. ``action`` matches a substring,
+    ``since`` is inclusive and ``until`` exclusive. Pass the returned
+    ``next_cursor`` back as ``cursor`` for the following page; it is None on
+    the last page. Raises ValueError for a malformed cursor.
+    """
+    AuditLog = models.AuditLog
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    # Plain column rows: no ORM identity map or instance state for a page of reads.
+    query = select(AuditLog.id, AuditLog.timestamp, AuditLog.action, AuditLog.user, AuditLog.status)
+    if user:
+        query = query.where(AuditLog.user == user)
+    if action:
+        query = query.where(AuditLog.action.contains(action, autoescape=True))
+    if since:
+        query = query.where(AuditLog.timestamp >= _naive_utc(since))
+    if until:
+        query = query.where(AuditLog.timestamp < _naive_utc(until))
+    if cursor:
+        after_timestamp, after_id = decode_cursor(cursor)
+        # Row-value comparison so the (timestamp, id) index serves the seek.
+        query = query.where(tuple_(AuditLog.timestamp, AuditLog.id) < tuple_(after_timestamp, after_id))
+
+    # Fetch one extra row to learn whether another page exists.
+    result = await db.execute(query.order_by(AuditLog.timestamp.desc(), AuditLog.id.desc()).limit(limit + 1))
+    rows = result.all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id)
+    return {"items": [_as_dict(row) for row in rows], "next_cursor": next_cursor}
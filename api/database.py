@@ -1,19 +1,113 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+"""
+Async database engine and sessions for the API.
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./healthbridge.db"
+DATABASE_URL selects the backend. Plain ``sqlite:///`` and ``postgresql://``
+URLs are mapped to their async drivers (aiosqlite, asyncpg). SQLite
+connections get WAL journaling, ``synchronous=NORMAL`` and a busy timeout, so
+readers never block the writer and concurrent writers wait instead of
+failing with "database is locked".
+"""
+import asyncio
+import os
+from datetime import datetime
+from typing import AsyncIterator, Callable, List, Optional
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+from sqlalchemy import event, text
+from sqlalchemy.engine import Connection, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./healthbridge.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def async_url(url: str):
+    """Swap a plain SQLite/Postgres URL for its async driver; other URLs are left as they are."""
+    parsed = make_url(url)
+    driver = _ASYNC_DRIVERS.get(parsed.drivername)
+    return parsed.set(drivername=driver) if driver else parsed
+
+
+def _engine_options(url) -> dict:
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # In-memory SQLite lives in a single connection; pool sizing does not apply.
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_pre_ping": url.get_backend_name() != "sqlite",
+    }
+
+
+SQLALCHEMY_DATABASE_URL = async_url(DATABASE_URL)
+
+engine = create_async_engine(SQLALCHEMY_DATABASE_URL, **_engine_options(SQLALCHEMY_DATABASE_URL))
+
+if SQLALCHEMY_DATABASE_URL.get_backend_name() == "sqlite":
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.close()
+
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+# Run (on a sync Connection) after create_all, to upgrade tables made by older builds.
+schema_upgrades: List[Callable[[Connection], None]] = []
+
+
+
+def run_once(conn: Connection, name: str, migrate: Callable[[Connection], None]) -> bool:
+    """
+    Run a one-time data migration (from a schema upgrade) and record it in
+    schema_migrations, so later startups skip it. Returns whether it ran.
+    """
+    conn.execute(text("CREATE TABLE IF NOT EXISTS schema_migrations (name VARCHAR PRIMARY KEY, applied_at VARCHAR)"))
+    if conn.execute(text("SELECT 1 FROM schema_migrations WHERE name = :name"), {"name": name}).first():
+        return False
+    migrate(conn)
+    conn.execute(text("INSERT INTO schema_migrations (name, applied_at) VALUES (:name, :applied_at)"
+                      " ON CONFLICT (name) DO NOTHING"),
+                 {"name": name, "applied_at": datetime.utcnow().isoformat()})
+    return True
+
+
+_schema_ready = False
+_schema_lock: Optional[asyncio.Lock] = None
+
+
+async def init_db() -> None:
+    """Create missing tables and apply ``schema_upgrades`` once per process."""
+    global _schema_ready, _schema_lock
+    if _schema_ready:
+        return
+    if _schema_lock is None:
+        _schema_lock = asyncio.Lock()
+    async with _schema_lock:
+        if _schema_ready:
+            return
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            for upgrade in schema_upgrades:
+                await conn.run_sync(upgrade)
+        _schema_ready = True
+
+
+async def get_db() -> AsyncIterator[AsyncSession]:
+    await init_db()
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
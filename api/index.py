@@ -1,25 +1,27 @@
 from fastapi import FastAPI, HTTPException, UploadFile, File, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
+import asyncio
 import os
-import json
+import time
 import google.generativeai as genai
 import google.generativeai as genai
-from passlib.context import CryptContext
 from jose import JWTError, jwt
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from fastapi import Depends, status
+from fastapi import Depends, Query, status
 from datetime import datetime, timedelta
+from healthbridge_ai import deidentify, fast_json, image_prep, interaction_index, json_stream, llm_cache, llm_gateway, llm_json, note_batching, note_chunking, scan_dedupe, terminology
 
 # Auth Config
 SECRET_KEY = "healthbridge-ai-super-secret-key-change-in-production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
-app = FastAPI()
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login", auto_error=False)
+app = FastAPI(default_response_class=fast_json.FastJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -50,17 +52,32 @@ except Exception as e:
     print(f"Error configuring Gemini: {e}")
     api_key = None
 
-from sqlalchemy.orm import Session
-from . import models, database
-
-models.Base.metadata.create_all(bind=database.engine)
-
-def get_db():
-    db = database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+GEMINI_MODEL = 'gemini-pro'
+
+# Bump a version whenever its prompt (or the post-processing of its result) changes so stale cached responses are not served.
+ANALYZE_PROMPT_VERSION = "analyze-v6"
+INTERACTIONS_PROMPT_VERSION = "interactions-v2"
+OCR_PROMPT_VERSION = "ocr-v1"
+DEIDENTIFY_PROMPT_VERSION = "deidentify-v2"
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import adherence_rollups, adherence_stats, audit, models, database, passwords, principals
+from .database import get_db
+
+@app.on_event("startup")
+async def start_audit_sink():
+    await database.init_db()
+    audit.sink.start()
+    # Map (or compile) the terminology index and load the de-identification name
+    # dictionary now rather than on the first request.
+    terminology.get_index()
+    deidentify.get_engine()
+
+@app.on_event("shutdown")
+async def stop_audit_sink():
+    await audit.sink.stop()
+    await database.engine.dispose()
 
 # Auth Models
 class UserCreate(BaseModel):
@@ -77,11 +94,24 @@ class Token(BaseModel):
     token_type: str
 
 # Auth Helpers
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+def auth_busy_exception():
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many sign-in requests in progress, please retry shortly",
+        headers={"Retry-After": "1"},
+    )
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def verify_password(plain_password, hashed_password):
+    try:
+        return await passwords.verify_password(plain_password, hashed_password)
+    except passwords.AuthBusy:
+        raise auth_busy_exception()
+
+async def get_password_hash(password):
+    try:
+        return await passwords.hash_password(password)
+    except passwords.AuthBusy:
+        raise auth_busy_exception()
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -93,7 +123,11 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_user(db: AsyncSession, username: str) -> Optional[models.User]:
+    result = await db.execute(select(models.User).where(models.User.username == username))
+    return result.scalars().first()
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -102,22 +136,36 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
-        if username is None:
+        expires = payload.get("exp")
+        if username is None or expires is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    
-    user = db.query(models.User).filter(models.User.username == username).first()
+
+    user = principals.cache.get(username, expires)
+    if user is not None:
+        return user
+    user = await get_user(db, username)
     if user is None:
         raise credentials_exception
+    principals.cache.put(username, expires, user)
     return user
 
+async def get_optional_user(token: Optional[str] = Depends(optional_oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    """The signed-in user, or None for anonymous requests. An invalid token is still a 401."""
+    if not token:
+        return None
+    return await get_current_user(token, db)
+
 # Models
 class ClinicalNote(BaseModel):
     patient_id: Optional[str] = None
     note_text: str
     note_date: Optional[str] = None
 
+class BatchNotesRequest(BaseModel):
+    notes: List[ClinicalNote]
+
 class MedicationsRequest(BaseModel):
     medications: List[str]
 
@@ -130,20 +178,19 @@ class Medication(BaseModel):
 
 # Auth Endpoints
 @app.post("/api/auth/register", response_model=Token)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.username == user.username).first()
+async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    db_user = await get_user(db, user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
     
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash(user.password)
     new_user = models.User(
         username=user.username,
         password_hash=hashed_password,
         full_name=user.full_name
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
@@ -152,9 +199,9 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.post("/api/auth/login", response_model=Token)
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.password_hash):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+    user = await get_user(db, form_data.username)
+    if not user or not await verify_password(form_data.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -176,135 +223,287 @@ async def read_users_me(current_user: models.User = Depends(get_current_user)):
 @app.get("/api/patient/health")
 @app.get("/api/ai/health")
 async def health_check():
-    return {"status": "healthy", "service": "consolidated-api"}
+    return {"status": "healthy", "service": "consolidated-api", "llm_gateway": llm_gateway.get_stats(), "llm_cache": llm_cache.get_stats(), "llm_json": llm_json.get_stats(), "ocr": image_prep.get_stats(), "scan_dedupe": scan_dedupe.get_stats(), "audit": audit.sink.get_stats(), "auth": passwords.get_stats(), "principal_cache": principals.cache.get_stats(), "terminology": terminology.get_stats()}
 
 @app.get("/api/audit-log")
-async def get_audit_logs(db: Session = Depends(get_db)):
-    return db.query(models.AuditLog).order_by(models.AuditLog.timestamp.desc()).all()
+async def get_audit_logs(
+    limit: int = Query(audit.DEFAULT_PAGE_SIZE, ge=1, le=audit.MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    user: Optional[str] = None,
+    action: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """Newest first; pass ``next_cursor`` back as ``cursor`` for the next page."""
+    try:
+        return fast_json.FastJSONResponse(await audit.query_page(db, limit, cursor, user, action, since, until))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _medication_dict(med) -> Dict[str, Any]:
+    return {"id": med.id, "name": med.name, "dosage": med.dosage, "frequency": med.frequency}
 
 @app.get("/api/medications")
-async def get_medications(db: Session = Depends(get_db)):
-    return db.query(models.Medication).all()
+async def get_medications(db: AsyncSession = Depends(get_db)):
+    # Project columns rather than load ORM objects; serialized without jsonable_encoder.
+    Medication = models.Medication
+    result = await db.execute(select(Medication.id, Medication.name, Medication.dosage, Medication.frequency))
+    return fast_json.FastJSONResponse([_medication_dict(row) for row in result])
 
 @app.post("/api/medications")
-async def add_medication(med: Medication, db: Session = Depends(get_db)):
+async def add_medication(med: Medication, db: AsyncSession = Depends(get_db)):
     new_med = models.Medication(
         name=med.name,
         dosage=med.dosage,
         frequency=med.frequency
     )
     db.add(new_med)
-    db.commit()
-    db.refresh(new_med)
-    return {"status": "success", "data": new_med}
+    await db.commit()
+    return {"status": "success", "data": _medication_dict(new_med)}
 
 @app.delete("/api/medications/{med_id}")
-async def delete_medication(med_id: str, db: Session = Depends(get_db)):
-    med = db.query(models.Medication).filter(models.Medication.id == med_id).first()
+async def delete_medication(med_id: str, db: AsyncSession = Depends(get_db)):
+    med = await db.get(models.Medication, med_id)
     if not med:
         raise HTTPException(status_code=404, detail="Medication not found")
-    db.delete(med)
-    db.commit()
+    await db.delete(med)
+    await db.commit()
     return {"status": "success"}
 
 @app.post("/api/adherence")
-async def log_adherence(data: Dict[str, Any], db: Session = Depends(get_db)):
-    # Log adherence
+async def log_adherence(data: Dict[str, Any], db: AsyncSession = Depends(get_db),
+                        user: Optional[models.User] = Depends(get_optional_user)):
+    # Log adherence, and count it in the rollups in the same transaction
     new_adherence = models.AdherenceLog(
         medication_id=data.get("medication_id"),
         status=data.get("status"),
-        timestamp=data.get("timestamp", datetime.utcnow().isoformat())
+        timestamp=data.get("timestamp", datetime.utcnow().isoformat()),
+        user_id=user.username if user else None
     )
     db.add(new_adherence)
-    
+    await adherence_rollups.record(db, new_adherence.user_id, new_adherence.medication_id,
+                                   new_adherence.status, new_adherence.timestamp)
+    await db.commit()
+
     # Add to audit log too
-    new_audit = models.AuditLog(
-        action=f"Adherence Log: {data.get('medication_id')}",
-        user="System",
-        status=data.get("status", "Logged")
-    )
-    db.add(new_audit)
-    db.commit()
+    await audit.sink.log(f"Adherence Log: {data.get('medication_id')}", "System", data.get("status", "Logged"))
     return {"status": "success"}
 
-@app.post("/api/analyze-note")
-async def analyze_note(note: ClinicalNote, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    new_audit = models.AuditLog(
-        action="Clinical Note Analysis",
-        user=current_user.username,
-        status="Success"
+@app.get("/api/adherence/stats")
+async def get_adherence_stats(
+    days: int = Query(30, ge=1, le=adherence_stats.MAX_WINDOW_DAYS),
+    rolling_days: int = Query(7, ge=1, le=adherence_stats.MAX_WINDOW_DAYS),
+    medication_id: Optional[str] = None,
+    user: Optional[models.User] = Depends(get_optional_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Adherence rate, rolling daily rate, streaks and missed-dose clusters per
+    medication, over the caller's own logs (anonymous callers see the logs
+    recorded without sign-in).
+    """
+    return fast_json.FastJSONResponse(await adherence_stats.adherence_stats(
+        db, days, rolling_days, medication_id, user.username if user else ""))
+
+@app.get("/api/adherence/summary")
+async def get_adherence_summary(
+    days: int = Query(30, ge=1, le=adherence_stats.MAX_WINDOW_DAYS),
+    granularity: Literal["day", "week"] = "day",
+    medication_id: Optional[str] = None,
+    user: Optional[models.User] = Depends(get_optional_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Taken/missed counts per day or week, read from the adherence rollups, for
+    the caller's own logs (anonymous callers see the logs recorded without sign-in).
+    """
+    return fast_json.FastJSONResponse(
+        await adherence_rollups.summary(db, days, granularity, user.username if user else "", medication_id)
     )
-    db.add(new_audit)
-    db.commit()
+
+ANALYZE_NOTE_FORMAT = """
+Return the result in valid JSON format ONLY with this exact structure:
+{
+    "extracted_entities": {
+        "conditions": [
+            {
+                "clinical_text": "...",
+                "icd_10": "...",
+                "confidence": 0-100,
+                "severity": "Mild/Moderate/Severe/Chronic"
+            }
+        ],
+        "medications": [
+            {
+                "drug_name": "...",
+                "dosage": "...",
+                "frequency": "...",
+                "confidence": 0-100
+            }
+        ]
+    },
+    "adherence_insights": {
+        "complexity_score": 1-5,
+        "barriers_identified": ["...", "..."]
+    },
+    "fhir_resources": {
+        "resourceType": "Bundle",
+        "type": "collection",
+        "entry": [
+            {
+                "resource": {
+                    "resourceType": "Condition/MedicationRequest/Patient",
+                    "..." : "..."
+                }
+            }
+        ]
+    }
+}
+"""
+
+def _analysis_prompt(note_text: str) -> str:
+    return f"Analyze this clinical note and extract structured medical data.\nNote: {note_text}\n{ANALYZE_NOTE_FORMAT}"
+
+async def _generate_chunk_analysis(chunk_text: str) -> Dict[str, Any]:
+    """Analyze one section-aligned excerpt of a long note (or reuse a cached analysis). Raises on failure."""
+    async def generate():
+        prompt = note_chunking.build_chunk_prompt(
+            f"Analyze this clinical note and extract structured medical data.\n{ANALYZE_NOTE_FORMAT}", chunk_text
+        )
+        text = await llm_gateway.generate_text(GEMINI_MODEL, prompt)
+        return terminology.annotate_analysis(llm_json.parse_llm_json(text, "analysis"))
+
+    return await llm_cache.cached_call(
+        "analyze-chunk", llm_cache.normalize_text(chunk_text),
+        ANALYZE_PROMPT_VERSION, GEMINI_MODEL, generate
+    )
+
+async def _generate_analysis(note_text: str) -> Dict[str, Any]:
+    """Analyze one note with Gemini (or reuse a cached analysis). Raises on failure."""
+    async def generate():
+        if note_chunking.should_chunk(note_text):
+            # Long notes: one prompt per group of sections, analyzed concurrently and merged.
+            # Medications from different chunks were never in one prompt: add the local table's interactions.
+            return interaction_index.annotate_analysis(
+                await note_chunking.analyze_chunked(note_text, _generate_chunk_analysis))
+        text = await llm_gateway.generate_text(GEMINI_MODEL, _analysis_prompt(note_text))
+        return interaction_index.annotate_analysis(terminology.annotate_analysis(llm_json.parse_llm_json(text, "analysis")))
+
+    return await llm_cache.cached_call(
+        "analyze-note", llm_cache.normalize_text(note_text),
+        ANALYZE_PROMPT_VERSION, GEMINI_MODEL, generate
+    )
+
+async def _generate_packed_analysis(items):
+    """Analyze several short notes in one prompt; each result is cached as if analyzed alone."""
+    prompt = note_batching.build_packed_prompt(
+        f"Analyze each clinical note and extract structured medical data.\n{ANALYZE_NOTE_FORMAT}", items
+    )
+    text = await llm_gateway.generate_text(GEMINI_MODEL, prompt)
+    results = note_batching.split_packed_response(llm_json.parse_llm_json(text, "packed_analysis", many=True))
+    for index, note_text in items:
+        if index in results:
+            terminology.annotate_analysis(results[index])
+            llm_cache.store("analyze-note", llm_cache.normalize_text(note_text),
+                            ANALYZE_PROMPT_VERSION, GEMINI_MODEL, results[index])
+    return results
+
+@app.post("/api/analyze-note")
+async def analyze_note(note: ClinicalNote, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    await audit.sink.log("Clinical Note Analysis", current_user.username, "Success")
     
     # Use username as patient_id
     patient_id = current_user.username
     
     if not api_key:
-        return get_mock_analysis(patient_id, note.note_text)
+        return fast_json.FastJSONResponse(get_mock_analysis(patient_id, note.note_text))
     
     try:
-        model = genai.GenerativeModel('gemini-pro')
-        prompt = f"""
-        Analyze this clinical note and extract structured medical data.
-        Note: {note.note_text}
-        
-        Return the result in valid JSON format ONLY with this exact structure:
-        {{
-            "extracted_entities": {{
-                "conditions": [
-                    {{
-                        "clinical_text": "...",
-                        "icd_10": "...",
-                        "confidence": 0-100,
-                        "severity": "Mild/Moderate/Severe/Chronic"
-                    }}
-                ],
-                "medications": [
-                    {{
-                        "drug_name": "...",
-                        "dosage": "...",
-                        "frequency": "...",
-                        "confidence": 0-100
-                    }}
-                ]
-            }},
-            "adherence_insights": {{
-                "complexity_score": 1-5,
-                "barriers_identified": ["...", "..."]
-            }},
-            "fhir_resources": {{
-                "resourceType": "Bundle",
-                "type": "collection",
-                "entry": [
-                    {{
-                        "resource": {{
-                            "resourceType": "Condition/MedicationRequest/Patient",
-                            "..." : "..."
-                        }}
-                    }}
-                ]
-            }}
-        }}
-        """
-        response = model.generate_content(prompt)
-        text = response.text
-        if "```json" in text:
-            text = text.split("```json")[1].split("```")[0]
-        return json.loads(text.strip())
+        return fast_json.FastJSONResponse(await _generate_analysis(note.note_text))
     except Exception as e:
         print(f"Error in analyze_note: {str(e)}")
-        return get_mock_analysis(note.patient_id, note.note_text)
+        return fast_json.FastJSONResponse(get_mock_analysis(note.patient_id, note.note_text))
+
+@app.post("/api/analyze-note/stream")
+async def analyze_note_stream(note: ClinicalNote, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    """Server-sent events: one event per entity as it is generated, then the full result."""
+    await audit.sink.log("Clinical Note Analysis (streamed)", current_user.username, "Success")
+    
+    async def events():
+        normalized = llm_cache.normalize_text(note.note_text)
+        if not api_key:
+            result = get_mock_analysis(current_user.username, note.note_text)
+        else:
+            result = await llm_cache.lookup("analyze-note", normalized, ANALYZE_PROMPT_VERSION, GEMINI_MODEL)
+        
+        if result is None and note_chunking.should_chunk(note.note_text):
+            # Long notes: entities arrive per chunk as each one completes.
+            chunks = note_chunking.chunk_note(note.note_text)
+            merger = note_chunking.AnalysisMerger()
+            results = [None] * len(chunks)
+            try:
+                async for index, analysis in note_chunking.iter_chunk_analyses(chunks, _generate_chunk_analysis):
+                    results[index] = analysis
+                    for section, entity in merger.add(analysis):
+                        if section in json_stream.SECTION_EVENTS:
+                            yield json_stream.sse_event(json_stream.SECTION_EVENTS[section], entity)
+            except Exception as e:
+                print(f"Error in analyze_note_stream: {str(e)}")
+                yield json_stream.sse_event("error", {"detail": str(e)})
+                return
+            result = interaction_index.annotate_analysis(note_chunking.merge_analyses(results))
+            result["chunk_count"] = len(chunks)
+            llm_cache.store("analyze-note", normalized, ANALYZE_PROMPT_VERSION, GEMINI_MODEL, result)
+        elif result is None:
+            parser = json_stream.IncrementalEntityParser()
+            try:
+                async for chunk in llm_gateway.stream_text(GEMINI_MODEL, _analysis_prompt(note.note_text)):
+                    for section, entity in parser.feed(chunk):
+                        yield json_stream.sse_event(json_stream.SECTION_EVENTS[section], entity)
+                result = interaction_index.annotate_analysis(terminology.annotate_analysis(llm_json.parse_llm_json(parser.text, "analysis")))
+            except Exception as e:
+                print(f"Error in analyze_note_stream: {str(e)}")
+                yield json_stream.sse_event("error", {"detail": str(e)})
+                return
+            llm_cache.store("analyze-note", normalized, ANALYZE_PROMPT_VERSION, GEMINI_MODEL, result)
+        else:
+            # Complete result already available (cache hit or mock): replay its entities.
+            for section, entity in json_stream.iter_entities(result):
+                yield json_stream.sse_event(json_stream.SECTION_EVENTS[section], entity)
+        yield json_stream.sse_event("result", result)
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.post("/api/analyze-notes/batch")
+async def analyze_notes_batch(req: BatchNotesRequest, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    """Streams one NDJSON line per note as each analysis completes."""
+    if len(req.notes) > note_batching.MAX_BATCH_NOTES:
+        raise HTTPException(status_code=413, detail=f"At most {note_batching.MAX_BATCH_NOTES} notes per batch")
+    
+    await audit.sink.log(f"Batch Clinical Note Analysis ({len(req.notes)} notes)", current_user.username, "Success")
+    
+    texts = [note.note_text for note in req.notes]
+    if api_key:
+        stream = note_batching.stream_batch(
+            texts, _generate_analysis, _generate_packed_analysis,
+            lookup=lambda text: llm_cache.lookup("analyze-note", llm_cache.normalize_text(text),
+                                                 ANALYZE_PROMPT_VERSION, GEMINI_MODEL)
+        )
+    else:
+        async def mock_analysis(text):
+            return get_mock_analysis(current_user.username, text)
+        stream = note_batching.stream_batch(texts, mock_analysis)
+    
+    async def ndjson():
+        async for item in stream:
+            item["patient_id"] = req.notes[item["index"]].patient_id or current_user.username
+            yield fast_json.dumps_line(item)
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
 
 @app.post("/api/scan-prescription")
-async def scan_prescription(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    new_audit = models.AuditLog(
-        action="Prescription OCR Scan",
-        user="Web Client",
-        status="Success"
-    )
-    db.add(new_audit)
-    db.commit()
+async def scan_prescription(file: UploadFile = File(...), db: AsyncSession = Depends(get_db)):
+    await audit.sink.log("Prescription OCR Scan", "Web Client", "Success")
     
     if not api_key:
         return {
@@ -315,10 +514,21 @@ async def scan_prescription(file: UploadFile = File(...), db: Session = Depends(
             "raw_text": "DEMO MODE: Amoxicillin 500mg - 1 tab TID x 7d. Ibuprofen 400mg PRN pain."
         }
     
+    started = time.perf_counter()
+    try:
+        data, mime_type, info = await image_prep.prepare_upload(file)
+    except image_prep.UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except image_prep.UnsupportedImage as e:
+        raise HTTPException(status_code=415, detail=str(e))
+
+    # A re-photographed prescription reuses the earlier scan's result
+    dedupe_version = f"{OCR_PROMPT_VERSION}:{GEMINI_MODEL}"
+    duplicate = await scan_dedupe.lookup(info, dedupe_version)
+    if duplicate is not None:
+        return duplicate
+
     try:
-        content = await file.read()
-        model = genai.GenerativeModel('gemini-pro')
-        
         prompt = """
         Analyze this prescription image. 
         1. Extract all medications with their dosage, frequency, and duration.
@@ -333,49 +543,43 @@ async def scan_prescription(file: UploadFile = File(...), db: Session = Depends(
         }
         """
         
-        response = model.generate_content([
+        text = await llm_gateway.generate_text(GEMINI_MODEL, [
             prompt,
-            {"mime_type": file.content_type, "data": content}
+            {"mime_type": mime_type, "data": data}
         ])
-        
-        text = response.text
-        if "```json" in text:
-            text = text.split("```json")[1].split("```")[0]
-        
-        return json.loads(text.strip())
+        result = llm_json.parse_llm_json(text, "ocr")
+        # Truncated or repaired output is returned once but never replayed to re-uploads
+        if llm_cache.cacheable(result):
+            await scan_dedupe.store(info, dedupe_version, result)
+        print(f"OCR scan: {info['original_bytes']} -> {info['processed_bytes']} bytes, "
+              f"prep {info['prep_seconds']:.3f}s, total {time.perf_counter() - started:.2f}s")
+        return result
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Prescription scan timed out, try again shortly",
+                            headers={"Retry-After": "5"})
+    except llm_json.LLMJSONError as e:
+        raise HTTPException(status_code=502, detail=f"Could not read the prescription scan result: {e}")
     except Exception as e:
         print(f"Error in scan_prescription: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Failed to scan prescription: {str(e)}")
+        raise HTTPException(status_code=502, detail=f"Failed to scan prescription: {str(e)}")
 
 @app.post("/api/check-interactions")
-async def check_interactions(req: MedicationsRequest, db: Session = Depends(get_db)):
-    new_audit = models.AuditLog(
-        action="Drug Interaction Check",
-        user="Web Client",
-        status="Success"
-    )
-    db.add(new_audit)
-    db.commit()
+async def check_interactions(req: MedicationsRequest, db: AsyncSession = Depends(get_db)):
+    await audit.sink.log("Drug Interaction Check", "Web Client", "Success")
+    
+    # Pairs with a row in the local index are answered without an LLM call
+    local = interaction_index.check_medications(req.medications)
+    unknown_pairs = local["unknown_pairs"]
+    if not unknown_pairs:
+        return {"interactions": local["interactions"], "warnings": []}
     
     if not api_key:
-        # Better mock interactions
-        return {
-            "interactions": [
-                {
-                    "drug_a": "Aspirin",
-                    "drug_b": "Warfarin",
-                    "severity": "High",
-                    "mechanism": "Increased risk of bleeding due to combined anticoagulant/antiplatelet effects.",
-                    "recommendation": "Avoid combination or closely monitor INR and signs of bleeding."
-                }
-            ],
-            "warnings": ["Check patient history for gastric ulcers."]
-        }
+        return _interactions_not_checked(local)
     
+    pair_list_str = "; ".join(f"{a} + {b}" for a, b in unknown_pairs)
     try:
-        model = genai.GenerativeModel('gemini-pro')
         prompt = f"""
-        Check for drug-drug interactions between these medications: {', '.join(req.medications)}.
+        Check for drug-drug interactions between these medication pairs: {pair_list_str}.
         
         Return the result in valid JSON format ONLY with this exact structure:
         {{
@@ -404,18 +608,74 @@ async def check_interactions(req: MedicationsRequest, db: Session = Depends(get_
         }}
         If no interactions are found, return "interactions": [].
         """
-        response = model.generate_content(prompt)
-        text = response.text
-        if "```json" in text:
-            text = text.split("```json")[1].split("```")[0]
-        return json.loads(text.strip())
+
+        async def generate():
+            text = await llm_gateway.generate_text(GEMINI_MODEL, prompt)
+            return llm_json.parse_llm_json(text, "interactions")
+
+        result = await llm_cache.cached_call(
+            "check-interactions", llm_cache.normalize_medications(pair_list_str.split("; ")),
+            INTERACTIONS_PROMPT_VERSION, GEMINI_MODEL, generate
+        )
+        result["interactions"] = local["interactions"] + result.get("interactions", [])
+        return fast_json.FastJSONResponse(result)
     except Exception as e:
         print(f"Error in check_interactions: {str(e)}")
-        return {"interactions": [], "warnings": ["Error processing interaction check."]}
+        return _interactions_not_checked(local)
+
+def _interactions_not_checked(local: Dict[str, Any]) -> Dict[str, Any]:
+    """Local hits only: pairs missing from the interaction table are reported, never assumed safe."""
+    pairs = local["unknown_pairs"]
+    return {
+        "interactions": local["interactions"],
+        "pairs_not_checked": [list(pair) for pair in pairs],
+        "warnings": [f"Interactions not checked for: {'; '.join(f'{a} + {b}' for a, b in pairs)}. "
+                     "Verify these combinations with a pharmacist or drug reference."],
+    }
+
+@app.get("/api/terminology/search")
+async def search_terminology(
+    q: str = Query(..., min_length=1, max_length=200),
+    system: Optional[Literal["icd10", "rxnorm", "snomed"]] = None,
+    limit: int = Query(10, ge=1, le=terminology.TERMINOLOGY_SEARCH_LIMIT),
+):
+    """Autocomplete over ICD-10-CM, RxNorm and SNOMED CT names, synonyms and codes."""
+    return fast_json.FastJSONResponse({"query": q, "results": terminology.search(q, system, limit)})
+
+@app.get("/api/terminology/validate")
+async def validate_terminology(
+    system: Literal["icd10", "rxnorm", "snomed"],
+    code: Optional[str] = None,
+    display: Optional[str] = None,
+):
+    """Canonicalize and verify a code, or find one from its display text."""
+    return terminology.check(system, code, display)
 
 @app.post("/api/de-identify")
-async def de_identify(note: ClinicalNote):
-    return {"de_identified_text": f"[DE-IDENTIFIED] {note.note_text[:50]}..."}
+async def de_identify(note: ClinicalNote, review: Optional[bool] = None):
+    """Local Safe Harbor redaction; ``review`` adds a Gemini pass over the redacted text."""
+    result = deidentify.deidentify(note.note_text)
+    reviewed = False
+    if (deidentify.DEIDENTIFY_LLM_REVIEW if review is None else review) and api_key:
+        redacted = result["text"]
+
+        async def generate():
+            return (await llm_gateway.generate_text(GEMINI_MODEL, deidentify.review_prompt(redacted))).strip()
+
+        try:
+            text = deidentify.accept_review(redacted, await llm_cache.cached_call(
+                "de-identify", redacted, DEIDENTIFY_PROMPT_VERSION, GEMINI_MODEL, generate
+            ))
+            if text is not None:
+                result["text"], reviewed = text, True
+        except Exception as e:
+            print(f"Error in de_identify review: {str(e)}")
+    return {"de_identified_text": result["text"], "redactions": result["redactions"], "reviewed": reviewed}
+
+@app.post("/api/de-identify/stream")
+async def de_identify_stream(file: UploadFile = File(...)):
+    """De-identifies a plain-text upload of any size, streamed back line by line."""
+    return StreamingResponse(deidentify.get_engine().redact_file(file.file), media_type="text/plain; charset=utf-8")
 
 @app.post("/api/generate-coaching")
 async def generate_coaching(context: Dict[str, Any]):
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index
 from .database import Base
 from datetime import datetime
 import uuid
@@ -27,11 +27,17 @@ class AuditLog(Base):
     __tablename__ = "audit_logs"
 
     id = Column(String, primary_key=True, default=generate_uuid)
-    timestamp = Column(String, default=lambda: datetime.utcnow().isoformat())
+    timestamp = Column(DateTime, default=datetime.utcnow, nullable=False)
     action = Column(String)
     user = Column(String)
     status = Column(String)
 
+    # (timestamp, id) is the keyset the audit log is paged by, newest first.
+    __table_args__ = (
+        Index("ix_audit_logs_timestamp_id", "timestamp", "id"),
+        Index("ix_audit_logs_user_timestamp", "user", "timestamp"),
+    )
+
 class AdherenceLog(Base):
     __tablename__ = "adherence_logs"
 
@@ -39,3 +45,20 @@ class AdherenceLog(Base):
     medication_id = Column(String)
     status = Column(String)
     timestamp = Column(String)
+    user_id = Column(String)
+
+class AdherenceRollupMixin:
+    # Counts per (user, medication, UTC period); "" stands for an unknown user or medication.
+    user_id = Column(String, primary_key=True)
+    medication_id = Column(String, primary_key=True)
+    period_start = Column(String, primary_key=True)  # YYYY-MM-DD
+    taken = Column(Integer, nullable=False, default=0)
+    missed = Column(Integer, nullable=False, default=0)
+    total = Column(Integer, nullable=False, default=0)
+
+class AdherenceDailyRollup(AdherenceRollupMixin, Base):
+    __tablename__ = "adherence_daily_rollups"
+
+class AdherenceWeeklyRollup(AdherenceRollupMixin, Base):
+    # period_start is the Monday of the week
+    __tablename__ = "adherence_weekly_rollups"
@@ -0,0 +1,63 @@
+"""
+Password hashing off the event loop.
+
+Argon2 is deliberately expensive (tens of milliseconds of CPU per call), so
+hashing and verification run on a dedicated thread pool; argon2-cffi releases
+the GIL while it works. At most AUTH_MAX_PENDING calls may be running or
+queued at once. Beyond that ``AuthBusy`` is raised straight away so a login
+burst is shed with a 429 instead of building an unbounded backlog.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict
+
+from passlib.context import CryptContext
+
+AUTH_WORKERS = int(os.getenv("AUTH_WORKERS", str(min(4, os.cpu_count() or 1))))
+AUTH_MAX_PENDING = int(os.getenv("AUTH_MAX_PENDING", str(AUTH_WORKERS * 8)))
+
+pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+
+_executor = ThreadPoolExecutor(max_workers=AUTH_WORKERS, thread_name_prefix="auth-hash")
+_pending = 0
+_stats = {"completed": 0, "rejected": 0, "total_seconds": 0.0, "max_pending": 0}
+
+
+class AuthBusy(Exception):
+    """The hashing queue is full; the caller should retry shortly."""
+
+
+async def _submit(func, *args) -> Any:
+    global _pending
+    if _pending >= AUTH_MAX_PENDING:
+        _stats["rejected"] += 1
+        raise AuthBusy()
+    _pending += 1
+    _stats["max_pending"] = max(_stats["max_pending"], _pending)
+    started = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+    finally:
+        _pending -= 1
+        _stats["completed"] += 1
+        _stats["total_seconds"] += time.perf_counter() - started
+
+
+async def hash_password(password: str) -> str:
+    return await _submit(pwd_context.hash, password)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await _submit(pwd_context.verify, plain_password, hashed_password)
+
+
+def get_stats() -> Dict[str, Any]:
+    stats = dict(_stats)
+    stats["pending"] = _pending
+    stats["workers"] = AUTH_WORKERS
+    stats["max_queue"] = AUTH_MAX_PENDING
+    stats["avg_seconds"] = round(stats["total_seconds"] / stats["completed"], 4) if stats["completed"] else 0.0
+    stats["total_seconds"] = round(stats["total_seconds"], 3)
+    return stats
@@ -0,0 +1,94 @@
+"""
+Cache of users resolved from JWTs.
+
+``get_current_user`` would otherwise load the user row on every
+authenticated request. Entries are keyed by the token's ``sub`` and ``exp``
+and live for PRINCIPAL_CACHE_TTL_SECONDS, never past the token's own expiry.
+Any insert, update or delete of a User through the ORM drops that user's
+entries, under both the old and the new name when the username changed; other API workers see the change once their entry's TTL runs out.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import event, inspect
+
+from . import models
+
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", "1024"))
+
+Key = Tuple[str, int]
+
+
+class PrincipalCache:
+    def __init__(self, ttl_seconds: int = PRINCIPAL_CACHE_TTL_SECONDS,
+                 max_entries: int = PRINCIPAL_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Key, Tuple[float, models.User]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, sub: str, exp: int) -> Optional[models.User]:
+        key = (sub, exp)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, user = entry
+                if time.time() < expires_at:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return user
+                del self._entries[key]
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, sub: str, exp: int, user: models.User) -> None:
+        expires_at = min(time.time() + self.ttl_seconds, exp)
+        with self._lock:
+            self._entries[(sub, exp)] = (expires_at, user)
+            self._entries.move_to_end((sub, exp))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, sub: str) -> None:
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == sub]
+            for key in stale:
+                del self._entries[key]
+            self.stats["invalidations"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["entries"] = len(self._entries)
+        return stats
+
+
+cache = PrincipalCache()
+
+
+# active_history loads the current username before it is overwritten, even on
+# an expired instance, so _invalidate_user can see the old name in the history.
+@event.listens_for(models.User.username, "set", active_history=True)
+def _track_username(target, value, oldvalue, initiator):
+    pass
+
+
+@event.listens_for(models.User, "after_insert")
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_user(mapper, connection, target):
+    usernames = {target.username}
+    usernames.update(inspect(target).attrs.username.history.deleted)
+    for username in usernames:
+        if username:
+            cache.invalidate(username)
@@ -0,0 +1,94 @@
+"""
+Benchmark: NumPy adherence statistics vs. a per-row Python loop.
+
+Generates N adherence events spread over the last 30 days for a few hundred
+medications, computes adherence rate, current/longest streak and missed-dose
+clusters with adherence_stats.compute_stats and with a straightforward loop,
+checks that both agree and reports the time for each.
+
+Usage:
+    python benchmarks/bench_adherence_stats.py [--events 1000000 3000000] [--medications 200]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from api import adherence_stats  # noqa: E402
+
+
+def make_events(count: int, medications: int, now: datetime, days: int, rng: random.Random):
+    med_ids, statuses, timestamps = [], [], []
+    span = days * 86400 - 1
+    for _ in range(count):
+        med_ids.append(f"med-{rng.randrange(medications)}")
+        statuses.append("taken" if rng.random() < 0.85 else "skipped")
+        ts = now - timedelta(seconds=rng.randrange(span))
+        timestamps.append(ts.strftime("%Y-%m-%dT%H:%M:%S.000Z"))
+    return med_ids, statuses, timestamps
+
+
+def naive_stats(med_ids, statuses, timestamps, now: datetime, days: int, cluster_min: int):
+    start = datetime(now.year, now.month, now.day) - timedelta(days=days - 1)
+    per_med = defaultdict(list)
+    for i, (med, status, ts) in enumerate(zip(med_ids, statuses, timestamps)):
+        when = datetime.strptime(ts[:19], "%Y-%m-%dT%H:%M:%S")
+        if start <= when <= now:
+            per_med[med].append((when, i, status == "taken"))
+    results = {}
+    for med, events in per_med.items():
+        events.sort()
+        taken = longest = run = missed_run = clusters = 0
+        for _, _, was_taken in events:
+            if was_taken:
+                taken += 1
+                run += 1
+                longest = max(longest, run)
+                if missed_run >= cluster_min:
+                    clusters += 1
+                missed_run = 0
+            else:
+                run = 0
+                missed_run += 1
+        if missed_run >= cluster_min:
+            clusters += 1
+        results[med] = {"taken": taken, "total": len(events), "current_streak": run,
+                        "longest_streak": longest, "missed_clusters": clusters}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, nargs="+", default=[1000000, 3000000])
+    parser.add_argument("--medications", type=int, default=200)
+    parser.add_argument("--days", type=int, default=30)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    now = datetime.utcnow().replace(microsecond=0)
+    cluster_min = adherence_stats.ADHERENCE_MISSED_CLUSTER_MIN
+    for count in args.events:
+        med_ids, statuses, timestamps = make_events(count, args.medications, now, args.days, rng)
+
+        started = time.perf_counter()
+        vectorized = adherence_stats.compute_stats(med_ids, statuses, timestamps, now, args.days)
+        vectorized_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        naive = naive_stats(med_ids, statuses, timestamps, now, args.days, cluster_min)
+        naive_seconds = time.perf_counter() - started
+
+        keys = ("taken", "total", "current_streak", "longest_streak", "missed_clusters")
+        mismatches = sum(1 for entry in vectorized
+                         if {k: entry[k] for k in keys} != naive[entry["medication_id"]])
+        print(f"events={count:>8}  numpy={vectorized_seconds:6.2f}s  loop={naive_seconds:6.2f}s  "
+              f"speedup={naive_seconds / vectorized_seconds:5.1f}x  mismatches={mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark: per-message vs. micro-batch adherence ingestion.
+
+Generates N Pub/Sub-style envelopes (with a small share of malformed ones
+that must go to the dead-letter file) and ingests them into a fresh SQLite
+store, either one envelope per call (one insert and commit each, like the
+Pub/Sub trigger) or in batches through ingest_adherence_batch. Reports
+events/sec and the projected events/hour on one core.
+
+Usage:
+    python benchmarks/bench_analytics_ingest.py [--events 200000] [--batch-size 5000]
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+workdir = tempfile.mkdtemp(prefix="bench_analytics_")
+os.environ.setdefault("ANALYTICS_DB_PATH", os.path.join(workdir, "analytics.db"))
+os.environ.setdefault("ANALYTICS_DEAD_LETTER_PATH", os.path.join(workdir, "dead_letter.jsonl"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "analytics_pipeline"))
+
+import ingestion_function  # noqa: E402
+from adherence_store import AdherenceStore  # noqa: E402
+
+
+def make_envelopes(count: int, bad_ratio: float, rng: random.Random):
+    envelopes = []
+    for i in range(count):
+        if rng.random() < bad_ratio:
+            envelopes.append({"message_id": f"m{i}", "data": "not base64 json"})
+            continue
+        message = {
+            "event_type": "medication.adherence",
+            "user_id": f"user-{rng.randrange(5000)}",
+            "data": {"medication_id": f"med-{rng.randrange(200)}", "status": rng.choice(["taken", "skipped"]),
+                     "timestamp": "2024-01-01T08:00:00Z"},
+            "timestamp": "2024-01-01T08:00:00Z",
+        }
+        envelopes.append({"message_id": f"m{i}",
+                          "data": base64.b64encode(json.dumps(message).encode("utf-8")).decode("ascii")})
+    return envelopes
+
+
+def run(envelopes, batch_size: int, name: str):
+    store = AdherenceStore(os.path.join(workdir, f"{name}.db"))
+    totals = {"inserted": 0, "dead_lettered": 0}
+    started = time.perf_counter()
+    for start in range(0, len(envelopes), batch_size):
+        result = ingestion_function.ingest_adherence_batch(envelopes[start:start + batch_size], store)
+        totals["inserted"] += result["inserted"]
+        totals["dead_lettered"] += result["dead_lettered"]
+    elapsed = time.perf_counter() - started
+    rate = len(envelopes) / elapsed
+    print(f"{name:<12} batch={batch_size:<6} {rate:10.0f} events/s  {rate * 3600 / 1e6:7.1f}M events/h  "
+          f"inserted={totals['inserted']} dead_lettered={totals['dead_lettered']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=200000)
+    parser.add_argument("--per-message-events", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=ingestion_function.ANALYTICS_BATCH_SIZE)
+    parser.add_argument("--bad-ratio", type=float, default=0.001)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    run(make_envelopes(args.per_message_events, args.bad_ratio, rng), 1, "per-message")
+    run(make_envelopes(args.events, args.bad_ratio, rng), args.batch_size, "micro-batch")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark: full audit-log load vs. keyset pages as the table grows.
+
+Seeds a throwaway SQLite database in steps and, at each size, times
+
+  * full  - the old endpoint query, every row ordered by timestamp
+  * first - the first page from api.audit.query_page
+  * deep  - a page reached by following cursors from halfway down the table
+  * user  - the first page filtered by user
+
+Usage:
+    python benchmarks/bench_audit_pagination.py [--sizes 10000 100000 500000] [--limit 50]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+# api.database opens ./healthbridge.db relative to the working directory.
+os.chdir(tempfile.mkdtemp(prefix="bench-audit-pages-"))
+
+from sqlalchemy import select  # noqa: E402
+
+from api import audit, database, models  # noqa: E402
+
+START = datetime(2024, 1, 1)
+
+
+async def seed(from_row: int, to_row: int):
+    for chunk_start in range(from_row, to_row, 20000):
+        await audit.write_batch([
+            {
+                "timestamp": START + timedelta(seconds=i),
+                "action": f"Clinical Note Analysis {i % 7}",
+                "user": f"user{i % 50}",
+                "status": "Success",
+            }
+            for i in range(chunk_start, min(chunk_start + 20000, to_row))
+        ])
+
+
+async def timed(awaitable):
+    started = time.perf_counter()
+    await awaitable
+    return (time.perf_counter() - started) * 1000
+
+
+async def run(sizes, limit: int):
+    rows = 0
+    async with database.SessionLocal() as db:
+        for size in sorted(sizes):
+            await seed(rows, size)
+            rows = size
+            middle = START + timedelta(seconds=size // 2)
+            deep_cursor = audit.encode_cursor(middle, "~")
+
+            full = await timed(db.execute(select(models.AuditLog).order_by(models.AuditLog.timestamp.desc())))
+            first = await timed(audit.query_page(db, limit))
+            deep = await timed(audit.query_page(db, limit, cursor=deep_cursor))
+            user = await timed(audit.query_page(db, limit, user="user7"))
+            db.expunge_all()
+            print(f"rows={size:>8}  full={full:9.1f} ms  first={first:6.2f} ms  "
+                  f"deep={deep:6.2f} ms  user={user:6.2f} ms")
+    await database.engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 500000])
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.sizes, args.limit))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark: per-request audit commits vs. the group-commit audit sink.
+
+Drives concurrent clients that each write audit records the way the API
+handlers do:
+
+  * inline - the old pattern, one session and commit per record on the event loop
+  * sink   - records enqueued on api.audit.sink and flushed in batches
+
+Runs against a throwaway SQLite database in a temporary directory.
+
+Usage:
+    python benchmarks/bench_audit_sink.py [--clients 50] [--requests 40]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+# api.database opens ./healthbridge.db relative to the working directory.
+os.chdir(tempfile.mkdtemp(prefix="bench-audit-"))
+
+from sqlalchemy import func, select  # noqa: E402
+
+from api import audit, database, models  # noqa: E402
+
+
+async def inline_write(action: str):
+    await audit.write_batch([{"action": action, "user": "bench", "status": "Success"}])
+
+
+async def run(write, clients: int, requests_per_client: int):
+    await database.init_db()
+
+    async def client(n: int):
+        for i in range(requests_per_client):
+            await write(f"Benchmark {n}/{i}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(n) for n in range(clients)))
+    elapsed = time.perf_counter() - started
+    await database.engine.dispose()
+    return clients * requests_per_client / elapsed, elapsed
+
+
+async def run_sink(clients: int, requests_per_client: int):
+    audit.sink.start()
+
+    async def write(action: str):
+        await audit.sink.log(action, "bench", "Success")
+
+    rps, elapsed = await run(write, clients, requests_per_client)
+    started = time.perf_counter()
+    await audit.sink.stop()
+    drain = time.perf_counter() - started
+    await database.engine.dispose()
+    return rps, elapsed, drain
+
+
+async def count_rows() -> int:
+    async with database.SessionLocal() as db:
+        count = await db.scalar(select(func.count()).select_from(models.AuditLog))
+    await database.engine.dispose()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=40)
+    args = parser.parse_args()
+
+    print(f"clients={args.clients} requests/client={args.requests} "
+          f"flush_interval={audit.FLUSH_INTERVAL_MS}ms batch_size={audit.BATCH_SIZE}")
+    rps, elapsed = asyncio.run(run(inline_write, args.clients, args.requests))
+    print(f"   inline: {rps:9.1f} records/s  wall={elapsed:6.2f}s")
+    rps, elapsed, drain = asyncio.run(run_sink(args.clients, args.requests))
+    print(f"     sink: {rps:9.1f} records/s  wall={elapsed:6.2f}s  final drain={drain * 1000:.0f} ms")
+    print(f"sink stats: {audit.sink.get_stats()}")
+
+    print(f"rows written: {asyncio.run(count_rows())}")
+
+
+if __name__ == "__main__":
+    main()
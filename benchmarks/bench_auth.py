@@ -0,0 +1,81 @@
+"""
+Benchmark: inline Argon2 verification vs. the auth worker pool.
+
+Fires a burst of concurrent logins (password verification only, no database)
+while a probe measures how long an unrelated request, such as an LLM
+endpoint, waits for the event loop:
+
+  * inline - the old pattern, pwd_context.verify() inside the async handler
+  * pool   - api.passwords.verify_password(), with 429s once the queue is full
+
+Usage:
+    python benchmarks/bench_auth.py [--logins 200]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from api import passwords  # noqa: E402
+
+PASSWORD = "correct horse battery staple"
+
+
+async def inline_login(hashed: str) -> bool:
+    return passwords.pwd_context.verify(PASSWORD, hashed)
+
+
+async def pooled_login(hashed: str) -> bool:
+    return await passwords.verify_password(PASSWORD, hashed)
+
+
+async def probe(stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.01)
+        samples.append(time.perf_counter() - started - 0.01)
+
+
+async def run(login, logins: int, hashed: str):
+    stop = asyncio.Event()
+    stalls = []
+    probe_task = asyncio.create_task(probe(stop, stalls))
+    await asyncio.sleep(0)
+    outcomes = {"ok": 0, "rejected": 0}
+
+    async def one():
+        try:
+            await login(hashed)
+            outcomes["ok"] += 1
+        except passwords.AuthBusy:
+            outcomes["rejected"] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe_task
+    stalls.sort()
+    p99 = stalls[int(len(stalls) * 0.99) - 1] if stalls else elapsed
+    return outcomes, elapsed, p99, max(stalls) if stalls else elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=200)
+    args = parser.parse_args()
+
+    hashed = passwords.pwd_context.hash(PASSWORD)
+    print(f"logins={args.logins} workers={passwords.AUTH_WORKERS} max_queue={passwords.AUTH_MAX_PENDING}")
+    for name, login in (("inline", inline_login), ("pool", pooled_login)):
+        outcomes, elapsed, p99, worst = asyncio.run(run(login, args.logins, hashed))
+        print(f"{name:>7}: {outcomes['ok'] / elapsed:7.1f} logins/s  ok={outcomes['ok']:<4} "
+              f"429={outcomes['rejected']:<4} wall={elapsed:6.2f}s  "
+              f"loop stall p99={p99 * 1000:7.1f} ms  worst={worst * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark: local PHI de-identification throughput and recall.
+
+Generates a synthetic corpus of clinical notes with injected identifiers
+(names, dates, phone numbers, MRNs, addresses, emails, SSNs, ages over 89),
+de-identifies it with deidentify.Deidentifier in one call and streamed in
+small chunks, and reports MB/s for each plus how many injected identifiers
+survived (should be 0). No network calls.
+
+Usage:
+    python benchmarks/bench_deidentify.py [--notes 20000] [--chunk 4096]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "healthbridge_ai"))
+
+import deidentify  # noqa: E402
+
+MONTHS = ["January", "March", "June", "September", "Nov.", "Dec"]
+STREETS = ["Maple Street", "Oak Ave", "Lakeview Drive", "Cedar Ln", "Park Blvd"]
+CITIES = [("Springfield", "IL"), ("Austin", "TX"), ("Portland", "OR"), ("Salem", "MA")]
+CLINICAL = [
+    "Presents with worsening dyspnea on exertion and bilateral lower extremity edema.",
+    "Blood pressure 148/92, heart rate 88, SpO2 95% on room air.",
+    "Continue Metformin 500mg BID and Lisinopril 10mg daily; recheck A1c in 3 months.",
+    "History of type 2 diabetes, hypertension and Parkinson's disease.",
+    "Denies chest pain, fever or chills. Will follow up with Cardiology.",
+    "Labs notable for potassium 5.4 and creatinine 1.6, up from baseline 1.1.",
+]
+
+
+def make_note(rng: random.Random, first, last):
+    name = f"{rng.choice(first)} {rng.choice(last)}"
+    relative = f"{rng.choice(first)} {rng.choice(last)}"
+    doctor = rng.choice(last)
+    city, state = rng.choice(CITIES)
+    phi = {
+        "name": name, "relative": relative, "doctor": doctor,
+        "dob": f"{rng.randint(1, 12)}/{rng.randint(1, 28)}/{rng.randint(1930, 2005)}",
+        "visit": f"{rng.choice(MONTHS)} {rng.randint(1, 28)}, {rng.randint(2019, 2024)}",
+        "mrn": str(rng.randint(1000000, 9999999)),
+        "phone": f"({rng.randint(200, 999)}) {rng.randint(200, 999)}-{rng.randint(1000, 9999)}",
+        "street": f"{rng.randint(1, 9999)} {rng.choice(STREETS)}",
+        "zip": f"{city}, {state} {rng.randint(10000, 99999)}",
+        "email": f"{name.split()[0].lower()}.{rng.randint(1, 999)}@example.com",
+        "ssn": f"{rng.randint(100, 899)}-{rng.randint(10, 99)}-{rng.randint(1000, 9999)}",
+        "age": f"{rng.randint(90, 104)}-year-old",
+    }
+    lines = [
+        f"Patient: {phi['name']}   DOB: {phi['dob']}   MRN: {phi['mrn']}",
+        f"Seen by Dr. {phi['doctor']} on {phi['visit']}. Contact {phi['phone']}, {phi['email']}.",
+        f"Address: {phi['street']}, {phi['zip']}. SSN {phi['ssn']}.",
+        f"{phi['age']} accompanied by {phi['relative']} (daughter).",
+    ] + rng.sample(CLINICAL, 4)
+    return "\n".join(lines) + "\n\n", phi
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--notes", type=int, default=20000)
+    parser.add_argument("--chunk", type=int, default=4096, help="chunk size for the streamed run")
+    args = parser.parse_args()
+
+    rng = random.Random(23)
+    first, last = deidentify.load_names()
+    first = sorted(n.title() for n in first - deidentify.AMBIGUOUS_NAMES)
+    last = sorted(n.title() for n in last - deidentify.AMBIGUOUS_NAMES)
+    notes, injected = [], []
+    for _ in range(args.notes):
+        note, phi = make_note(rng, first, last)
+        notes.append(note)
+        injected.append(phi)
+    corpus = "".join(notes)
+    megabytes = len(corpus.encode("utf-8")) / 1e6
+    engine = deidentify.get_engine()
+
+    started = time.perf_counter()
+    redacted, counts = engine.redact(corpus)
+    elapsed = time.perf_counter() - started
+    print(f"corpus={megabytes:.1f} MB  notes={args.notes}")
+    print(f"redact            {elapsed:6.2f}s  {megabytes / elapsed:6.1f} MB/s")
+
+    started = time.perf_counter()
+    chunks = (corpus[i:i + args.chunk] for i in range(0, len(corpus), args.chunk))
+    streamed = "".join(engine.redact_stream(chunks))
+    elapsed = time.perf_counter() - started
+    print(f"redact_stream     {elapsed:6.2f}s  {megabytes / elapsed:6.1f} MB/s  identical={streamed == redacted}")
+
+    survived = {}
+    for phi in injected:
+        for kind, value in phi.items():
+            parts = value.split() if kind in ("name", "relative") else [value]
+            if any(part in redacted for part in parts if len(part) > 3):
+                survived[kind] = survived.get(kind, 0) + 1
+    print(f"redactions        {dict(counts)}")
+    print(f"identifiers left  {sum(survived.values())} of {sum(len(p) for p in injected)} {survived or ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark: Aho-Corasick dictionary matcher vs. per-term substring tests.
+
+Pads the shipped terminology file with synthetic terms up to --terms entries
+and runs both approaches over generated notes of --note-chars characters.
+
+Usage:
+    python benchmarks/bench_dictionary_matcher.py [--terms 30000] [--note-chars 8000] [--notes 200]
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from clinical_service.dictionary_matcher import DictionaryMatcher, Term, load_terms  # noqa: E402
+
+SENTENCES = [
+    "Patient with type 2 diabetes and hypertension presents for follow up.",
+    "Currently taking metformin 1000mg twice daily and lisinopril 10mg daily.",
+    "Denies chest pain or shortness of breath; reports intermittent headache.",
+    "History of atrial fibrillation on warfarin, INR reviewed today.",
+    "Plan: continue atorvastatin, start aspirin 81mg, recheck labs in 3 months.",
+    "Social history notable for tobacco use; counseled on cessation.",
+]
+
+
+def synthetic_terms(count: int, rng: random.Random):
+    for i in range(count):
+        word = "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(6, 14)))
+        if rng.random() < 0.3:
+            word += " " + "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9)))
+        yield Term(word, "CONDITION" if i % 2 else "MEDICATION", str(900000 + i), word)
+
+
+def make_note(chars: int, rng: random.Random) -> str:
+    parts = []
+    size = 0
+    while size < chars:
+        sentence = rng.choice(SENTENCES)
+        parts.append(sentence)
+        size += len(sentence) + 1
+    return " ".join(parts)
+
+
+def naive_extract(terms, text):
+    lowered = text.lower()
+    return [term for term in terms if term.term in lowered]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--terms", type=int, default=30000)
+    parser.add_argument("--note-chars", type=int, default=8000)
+    parser.add_argument("--notes", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    terms = load_terms(os.path.join(ROOT, "clinical_service", "data", "terminology.csv"))
+    terms.extend(synthetic_terms(max(0, args.terms - len(terms)), rng))
+
+    started = time.perf_counter()
+    matcher = DictionaryMatcher(terms)
+    print(f"built automaton over {len(matcher)} terms in {time.perf_counter() - started:.2f} s")
+
+    notes = [make_note(args.note_chars, rng) for _ in range(args.notes)]
+    megabytes = sum(len(n) for n in notes) / 1e6
+
+    started = time.perf_counter()
+    matches = sum(len(matcher.find_all(note)) for note in notes)
+    elapsed = time.perf_counter() - started
+    print(f"aho-corasick: {args.notes / elapsed:9.1f} notes/s  {megabytes / elapsed:6.2f} MB/s  ({matches} matches)")
+
+    sample = notes[: max(1, args.notes // 20)]
+    started = time.perf_counter()
+    for note in sample:
+        naive_extract(terms, note)
+    elapsed = time.perf_counter() - started
+    print(f"naive loop:   {len(sample) / elapsed:9.1f} notes/s  (measured on {len(sample)} notes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark: events/sec for the batched event bus vs. one write per event.
+
+Publishes N adherence-shaped events from several threads and reports
+throughput for:
+  * per-event: each event appended and fsynced on its own (what a naive
+    durable publisher does, and the shape of one network call per event)
+  * batched: event_bus.EventBus with group commit, fsync on and off
+It also reports how fast a Consumer reads the log back.
+
+Usage:
+    python benchmarks/bench_event_bus.py [--events 20000] [--threads 4] [--batch-size 500]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from healthbridge_ai import event_bus  # noqa: E402
+
+TOPIC = "medication.adherence"
+
+
+def make_event(i: int) -> dict:
+    return {
+        "event_type": TOPIC,
+        "user_id": f"user-{i % 500}",
+        "data": {"medication_id": f"med-{i % 40}", "status": "taken", "timestamp": "2024-01-01T08:00:00Z"},
+        "timestamp": "2024-01-01T08:00:00Z",
+    }
+
+
+def run_threads(total: int, threads: int, publish) -> float:
+    per_thread = total // threads
+
+    def worker(offset: int):
+        for i in range(offset, offset + per_thread):
+            publish(make_event(i))
+
+    workers = [threading.Thread(target=worker, args=(t * per_thread,)) for t in range(threads)]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return time.perf_counter() - started
+
+
+def bench_per_event(total: int, threads: int, fsync: bool) -> float:
+    log = event_bus.SegmentLog(tempfile.mkdtemp(prefix="bench_events_"), TOPIC, fsync=fsync)
+    elapsed = run_threads(total, threads, lambda data: log.append([{"topic": TOPIC, "data": data}]))
+    return total / elapsed
+
+
+def bench_batched(directory: str, total: int, threads: int, batch_size: int, fsync: bool):
+    bus = event_bus.EventBus(directory, batch_size=batch_size, fsync=fsync)
+    started = time.perf_counter()
+    run_threads(total, threads, lambda data: bus.publish(TOPIC, data))
+    bus.flush()
+    elapsed = time.perf_counter() - started
+    stats = bus.get_stats()
+    bus.close()
+    return total / elapsed, stats
+
+
+def bench_consumer(directory: str) -> float:
+    consumer = event_bus.Consumer(TOPIC, "bench", directory)
+    count = 0
+    started = time.perf_counter()
+    while True:
+        events = consumer.poll(1000)
+        if not events:
+            break
+        count += len(events)
+        consumer.commit()
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=event_bus.EVENT_BATCH_SIZE)
+    parser.add_argument("--per-event-events", type=int, default=2000,
+                        help="events for the per-event fsync run, which is slow")
+    args = parser.parse_args()
+
+    print(f"events={args.events} threads={args.threads} batch_size={args.batch_size}")
+    rate = bench_per_event(args.per_event_events, args.threads, fsync=True)
+    print(f"per-event  fsync=on   {rate:10.0f} events/s")
+    rate = bench_per_event(args.events, args.threads, fsync=False)
+    print(f"per-event  fsync=off  {rate:10.0f} events/s")
+
+    for fsync in (True, False):
+        directory = tempfile.mkdtemp(prefix="bench_events_")
+        rate, stats = bench_batched(directory, args.events, args.threads, args.batch_size, fsync)
+        print(f"batched    fsync={'on ' if fsync else 'off'}  {rate:10.0f} events/s  "
+              f"({stats['batches']} appends, {stats['written'] / max(stats['batches'], 1):.0f} events/append)")
+    print(f"consumer              {bench_consumer(directory):10.0f} events/s read + committed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmark: streaming FHIR bulk export from the fhir.created event log.
+
+Publishes N FHIR Bundles (as the clinical service does on /ingest) to a
+temporary event log, then exports them to NDJSON with and without gzip in a
+fresh process per run, and reports resources/sec, output size and the peak
+RSS of the exporting process. Peak RSS should stay roughly flat as N grows.
+
+Usage:
+    python benchmarks/bench_fhir_export.py [--bundles 20000 200000] [--entities 4]
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "clinical_service"))
+sys.path.insert(0, os.path.join(ROOT, "healthbridge_ai"))
+
+import bulk_export  # noqa: E402
+import event_bus  # noqa: E402
+from fhir import map_to_fhir_bundle  # noqa: E402
+
+CONDITIONS = [("E11.9", "type 2 diabetes"), ("I10", "hypertension"), ("J45.909", "asthma"), ("E78.5", "hyperlipidemia")]
+MEDICATIONS = [("860975", "metformin"), ("197361", "amlodipine"), ("745679", "albuterol"), ("617312", "atorvastatin")]
+
+
+def populate(directory: str, bundles: int, entities: int) -> None:
+    rng = random.Random(5)
+    bus = event_bus.EventBus(directory, fsync=False)
+    for i in range(bundles):
+        found = []
+        for _ in range(entities):
+            kind, pool = rng.choice((("CONDITION", CONDITIONS), ("MEDICATION", MEDICATIONS)))
+            code, text = rng.choice(pool)
+            found.append({"type": kind, "code": code, "text": text})
+        bus.publish(bulk_export.FHIR_EXPORT_TOPIC, map_to_fhir_bundle(f"patient-{i}", found))
+    bus.close()
+
+
+def run_export(directory: str, output_dir: str, compress: bool) -> dict:
+    result = bulk_export.export(output_dir, compress=compress, directory=directory)
+    result["bytes"] = sum(os.path.getsize(os.path.join(output_dir, name)) for name in result["files"].values())
+    result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bundles", type=int, nargs="+", default=[20000, 200000])
+    parser.add_argument("--entities", type=int, default=4)
+    parser.add_argument("--worker", nargs=3, metavar=("LOG_DIR", "OUTPUT_DIR", "GZIP"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        directory, output_dir, compress = args.worker
+        print(json.dumps(run_export(directory, output_dir, compress == "1")))
+        return
+
+    for bundles in args.bundles:
+        work = tempfile.mkdtemp(prefix="bench_fhir_export_")
+        directory = os.path.join(work, "events")
+        populate(directory, bundles, args.entities)
+        for compress in (False, True):
+            output_dir = os.path.join(work, "gzip" if compress else "plain")
+            out = subprocess.run([sys.executable, __file__, "--worker", directory, output_dir, "1" if compress else "0"],
+                                 check=True, capture_output=True, text=True).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            print(f"bundles={bundles:>7}  gzip={str(compress):5}  resources={result['resources']:>8}  "
+                  f"{result['seconds']:6.2f}s  {result['resources_per_second']:>8,}/s  "
+                  f"size={result['bytes'] / 1e6:7.1f} MB  peak RSS={result['peak_rss_mb']:5.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Benchmark: local drug-drug interaction index.
+
+Measures index load time and per-request latency for medication lists of
+increasing length (all n*(n-1)/2 pairs are checked).
+
+Usage:
+    python benchmarks/bench_interactions.py [--iterations 2000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from healthbridge_ai import interaction_index  # noqa: E402
+
+SAMPLE_MEDS = [
+    "Coumadin 5mg tablet", "Aspirin 81 mg", "Lisinopril 10mg daily", "Potassium Chloride 20 mEq",
+    "Metformin 500mg", "Zocor 40mg", "Biaxin 500 mg", "Zoloft 50mg", "Tramadol 50mg PRN",
+    "Lanoxin 0.125mg", "Amiodarone 200mg", "Synthroid 75 mcg", "Tums", "Cipro 500mg",
+    "Norvasc 5mg", "Plavix 75mg", "Prilosec 20mg", "Lasix 40mg", "Lithium carbonate 300mg", "HCTZ 25mg",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    index = interaction_index.load_index()
+    print(f"loaded {index.ingredient_count} ingredients / {index.pair_count} pairs "
+          f"in {(time.perf_counter() - started) * 1000:.2f} ms")
+
+    rng = random.Random(0)
+    for n in (2, 5, 10, 20):
+        lists = [rng.sample(SAMPLE_MEDS, n) for _ in range(args.iterations)]
+        started = time.perf_counter()
+        found = 0
+        for meds in lists:
+            found += len(index.check(meds)["interactions"])
+        per_call = (time.perf_counter() - started) / args.iterations
+        pairs = n * (n - 1) // 2
+        print(f"n={n:>2} ({pairs:>3} pairs): {per_call * 1e6:8.1f} us/check  "
+              f"avg interactions={found / args.iterations:.2f}")
+
+
+if __name__ == "__main__":
+    main()
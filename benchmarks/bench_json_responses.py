@@ -0,0 +1,82 @@
+"""
+Benchmark: response serialization cost for large lists.
+
+Builds N rows of audit records, medications and full note-analysis payloads
+and times three ways of turning them into a response body:
+  * default  - ORM objects through jsonable_encoder, then json.dumps
+               (what FastAPI does when an endpoint returns them as-is)
+  * project  - explicit row-to-dict projection, then jsonable_encoder + json.dumps
+  * orjson   - explicit projection rendered by fast_json.FastJSONResponse
+               (what the endpoints now return)
+
+Usage:
+    python benchmarks/bench_json_responses.py [--rows 10000] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+from api import audit, models  # noqa: E402
+from api.index import _medication_dict, get_mock_analysis  # noqa: E402
+from healthbridge_ai import fast_json  # noqa: E402
+
+
+def default_render(content) -> bytes:
+    # fastapi.responses.JSONResponse.render after jsonable_encoder
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    now = datetime.utcnow()
+    audit_rows = [models.AuditLog(id=str(uuid.uuid4()), timestamp=now - timedelta(seconds=i),
+                                  action=f"Adherence Log: med-{i % 50}", user="System", status="taken")
+                  for i in range(args.rows)]
+    medications = [models.Medication(id=str(uuid.uuid4()), name=f"Medication {i}", dosage="500mg",
+                                     frequency="Twice Daily") for i in range(args.rows)]
+    analyses = [get_mock_analysis(f"patient-{i}", "note") for i in range(args.rows)]
+
+    cases = [
+        ("audit log", audit_rows, lambda rows: {"items": [audit._as_dict(r) for r in rows], "next_cursor": None}),
+        ("medications", medications, lambda rows: [_medication_dict(r) for r in rows]),
+        ("analyses", analyses, None),
+    ]
+    print(f"rows={args.rows}  (best of {args.repeat})")
+    for name, rows, project in cases:
+        default = best_of(lambda: default_render(rows), args.repeat)
+        if project is None:
+            # Already plain dicts: only the encoder differs.
+            projected = default
+            fast = best_of(lambda: fast_json.FastJSONResponse(rows).body, args.repeat)
+        else:
+            projected = best_of(lambda: default_render(project(rows)), args.repeat)
+            fast = best_of(lambda: fast_json.FastJSONResponse(project(rows)).body, args.repeat)
+            assert json.loads(default_render(project(rows))) == json.loads(fast_json.dumps(project(rows)))
+        print(f"{name:12} default={default * 1e3:8.1f} ms  project={projected * 1e3:8.1f} ms  "
+              f"orjson={fast * 1e3:7.1f} ms  speedup={default / fast:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark: blocking Gemini calls vs. the async LLM gateway.
+
+Simulates an LLM round trip with a blocking sleep and drives 50 concurrent
+clients against two handler styles:
+
+  * blocking - the old pattern, a sync generate_content() inside an async handler
+  * gateway  - the same call routed through llm_gateway.run_blocking()
+
+A health-check probe runs alongside to show how long the event loop stalls.
+
+Usage:
+    python benchmarks/bench_llm_gateway.py [--clients 50] [--requests 4] [--latency 0.5]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from healthbridge_ai import llm_gateway  # noqa: E402
+
+
+def fake_generate(latency: float) -> str:
+    time.sleep(latency)
+    return '{"status": "success"}'
+
+
+async def blocking_handler(latency: float) -> str:
+    return fake_generate(latency)
+
+
+async def gateway_handler(latency: float) -> str:
+    return await llm_gateway.run_blocking(fake_generate, latency)
+
+
+async def health_probe(stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.01)
+        samples.append(time.perf_counter() - started - 0.01)
+
+
+async def run(handler, clients: int, requests_per_client: int, latency: float):
+    stop = asyncio.Event()
+    stalls = []
+    probe = asyncio.create_task(health_probe(stop, stalls))
+
+    async def client():
+        for _ in range(requests_per_client):
+            await handler(latency)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe
+
+    total = clients * requests_per_client
+    worst_stall = max(stalls) if stalls else elapsed
+    return total / elapsed, elapsed, worst_stall
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.5, help="simulated LLM latency in seconds")
+    args = parser.parse_args()
+
+    print(f"clients={args.clients} requests/client={args.requests} latency={args.latency}s "
+          f"max_concurrency={llm_gateway.MAX_CONCURRENCY}")
+    for name, handler in (("blocking", blocking_handler), ("gateway", gateway_handler)):
+        rps, elapsed, stall = asyncio.run(run(handler, args.clients, args.requests, args.latency))
+        print(f"{name:>9}: {rps:8.2f} req/s  wall={elapsed:6.2f}s  worst health-check stall={stall * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Benchmark: section-aware chunking and parallel analysis of long notes.
+
+Builds a synthetic discharge summary (HPI, ROS with negated findings, home and
+discharge medication lists, labs, a long hospital course, assessment/plan)
+and analyzes it with a simulated model whose latency grows with input and
+output tokens and whose output stops at max_output_tokens, like Gemini's.
+No network calls. Reports:
+  * chunk count and sizes, and the CPU cost of chunking
+  * wall-clock latency of one whole-note call vs chunked at several fan-outs
+  * entities recovered vs the note's ground truth, and negation flags kept
+
+Usage:
+    python benchmarks/bench_note_chunking.py [--problems 30] [--meds 30] [--no-repeat] [--time-scale 0.05]
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from healthbridge_ai import note_chunking  # noqa: E402
+
+CONDITIONS = ["hypertension", "type 2 diabetes", "atrial fibrillation", "heart failure", "chronic kidney disease",
+              "pneumonia", "COPD", "hyperlipidemia", "anemia", "hypothyroidism", "osteoarthritis", "gout",
+              "depression", "obstructive sleep apnea", "cellulitis", "urinary tract infection", "hyponatremia",
+              "acute kidney injury", "delirium", "pressure ulcer", "peripheral neuropathy", "GERD", "asthma",
+              "deep vein thrombosis", "pulmonary embolism", "stroke", "migraine", "cirrhosis", "pancreatitis",
+              "sepsis"]
+SYMPTOMS = ["fever", "chills", "chest pain", "palpitations", "syncope", "hemoptysis", "dysuria", "melena",
+            "headache", "abdominal pain", "nausea", "vomiting", "diarrhea", "rash", "weight loss", "night sweats"]
+DRUGS = ["Metformin", "Lisinopril", "Atorvastatin", "Metoprolol", "Apixaban", "Furosemide", "Levothyroxine",
+         "Omeprazole", "Sertraline", "Allopurinol", "Gabapentin", "Amlodipine", "Insulin glargine", "Warfarin",
+         "Spironolactone", "Tamsulosin", "Prednisone", "Albuterol", "Carvedilol", "Losartan", "Clopidogrel",
+         "Pantoprazole", "Hydrochlorothiazide", "Donepezil", "Escitalopram", "Simvastatin", "Digoxin",
+         "Rivaroxaban", "Montelukast", "Trazodone"]
+LABS = ["Sodium", "Potassium", "Creatinine", "BUN", "Glucose", "Hemoglobin", "WBC", "Platelets", "INR", "BNP"]
+FILLER = ("Patient was seen and examined at bedside with the team, and the plan was discussed with nursing, "
+          "pharmacy and the patient's family, who agree with the current management. ")
+ALL_TERMS = sorted(CONDITIONS + SYMPTOMS, key=len, reverse=True)
+_TERM_RE = re.compile(r"\b(" + "|".join(re.escape(t) for t in ALL_TERMS) + r")\b", re.IGNORECASE)
+_DRUG_RE = re.compile(r"\b(" + "|".join(re.escape(d) for d in DRUGS) + r") (\d+ (?:mg|units))", re.IGNORECASE)
+_LAB_RE = re.compile(r"^(" + "|".join(LABS) + r") ([\d.]+)$", re.MULTILINE)
+_NEGATION_RE = re.compile(r"\b(?:denies|no|negative for|without)\b[^.;]*$", re.IGNORECASE)
+
+
+def make_summary(rng: random.Random, problems: int, meds: int, repeat: bool = True) -> str:
+    """A discharge summary; with ``repeat``, problems and medications recur across sections as they do in practice."""
+    conditions = rng.sample(CONDITIONS, min(problems, len(CONDITIONS)))
+    drugs = rng.sample(DRUGS, min(meds, len(DRUGS)))
+    doses = {d: f"{rng.choice([5, 10, 20, 25, 40, 50, 100, 500])} mg" for d in drugs}
+    lines = ["DISCHARGE SUMMARY", "", "Chief Complaint: shortness of breath", "",
+             "History of Present Illness:"]
+    for c in conditions[:6]:
+        lines.append(f"The patient has a history of {c}, which has been stable. "
+                     f"Denies {rng.choice(SYMPTOMS)} and {rng.choice(SYMPTOMS)}. {FILLER}")
+    lines += ["", "Past Medical History:"] + [f"- {c}" for c in conditions] + [""]
+    lines += ["Home Medications:"] + [f"- {d} {doses[d]} daily" for d in drugs] + [""]
+    lines += ["Allergies: penicillin (rash)", "", "Review of Systems:"]
+    lines += [f"Negative for {s}." for s in rng.sample(SYMPTOMS, 8)] + [""]
+    lines += ["Physical Exam:", "General: no acute distress. Lungs: bibasilar crackles.", "", "Labs:"]
+    lines += [f"{lab} {round(rng.uniform(1, 150), 1)}" for lab in LABS] + [""]
+    lines += ["Hospital Course:"]
+    for c in (conditions if repeat else rng.sample(SYMPTOMS, min(problems, len(SYMPTOMS)))):
+        drug = rng.choice(drugs)
+        lines += [f"# {c.capitalize()}: treated during the admission with {drug} {doses[drug]}, "
+                  f"no {rng.choice(SYMPTOMS)} on the floor. {FILLER * 2}", ""]
+    lines += ["Assessment and Plan:"]
+    lines += [f"{i}. {c.capitalize()} - continue current therapy, outpatient follow up. {FILLER}"
+              for i, c in enumerate(conditions if repeat else ["the above"], 1)] + [""]
+    if repeat:
+        lines += ["Discharge Medications:"] + [f"- {d} {doses[d]} daily" for d in drugs] + [""]
+    lines += ["Follow-up: primary care in 1 week, cardiology in 4 weeks."]
+    return "\n".join(lines) + "\n"
+
+
+def extract(text: str) -> dict:
+    """What a perfect model would return for ``text`` (before any output limit)."""
+    conditions, medications, labs = [], [], []
+    for sentence in re.split(r"(?<=[.;:])\s+|\n", text):
+        for m in _TERM_RE.finditer(sentence):
+            negated = bool(_NEGATION_RE.search(sentence[:m.start()]))
+            conditions.append({"clinical_text": m.group(1).lower(), "negated": negated, "confidence": 90})
+        for m in _DRUG_RE.finditer(sentence):
+            medications.append({"drug_name": m.group(1), "dosage": m.group(2), "confidence": 95})
+    for m in _LAB_RE.finditer(text):
+        labs.append({"test_name": m.group(1), "result": m.group(2)})
+    return {"status": "success",
+            "extracted_entities": {"conditions": conditions, "medications": medications, "labs": labs}}
+
+
+def entity_keys(result: dict) -> set:
+    entities = result.get("extracted_entities") or {}
+    return {(section, note_chunking._identity(e)) for section, items in entities.items() for e in items}
+
+
+def make_model(args, calls: list):
+    """Simulated LLM: fixed overhead, prefill and per-output-token decode time, output capped."""
+    async def analyze(text: str) -> dict:
+        # Each entity is listed once per answer and costs ~60 output tokens.
+        result = note_chunking.merge_analyses([extract(text)])
+        entities = result["extracted_entities"]
+        budget = (args.max_output_tokens - 200) // 60
+        kept = 0
+        for section in ("conditions", "medications", "labs"):
+            entities[section] = entities[section][:max(0, budget - kept)]
+            kept += len(entities[section])
+        output_tokens = 200 + 60 * kept
+        input_tokens = note_chunking.estimate_tokens(text) + args.prompt_tokens
+        latency = args.overhead + input_tokens / args.prefill_tps + output_tokens / args.decode_tps
+        calls.append((input_tokens, output_tokens))
+        await asyncio.sleep(latency * args.time_scale)
+        return result
+    return analyze
+
+
+async def timed(coro):
+    started = time.perf_counter()
+    result = await coro
+    return result, time.perf_counter() - started
+
+
+async def run(args):
+    rng = random.Random(25)
+    note = make_summary(rng, args.problems, args.meds, not args.no_repeat)
+    truth = entity_keys(note_chunking.merge_analyses([extract(note)]))
+    negated_truth = {k for k in truth if k[0] == "conditions" and k[1][2]}
+
+    started = time.perf_counter()
+    for _ in range(100):
+        chunks = note_chunking.chunk_note(note)
+    chunk_ms = (time.perf_counter() - started) * 10
+    print(f"note={note_chunking.estimate_tokens(note)} tokens  chunks={len(chunks)}  "
+          f"costs={[note_chunking.chunk_cost(c) for c in chunks]}  chunking={chunk_ms:.2f} ms")
+    print(f"ground truth: {len(truth)} unique entities, {len(negated_truth)} negated findings")
+
+    calls = []
+    whole, elapsed = await timed(make_model(args, calls)(note))
+    whole_keys = entity_keys(note_chunking.merge_analyses([whole]))
+    base = elapsed / args.time_scale
+    print(f"{'whole note':18} {base:6.1f}s (simulated)  output={calls[-1][1]} tokens  "
+          f"entities={len(whole_keys & truth)}/{len(truth)}")
+
+    for fan_out in sorted({1, 2, note_chunking.CHUNK_MAX_CONCURRENCY, len(chunks)}):
+        calls = []
+        merged, elapsed = await timed(note_chunking.analyze_chunked(
+            note, make_model(args, calls), max_concurrency=fan_out, chunks=chunks))
+        keys = entity_keys(merged)
+        negated_ok = all(k in keys for k in negated_truth)
+        flipped = {k for k in keys if k[0] == "conditions" and k[1][2]} - negated_truth
+        simulated = elapsed / args.time_scale
+        print(f"chunked fan-out={fan_out:<3} {simulated:6.1f}s (simulated)  speedup={base / simulated:4.1f}x  "
+              f"entities={len(keys & truth)}/{len(truth)} extra={len(keys - truth)}  "
+              f"negations kept={negated_ok} wrongly negated={len(flipped)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--problems", type=int, default=30)
+    parser.add_argument("--meds", type=int, default=30)
+    parser.add_argument("--no-repeat", action="store_true",
+                        help="mention each problem and medication in one section only")
+    parser.add_argument("--prompt-tokens", type=int, default=900, help="system prompt prepended to every call")
+    parser.add_argument("--max-output-tokens", type=int, default=8192)
+    parser.add_argument("--overhead", type=float, default=0.5, help="seconds per call")
+    parser.add_argument("--prefill-tps", type=float, default=4000.0)
+    parser.add_argument("--decode-tps", type=float, default=80.0)
+    parser.add_argument("--time-scale", type=float, default=0.05, help="sleep this fraction of simulated latency")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
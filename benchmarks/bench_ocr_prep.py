@@ -0,0 +1,79 @@
+"""
+Benchmark: raw phone photo vs. pre-processed image for prescription OCR.
+
+Generates a synthetic 12 MP "photo" of a prescription (text on a noisy,
+unevenly lit page, stored with an EXIF rotation like a phone camera would)
+and reports payload size and estimated end-to-end latency before and after
+image_prep. The model upload is simulated at --uplink-mbps; model time is
+not included.
+
+Usage:
+    python benchmarks/bench_ocr_prep.py [--width 4032] [--height 3024] [--uplink-mbps 20]
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from PIL import Image, ImageDraw, ImageFilter  # noqa: E402
+
+from healthbridge_ai import image_prep  # noqa: E402
+
+LINES = [
+    "Rx  Amoxicillin 500 mg  1 cap PO TID x 7 days",
+    "    Ibuprofen 400 mg  1 tab PO q6h PRN pain",
+    "    Lisinopril 10 mg  1 tab PO daily",
+    "Dr. A. Example   DEA AB1234567   Refills: 0",
+]
+
+
+def synthetic_photo(width: int, height: int) -> bytes:
+    random.seed(7)
+    image = Image.effect_noise((width // 4, height // 4), 40).resize((width, height)).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([width // 10, height // 10, width * 9 // 10, height * 9 // 10], fill=(236, 232, 220))
+    for i, line in enumerate(LINES * 6):
+        draw.text((width // 8, height // 8 + i * height // 40), line, fill=(20, 20, 40))
+    image = image.filter(ImageFilter.GaussianBlur(0.6))
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotate 90 degrees on display, as phones do
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=95, exif=exif)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--width", type=int, default=4032)
+    parser.add_argument("--height", type=int, default=3024)
+    parser.add_argument("--uplink-mbps", type=float, default=20.0, help="simulated bandwidth to the model API")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    photo = synthetic_photo(args.width, args.height)
+    bytes_per_second = args.uplink_mbps * 1_000_000 / 8
+
+    timings = []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        data, mime_type, info = image_prep.prepare_image(io.BytesIO(photo), "image/jpeg")
+        timings.append(time.perf_counter() - started)
+    prep = sorted(timings)[len(timings) // 2]
+
+    before = len(photo) / bytes_per_second
+    after = prep + len(data) / bytes_per_second
+    print(f"image {args.width}x{args.height}  max_dimension={image_prep.MAX_DIMENSION} "
+          f"grayscale={image_prep.GRAYSCALE} uplink={args.uplink_mbps} Mbit/s")
+    print(f" before: {len(photo) / 1024:8.0f} KB  {info['original_size']}  upload={before * 1000:7.0f} ms")
+    print(f"  after: {len(data) / 1024:8.0f} KB  {info['processed_size']}  "
+          f"prep={prep * 1000:5.0f} ms + upload={len(data) / bytes_per_second * 1000:5.0f} ms "
+          f"= {after * 1000:7.0f} ms  ({mime_type})")
+    print(f"payload reduced {len(photo) / len(data):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark: patient store load, lookup, range scan and snapshot at scale.
+
+Fills a PatientStore with N users (each with a few medications and
+adherence logs over the last month), then reports:
+  * insert throughput
+  * get_medications / get_medication latency for random users
+  * adherence range-scan latency (one week out of the month)
+  * snapshot write time and size, and reload time
+  * peak RSS of the process
+
+Usage:
+    python benchmarks/bench_patient_store.py [--users 1000000] [--medications 1] [--logs 3]
+"""
+import argparse
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "patient_service"))
+
+from patient_store import PatientStore  # noqa: E402
+
+
+def timed_lookups(fn, args_list):
+    started = time.perf_counter()
+    for args in args_list:
+        fn(*args)
+    return (time.perf_counter() - started) / len(args_list)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000000)
+    parser.add_argument("--medications", type=int, default=1)
+    parser.add_argument("--logs", type=int, default=3)
+    parser.add_argument("--lookups", type=int, default=100000)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_patient_store_"), "store.snapshot")
+    store = PatientStore(snapshot_path=path)
+    now = datetime.utcnow()
+    user_ids = [f"user-{i}" for i in range(args.users)]
+    med_ids = {}
+
+    started = time.perf_counter()
+    for user_id in user_ids:
+        for _ in range(args.medications):
+            med_id = str(uuid.uuid4())
+            store.add_medication(user_id, {"name": "Metformin", "dosage": "500mg", "frequency": "BID",
+                                           "id": med_id, "created_at": now.isoformat()})
+        med_ids[user_id] = med_id
+        for _ in range(args.logs):
+            ts = now - timedelta(seconds=rng.randrange(30 * 86400))
+            store.add_adherence(user_id, {"medication_id": med_id, "status": "taken",
+                                          "timestamp": ts.isoformat() + "Z", "id": str(uuid.uuid4())})
+    elapsed = time.perf_counter() - started
+    records = args.users * (args.medications + args.logs)
+    print(f"users={args.users} records={records}  insert={elapsed:6.1f}s ({records / elapsed:,.0f} records/s)")
+
+    sample = [rng.choice(user_ids) for _ in range(args.lookups)]
+    per = timed_lookups(store.get_medications, [(u,) for u in sample])
+    print(f"get_medications   {per * 1e6:8.2f} us")
+    per = timed_lookups(store.get_medication, [(u, med_ids[u]) for u in sample])
+    print(f"get_medication    {per * 1e6:8.2f} us")
+    week_start, week_end = now - timedelta(days=14), now - timedelta(days=7)
+    per = timed_lookups(store.get_adherence, [(u, week_start, week_end) for u in sample])
+    print(f"adherence range   {per * 1e6:8.2f} us")
+
+    print(f"peak RSS          {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:8.0f} MB")
+
+    result = store.snapshot()
+    print(f"snapshot          {result['seconds']:8.2f} s  {result['bytes'] / 1e6:,.1f} MB")
+    expected = (store.get_medications(sample[0]), store.get_adherence(sample[0]))
+    del store
+    reloaded = PatientStore(snapshot_path=path)
+    started = time.perf_counter()
+    count = reloaded.load()
+    print(f"reload            {time.perf_counter() - started:8.2f} s  users={count}")
+    assert (reloaded.get_medications(sample[0]), reloaded.get_adherence(sample[0])) == expected
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark: multi-index Hamming search vs. a linear scan over scan hashes.
+
+Indexes N random 256-bit perceptual hashes and queries a mix of
+near-duplicates (a few flipped bits) and unseen images, reporting lookup
+latency for scan_dedupe.HammingIndex and for comparing against every hash.
+
+Usage:
+    python benchmarks/bench_scan_dedupe.py [--sizes 10000 100000 300000] [--queries 2000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from healthbridge_ai import scan_dedupe  # noqa: E402
+
+
+def flip_bits(value: int, count: int, rng: random.Random) -> int:
+    for bit in rng.sample(range(scan_dedupe.HASH_BITS), count):
+        value ^= 1 << bit
+    return value
+
+
+def linear_nearest(hashes, value: int, max_distance: int):
+    best = None
+    for candidate in hashes:
+        distance = scan_dedupe.hamming(value, candidate)
+        if distance <= max_distance and (best is None or distance < best[0]):
+            best = (distance, candidate)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 300000])
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--linear-queries", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    max_distance = scan_dedupe.SCAN_DEDUPE_MAX_DISTANCE
+    print(f"hash_bits={scan_dedupe.HASH_BITS} max_distance={max_distance}")
+    for size in args.sizes:
+        hashes = [rng.getrandbits(scan_dedupe.HASH_BITS) for _ in range(size)]
+        index = scan_dedupe.HammingIndex(scan_dedupe.HASH_BITS, max_distance)
+        started = time.perf_counter()
+        for value in hashes:
+            index.add(value)
+        build = time.perf_counter() - started
+
+        queries = []
+        for i in range(args.queries):
+            if i % 2:
+                queries.append(flip_bits(rng.choice(hashes), rng.randint(1, max_distance), rng))
+            else:
+                queries.append(rng.getrandbits(scan_dedupe.HASH_BITS))
+
+        started = time.perf_counter()
+        found = sum(index.nearest(q) is not None for q in queries)
+        indexed = (time.perf_counter() - started) / len(queries)
+
+        sample = queries[:args.linear_queries]
+        started = time.perf_counter()
+        for q in sample:
+            linear_nearest(hashes, q, max_distance)
+        linear = (time.perf_counter() - started) / len(sample)
+
+        print(f"images={size:>7}  build={build:6.2f}s  multi-index={indexed * 1e6:8.1f} us/lookup  "
+              f"linear={linear * 1e3:8.1f} ms/lookup  near-duplicates found={found}/{len(queries)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Benchmark: terminology index build, startup, lookup and autocomplete at scale.
+
+Generates N synthetic concepts per system (well-formed ICD-10-CM, RxNorm and
+SNOMED CT codes with multi-word display names and a synonym), compiles them,
+then reports:
+  * compile time and index size
+  * startup: opening (memory-mapping) the compiled index
+  * code lookup, display resolve and prefix search latency
+  * peak RSS of the process
+
+Usage:
+    python benchmarks/bench_terminology.py [--concepts 50000] [--queries 20000]
+"""
+import argparse
+import csv
+import os
+import random
+import resource
+import string
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from healthbridge_ai import terminology  # noqa: E402
+
+WORDS = ["acute", "chronic", "renal", "cardiac", "pulmonary", "hepatic", "disorder", "syndrome", "failure",
+         "infection", "deficiency", "neoplasm", "benign", "malignant", "left", "right", "bilateral", "lower",
+         "upper", "limb", "tablet", "oral", "injection", "extended", "release", "hydrochloride", "sodium",
+         "fracture", "ulcer", "stenosis", "insufficiency", "hypertensive", "diabetic", "viral", "bacterial"]
+
+
+def snomed_code(rng: random.Random) -> str:
+    while True:
+        code = str(rng.randrange(10 ** 6, 10 ** 9))
+        for digit in "0123456789":
+            if terminology.canonicalize("snomed", code + digit):
+                return code + digit
+
+
+def icd10_code(i: int) -> str:
+    letter = string.ascii_uppercase[i % 26]
+    return f"{letter}{(i // 26) % 100:02d}{(i // 2600) % 10}{(i // 26000) % 100:02d}"
+
+
+def write_concepts(path: str, count: int, rng: random.Random):
+    codes = {}
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["system", "code", "display", "synonyms"])
+        for system, make in (("icd10", lambda i: icd10_code(i)), ("rxnorm", lambda i: str(10000 + i * 7)),
+                             ("snomed", lambda i: snomed_code(rng))):
+            codes[system] = []
+            for i in range(count):
+                code = make(i)
+                display = " ".join(rng.choice(WORDS) for _ in range(rng.randrange(2, 6))) + f" {i}"
+                synonym = " ".join(rng.choice(WORDS) for _ in range(2)) + f" {i}"
+                writer.writerow([system, code, display.capitalize(), synonym])
+                codes[system].append((code, display))
+    return codes
+
+
+def per_call(fn, args_list) -> float:
+    started = time.perf_counter()
+    for args in args_list:
+        fn(*args)
+    return (time.perf_counter() - started) / len(args_list)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concepts", type=int, default=50000, help="concepts per system")
+    parser.add_argument("--queries", type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = random.Random(17)
+    work = tempfile.mkdtemp(prefix="bench_terminology_")
+    source, path = os.path.join(work, "concepts.csv"), os.path.join(work, "terminology.idx")
+    codes = write_concepts(source, args.concepts, rng)
+
+    started = time.perf_counter()
+    terminology.build([source], path)
+    print(f"concepts={3 * args.concepts}  compile={time.perf_counter() - started:6.1f}s  "
+          f"size={os.path.getsize(path) / 1e6:.1f} MB")
+
+    started = time.perf_counter()
+    index = terminology.load_index([source], path)
+    print(f"startup           {(time.perf_counter() - started) * 1e3:8.2f} ms  terms={index.term_count}")
+
+    systems = list(codes)
+    samples = [(s, *rng.choice(codes[s])) for s in (rng.choice(systems) for _ in range(args.queries))]
+    per = per_call(index.lookup, [(s, code) for s, code, _ in samples])
+    print(f"lookup            {per * 1e6:8.2f} us")
+    per = per_call(index.resolve, [(s, display) for s, _, display in samples])
+    print(f"resolve           {per * 1e6:8.2f} us")
+    for length in (1, 3, 6):
+        queries = [(display[:length],) for _, _, display in samples]
+        per = per_call(index.search, queries)
+        print(f"search prefix={length}   {per * 1e6:8.2f} us  (all systems, limit 10)")
+    per = per_call(index.search, [(display[:4], s) for s, _, display in samples])
+    print(f"search one system {per * 1e6:8.2f} us")
+    print(f"peak RSS          {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:8.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Client for the HealthBridge AI service.
+
+One keep-alive ``httpx.AsyncClient`` is shared by all requests, so ingests
+reuse pooled connections instead of opening one per call. Calls go through
+a circuit breaker. After AI_BREAKER_FAILURES consecutive failures it opens,
+and callers fail fast with ``AIServiceUnavailable`` so they can use the local
+NLP path immediately. After AI_BREAKER_RESET_SECONDS one probe request is let
+through (half-open): success closes the breaker, failure opens it again.
+"""
+import asyncio
+import os
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+AI_SERVICE_URL = os.getenv("AI_SERVICE_URL", "http://healthbridge-ai:8082")
+AI_TIMEOUT_SECONDS = float(os.getenv("AI_TIMEOUT_SECONDS", "30"))
+AI_CONNECT_TIMEOUT_SECONDS = float(os.getenv("AI_CONNECT_TIMEOUT_SECONDS", "2"))
+AI_MAX_CONNECTIONS = int(os.getenv("AI_MAX_CONNECTIONS", "20"))
+AI_BREAKER_FAILURES = int(os.getenv("AI_BREAKER_FAILURES", "5"))
+AI_BREAKER_RESET_SECONDS = float(os.getenv("AI_BREAKER_RESET_SECONDS", "30"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class AIServiceUnavailable(Exception):
+    """The AI service failed, or the breaker is open and it was not called."""
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = AI_BREAKER_FAILURES, reset_timeout: float = AI_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self.stats = {"successes": 0, "failures": 0, "short_circuited": 0, "opened": 0}
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; in half-open state only one probe at a time."""
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        self.stats["short_circuited"] += 1
+        return False
+
+    def record_success(self) -> None:
+        self.stats["successes"] += 1
+        self.failures = 0
+        self._probing = False
+        self.state = CLOSED
+
+    def record_failure(self) -> None:
+        self.stats["failures"] += 1
+        self.failures += 1
+        self._probing = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.stats["opened"] += 1
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def release_probe(self) -> None:
+        """A call ended with neither success nor failure (e.g. it was cancelled)."""
+        self._probing = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["state"] = self.state
+        stats["consecutive_failures"] = self.failures
+        if self.state == OPEN:
+            stats["retry_in_seconds"] = round(max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at)), 1)
+        return stats
+
+
+breaker = CircuitBreaker()
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            base_url=AI_SERVICE_URL,
+            timeout=httpx.Timeout(AI_TIMEOUT_SECONDS, connect=AI_CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(max_connections=AI_MAX_CONNECTIONS, max_keepalive_connections=AI_MAX_CONNECTIONS),
+        )
+    return _client
+
+
+async def close() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def analyze_note(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """POST the note to /analyze-note. Raises AIServiceUnavailable."""
+    if not breaker.allow():
+        raise AIServiceUnavailable(f"AI service circuit is {breaker.state}")
+    try:
+        response = await get_client().post("/analyze-note", json=payload)
+    except (httpx.HTTPError, asyncio.TimeoutError) as e:
+        breaker.record_failure()
+        raise AIServiceUnavailable(f"AI service request failed: {e!r}") from e
+    except BaseException:
+        breaker.release_probe()
+        raise
+    if response.status_code >= 500:
+        breaker.record_failure()
+        raise AIServiceUnavailable(f"AI service returned {response.status_code}")
+    breaker.record_success()
+    if response.status_code != 200:
+        raise AIServiceUnavailable(f"AI service returned {response.status_code}")
+    try:
+        return response.json()
+    except ValueError as e:
+        raise AIServiceUnavailable("AI service returned invalid JSON") from e
+
+
+def get_stats() -> Dict[str, Any]:
+    return {"url": AI_SERVICE_URL, "breaker": breaker.get_stats()}
@@ -0,0 +1,208 @@
+"""
+FHIR bulk data export ($export-style NDJSON) from the fhir.created event log.
+
+Every ingested note publishes its FHIR Bundle as a ``fhir.created`` event
+(see events.py). An export reads that log FHIR_EXPORT_READ_BATCH events at a
+time and streams each bundle's resources into one NDJSON file per resource
+type (``Condition.ndjson``, ``MedicationRequest.ndjson``, optionally
+gzipped), so memory stays flat however many patients there are.
+
+Resources get a stable ``id`` derived from the event id and their position in
+the bundle, and ``meta.lastUpdated`` from the publish time, so repeated or
+incremental exports of the same note agree. ``_since`` skips segments last
+written before the given instant, then filters events by publish time.
+
+Deleting a running job cancels it: the export stops at its next resource
+and the job's files are removed once it has closed them. Finished jobs and
+their files are kept for FHIR_EXPORT_TTL_SECONDS; expired ones (and output
+directories left by an earlier process) are swept when a new job starts.
+"""
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+import event_bus
+
+FHIR_EXPORT_DIR = os.getenv("FHIR_EXPORT_DIR", "./fhir_export")
+FHIR_EXPORT_READ_BATCH = int(os.getenv("FHIR_EXPORT_READ_BATCH", "500"))
+FHIR_EXPORT_TTL_SECONDS = int(os.getenv("FHIR_EXPORT_TTL_SECONDS", str(24 * 3600)))
+FHIR_EXPORT_TOPIC = "fhir.created"
+
+_ID_NAMESPACE = uuid.UUID("6f1c1f8e-2a7d-4a53-9a39-3c1f5c8e0b6a")
+
+
+def iter_resources(since: Optional[float] = None, types: Optional[Set[str]] = None,
+                   directory: str = event_bus.EVENT_LOG_DIR) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """(resourceType, resource) for every resource published after ``since`` (epoch seconds)."""
+    reader = event_bus.EventLogReader(FHIR_EXPORT_TOPIC, directory)
+    position = reader.position_for_time(since) if since is not None else None
+    while True:
+        events, position = reader.read(position, FHIR_EXPORT_READ_BATCH)
+        if not events:
+            return
+        for event in events:
+            published_at = event.get("published_at", 0)
+            if since is not None and published_at < since:
+                continue
+            last_updated = _iso(published_at)
+            for index, entry in enumerate((event.get("data") or {}).get("entry", [])):
+                resource = entry.get("resource") or {}
+                resource_type = resource.get("resourceType")
+                if not resource_type or (types and resource_type not in types):
+                    continue
+                resource = dict(resource)
+                resource.setdefault("id", str(uuid.uuid5(_ID_NAMESPACE, f"{event['id']}:{index}")))
+                resource["meta"] = dict(resource.get("meta") or {}, lastUpdated=last_updated)
+                yield resource_type, resource
+
+
+class ExportCancelled(Exception):
+    """The export's job was deleted while it ran."""
+
+
+def _iso(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def export(output_dir: str, since: Optional[float] = None, types: Optional[Set[str]] = None,
+           compress: bool = False, directory: str = event_bus.EVENT_LOG_DIR,
+           cancel: Optional[threading.Event] = None) -> Dict[str, Any]:
+    """
+    Write one NDJSON file per resource type into ``output_dir``; returns
+    per-type counts and throughput. Raises ExportCancelled once ``cancel`` is set.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    suffix = ".ndjson.gz" if compress else ".ndjson"
+    files: Dict[str, Any] = {}
+    counts: Dict[str, int] = {}
+    started = time.perf_counter()
+    try:
+        for resource_type, resource in iter_resources(since, types, directory):
+            if cancel is not None and cancel.is_set():
+                raise ExportCancelled()
+            f = files.get(resource_type)
+            if f is None:
+                path = os.path.join(output_dir, resource_type + suffix)
+                f = files[resource_type] = gzip.open(path, "wt", encoding="utf-8", compresslevel=6) \
+                    if compress else open(path, "w", encoding="utf-8")
+                counts[resource_type] = 0
+            f.write(json.dumps(resource, separators=(",", ":")))
+            f.write("\n")
+            counts[resource_type] += 1
+    finally:
+        for f in files.values():
+            f.close()
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    return {
+        "files": {resource_type: resource_type + suffix for resource_type in counts},
+        "counts": counts,
+        "resources": total,
+        "seconds": round(elapsed, 3),
+        "resources_per_second": round(total / elapsed) if elapsed > 0 else total,
+    }
+
+
+class ExportJobs:
+    """In-process registry of export jobs and their output directories."""
+
+    def __init__(self, root: str = FHIR_EXPORT_DIR, ttl_seconds: int = FHIR_EXPORT_TTL_SECONDS):
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def create(self, request_url: str, since: Optional[float], types: Optional[Set[str]], compress: bool) -> str:
+        self.expire()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._jobs[job_id] = {
+                "status": "in-progress", "request": request_url, "since": since, "types": types,
+                "compress": compress, "transaction_time": _iso(time.time()), "result": None, "error": None,
+                "finished_at": None, "cancel": threading.Event(),
+            }
+        return job_id
+
+    def run(self, job_id: str) -> None:
+        job = self.get(job_id)
+        if job is None:
+            return
+        result = error = None
+        try:
+            result = export(self.directory(job_id), job["since"], job["types"], job["compress"], cancel=job["cancel"])
+            print(f"FHIR export {job_id}: {result['resources']} resources in {result['seconds']}s "
+                  f"({result['resources_per_second']}/s)")
+        except ExportCancelled:
+            pass
+        except Exception as e:
+            print(f"FHIR export {job_id} failed: {e}")
+            error = str(e)
+        with self._lock:
+            # delete() sets cancel under the same lock, so a job is either finished here or removed below.
+            cancelled = job["cancel"].is_set()
+            if not cancelled:
+                job.update(status="error" if error is not None else "completed", result=result, error=error,
+                           finished_at=time.time())
+        if cancelled:
+            shutil.rmtree(self.directory(job_id), ignore_errors=True)
+            print(f"FHIR export {job_id} cancelled")
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def directory(self, job_id: str) -> str:
+        return os.path.join(self.root, job_id)
+
+    def delete(self, job_id: str) -> bool:
+        """Forget a job and remove its files; a running job is cancelled and cleans up when it stops."""
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+            if job is None:
+                return False
+            job["cancel"].set()
+            running = job["status"] == "in-progress"
+        if not running:
+            shutil.rmtree(self.directory(job_id), ignore_errors=True)
+        return True
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """
+        Delete jobs that finished more than ``ttl_seconds`` ago, and output
+        directories no job owns that were last written as long ago. Returns
+        how many directories were removed.
+        """
+        now = time.time() if now is None else now
+        cutoff = now - self.ttl_seconds
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job["finished_at"] is not None and job["finished_at"] < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+            known = set(self._jobs)
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            names = []
+        removed = 0
+        for name in names:
+            path = os.path.join(self.root, name)
+            if name in known or not os.path.isdir(path):
+                continue
+            try:
+                stale = name in expired or os.path.getmtime(path) < cutoff
+            except OSError:
+                continue
+            if stale:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        return removed
+
+
+jobs = ExportJobs()
@@ -0,0 +1,132 @@
+"""
+Aho-Corasick dictionary matcher for clinical terminology.
+
+The automaton is built once from a lexicon and then finds every term in a
+note in a single pass over the text, independent of lexicon size. Matches are
+case-insensitive, restricted to word boundaries and resolved leftmost-longest,
+so "type 2 diabetes" wins over the "diabetes" inside it.
+"""
+import csv
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+
+class Term(NamedTuple):
+    term: str
+    type: str
+    code: str
+    display: str
+
+
+class Match(NamedTuple):
+    start: int
+    end: int
+    text: str
+    term: Term
+
+
+class DictionaryMatcher:
+    """Multi-pattern matcher over a fixed set of terms."""
+
+    def __init__(self, terms: Iterable[Term]):
+        # Node 0 is the root. _goto[n] maps a character to the next node,
+        # _fail[n] is the failure link and _out[n] lists (length, term index)
+        # for every pattern ending at n, including those reached via failure links.
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[Tuple[int, int], ...]] = [()]
+        self.terms: List[Term] = []
+
+        pending: List[List[Tuple[int, int]]] = [[]]
+        for term in terms:
+            key = term.term.lower().strip()
+            if not key:
+                continue
+            index = len(self.terms)
+            self.terms.append(term)
+            node = 0
+            for ch in key:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    pending.append([])
+                node = nxt
+            pending[node].append((len(key), index))
+
+        # Breadth-first pass to set failure links and merge outputs.
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                pending[child].extend(pending[self._fail[child]])
+        self._out = [tuple(outputs) for outputs in pending]
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def find_all(self, text: str, overlapping: bool = False) -> List[Match]:
+        """
+        Return word-bounded term matches with character offsets into ``text``.
+        Unless ``overlapping`` is set, overlaps are resolved leftmost-longest.
+        """
+        lowered = text.lower()
+        if len(lowered) != len(text):
+            # A few code points change length when lowercased; keep offsets aligned.
+            lowered = "".join(ch.lower()[:1] for ch in text)
+
+        goto, fail, out = self._goto, self._fail, self._out
+        text_len = len(text)
+        candidates: List[Tuple[int, int, int]] = []
+        node = 0
+        for pos, ch in enumerate(lowered):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                end = pos + 1
+                if end < text_len and lowered[end].isalnum():
+                    continue
+                for length, index in out[node]:
+                    start = end - length
+                    if start > 0 and lowered[start - 1].isalnum():
+                        continue
+                    candidates.append((start, end, index))
+
+        if not overlapping:
+            candidates.sort(key=lambda c: (c[0], c[0] - c[1]))
+            selected = []
+            last_end = 0
+            for start, end, index in candidates:
+                if start >= last_end:
+                    selected.append((start, end, index))
+                    last_end = end
+            candidates = selected
+        else:
+            candidates.sort()
+
+        return [Match(start, end, text[start:end], self.terms[index]) for start, end, index in candidates]
+
+
+def load_terms(path: str) -> List[Term]:
+    """Read a terminology CSV with ``term,type,code,display`` columns."""
+    with open(path, newline="", encoding="utf-8") as f:
+        return [
+            Term(row["term"], row["type"].upper(), row["code"], row.get("display") or row["term"])
+            for row in csv.DictReader(f)
+        ]
+
+
+def build_matcher(path: str, extra_terms: Optional[Iterable[Term]] = None) -> DictionaryMatcher:
+    terms = load_terms(path)
+    if extra_terms:
+        terms.extend(extra_terms)
+    return DictionaryMatcher(terms)
@@ -1,8 +1,8 @@
-import json
+import event_bus
+
 
 def publish_event(event_type: str, data: dict):
-    """Publishes event to mock Pub/Sub."""
-    # Simulation
-    print(f"[Internal] Event Published: {event_type}")
-    # In production: publisher.publish(topic_path, json.dumps(data).encode("utf-8"))
-    return True
+    """Publishes an event to the local event log (see event_bus); returns the event id."""
+    event_id = event_bus.publish(event_type, data)
+    print(f"[Internal] Event Published: {event_type} ({event_id})")
+    return event_id
@@ -1,6 +1,23 @@
 from datetime import datetime
 import uuid
 
+import terminology
+
+# Code system of an entity that does not name one: the local NLP lexicon uses SNOMED CT and RxNorm.
+DEFAULT_SYSTEMS = {"CONDITION": "snomed", "MEDICATION": "rxnorm"}
+
+def _codeable_concept(entity: dict) -> dict:
+    """CodeableConcept for an entity, its code checked against the local terminology index."""
+    system = entity.get("system") or DEFAULT_SYSTEMS[entity["type"]]
+    display = entity.get("display") or entity["text"]
+    checked = terminology.check(system, entity.get("code"), display)
+    concept = {"text": entity["text"]}
+    # A malformed code whose display matches nothing is dropped rather than published.
+    if checked["code"]:
+        concept["coding"] = [{"system": terminology.SYSTEMS[system], "code": checked["code"],
+                              "display": checked["display"] or display}]
+    return concept
+
 def map_to_fhir_bundle(patient_id: str, entities: list, note_date: str = None) -> dict:
     """Maps extracted entities to a FHIR R4 Bundle."""
     timestamp = note_date or datetime.now().isoformat()
@@ -20,9 +37,7 @@ def map_to_fhir_bundle(patient_id: str, entities: list, note_date: str = None) -
                 "resource": {
                     "resourceType": "Condition",
                     "subject": {"reference": f"Patient/{patient_id}"},
-                    "code": {
-                        "coding": [{"system": "http://snomed.info/sct", "code": entity["code"], "display": entity["text"]}]
-                    },
+                    "code": _codeable_concept(entity),
                     "recordedDate": timestamp
                 }
             })
@@ -31,9 +46,7 @@ def map_to_fhir_bundle(patient_id: str, entities: list, note_date: str = None) -
                 "resource": {
                     "resourceType": "MedicationRequest",
                     "subject": {"reference": f"Patient/{patient_id}"},
-                    "medicationCodeableConcept": {
-                        "coding": [{"system": "http://www.nlm.nih.gov/research/umls/rxnorm", "code": entity["code"], "display": entity["text"]}]
-                    },
+                    "medicationCodeableConcept": _codeable_concept(entity),
                     "authoredOn": timestamp,
                     "status": "active"
                 }
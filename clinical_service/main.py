@@ -1,10 +1,17 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse
 from pydantic import BaseModel
 from typing import Optional
+from datetime import datetime, timezone
+import os
 from nlp import analyze_clinical_text
 from fhir import map_to_fhir_bundle
 from events import publish_event
+import ai_client
+import bulk_export
+import terminology
+import event_bus
 
 app = FastAPI(title="HealthBridge Clinical Intelligence")
 
@@ -23,34 +30,40 @@ class ClinicalNote(BaseModel):
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "service": "clinical-intelligence"}
+    return {"status": "healthy", "service": "clinical-intelligence", "ai_service": ai_client.get_stats(),
+            "event_bus": event_bus.get_stats()}
 
-import os
-import requests
+@app.on_event("startup")
+def load_terminology():
+    # Map (or compile) the terminology index now rather than on the first note.
+    terminology.get_index()
 
-AI_SERVICE_URL = os.getenv("AI_SERVICE_URL", "http://healthbridge-ai:8082")
+@app.on_event("shutdown")
+async def close_ai_client():
+    await ai_client.close()
 
 @app.post("/ingest")
 async def ingest_note(note: ClinicalNote, background_tasks: BackgroundTasks):
     """Ingests a note, analyzes it via AI service, and triggers async processing."""
     try:
         # 1. Analyze via HealthBridge AI service
-        ai_response = requests.post(
-            f"{AI_SERVICE_URL}/analyze-note",
-            json=note.dict(),
-            timeout=30
-        )
-        if ai_response.status_code != 200:
-            # Fallback to local NLP if AI service is down
+        try:
+            ai_data = await ai_client.analyze_note(note.dict())
+        except ai_client.AIServiceUnavailable as e:
+            # Fallback to local NLP if AI service is down (immediately while the breaker is open)
+            print(f"AI service unavailable, using local NLP: {e}")
+            ai_data = None
+        if ai_data is None:
             entities = analyze_clinical_text(note.note_text)
         else:
-            ai_data = ai_response.json()
             # Extract entities from standardized AI response
             entities = []
             for cond in ai_data.get("extracted_entities", {}).get("conditions", []):
-                entities.append({"text": cond["clinical_text"], "type": "CONDITION", "code": cond["icd_10"]})
+                entities.append({"text": cond["clinical_text"], "type": "CONDITION", "code": cond.get("icd_10"),
+                                 "system": "icd10"})
             for med in ai_data.get("extracted_entities", {}).get("medications", []):
-                entities.append({"text": med["drug_name"], "type": "MEDICATION", "code": med["rxnorm_code"]})
+                entities.append({"text": med["drug_name"], "type": "MEDICATION", "code": med.get("rxnorm_code"),
+                                 "system": "rxnorm"})
         
         # 2. Map to FHIR
         bundle = map_to_fhir_bundle(note.patient_id, entities, note.note_date)
@@ -66,3 +79,68 @@ async def ingest_note(note: ClinicalNote, background_tasks: BackgroundTasks):
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+def _parse_since(since: Optional[str]) -> Optional[float]:
+    if not since:
+        return None
+    try:
+        when = datetime.fromisoformat(since.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="_since must be an ISO-8601 instant")
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return when.timestamp()
+
+@app.get("/fhir/$export")
+async def start_export(request: Request, background_tasks: BackgroundTasks, _since: Optional[str] = None,
+                       _type: Optional[str] = None, gzip: bool = False):
+    """Kicks off an asynchronous bulk export of every FHIR resource generated so far."""
+    since = _parse_since(_since)
+    types = {t.strip() for t in _type.split(",") if t.strip()} if _type else None
+    job_id = bulk_export.jobs.create(str(request.url), since, types, gzip)
+    background_tasks.add_task(bulk_export.jobs.run, job_id)
+    status_url = str(request.url_for("export_status", job_id=job_id))
+    return JSONResponse(status_code=202, content={"job_id": job_id, "status_url": status_url},
+                        headers={"Content-Location": status_url})
+
+@app.get("/fhir/$export-status/{job_id}", name="export_status")
+async def export_status(job_id: str, request: Request):
+    job = bulk_export.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    if job["status"] == "in-progress":
+        return JSONResponse(status_code=202, content={"status": "in-progress"},
+                            headers={"X-Progress": "in-progress", "Retry-After": "1"})
+    if job["status"] == "error":
+        return JSONResponse(status_code=500, content={
+            "resourceType": "OperationOutcome",
+            "issue": [{"severity": "error", "code": "exception", "diagnostics": job["error"]}],
+        })
+    result = job["result"]
+    return {
+        "transactionTime": job["transaction_time"],
+        "request": job["request"],
+        "requiresAccessToken": False,
+        "output": [
+            {"type": resource_type, "count": result["counts"][resource_type],
+             "url": str(request.url_for("export_file", job_id=job_id, name=name))}
+            for resource_type, name in result["files"].items()
+        ],
+        "error": [],
+        "extension": {key: result[key] for key in ("resources", "seconds", "resources_per_second")},
+    }
+
+@app.delete("/fhir/$export-status/{job_id}", status_code=202)
+async def delete_export(job_id: str):
+    if not bulk_export.jobs.delete(job_id):
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return {"status": "deleted"}
+
+@app.get("/fhir/$export-files/{job_id}/{name}", name="export_file")
+async def export_file(job_id: str, name: str):
+    job = bulk_export.jobs.get(job_id)
+    if job is None or job["status"] != "completed" or name not in job["result"]["files"].values():
+        raise HTTPException(status_code=404, detail="Export file not found")
+    media_type = "application/gzip" if name.endswith(".gz") else "application/fhir+ndjson"
+    return FileResponse(os.path.join(bulk_export.jobs.directory(job_id), name), media_type=media_type)
@@ -1,19 +1,35 @@
 # from google.cloud import language_v1
 # Note: In production, use google-cloud-healthcare for specialized medical NLP
+import os
+
+from dictionary_matcher import build_matcher
+
+TERMINOLOGY_PATH = os.getenv(
+    "CLINICAL_TERMINOLOGY_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "terminology.csv"),
+)
+
+# Built once per process; lookup cost is independent of lexicon size.
+_matcher = build_matcher(TERMINOLOGY_PATH)
 
 def analyze_clinical_text(text: str) -> list:
     """Calls Google Healthcare NLP API to extract entities."""
-    # Simulation for MVP
+    # Simulation for MVP: dictionary extraction over the local terminology file.
+    # One entity per concept: the text and offsets of its first mention, plus the lexicon's display name.
     entities = []
-    
-    # Simple rule-based extraction for demo purposes
-    if "diabetes" in text.lower():
-        entities.append({"text": "diabetes", "type": "CONDITION", "code": "73211009"})
-    if "metformin" in text.lower():
-        entities.append({"text": "Metformin", "type": "MEDICATION", "code": "6809"})
-    if "lisinopril" in text.lower():
-        entities.append({"text": "Lisinopril", "type": "MEDICATION", "code": "29046"})
-    if "aspirin" in text.lower():
-        entities.append({"text": "Aspirin", "type": "MEDICATION", "code": "1191"})
-        
+    seen = set()
+    for match in _matcher.find_all(text):
+        key = (match.term.type, match.term.code)
+        if key in seen:
+            continue
+        seen.add(key)
+        entities.append({
+            "text": match.text,
+            "display": match.term.display,
+            "type": match.term.type,
+            "code": match.term.code,
+            "start": match.start,
+            "end": match.end,
+        })
+
     return entities
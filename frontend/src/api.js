@@ -68,7 +68,13 @@ export const api = {
     generateCoaching: (context) => apiRequest('ai', '/generate-coaching', { method: 'POST', body: JSON.stringify(context) }),
 
     // Audit Logs
-    getAuditLogs: () => apiRequest('ai', '/audit-log'),
+    // Returns { items, next_cursor }; pass next_cursor back as `cursor` for the next page.
+    getAuditLogs: (params = {}) => {
+        const query = new URLSearchParams(
+            Object.entries(params).filter(([, value]) => value !== undefined && value !== null && value !== '')
+        ).toString();
+        return apiRequest('ai', `/audit-log${query ? `?${query}` : ''}`);
+    },
 
     // Health checks
     checkHealth: (service) => apiRequest(service, '/health').catch(() => ({ status: 'error' })),
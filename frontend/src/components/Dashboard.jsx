@@ -12,6 +12,7 @@ export default function Dashboard() {
     const [auditLogs, setAuditLogs] = useState([])
     const [showLogs, setShowLogs] = useState(false)
     const [loadingLogs, setLoadingLogs] = useState(false)
+    const [logsCursor, setLogsCursor] = useState(null)
 
     useEffect(() => {
         const interval = setInterval(() => {
@@ -28,8 +29,9 @@ export default function Dashboard() {
         setLoadingLogs(true)
         setShowLogs(true)
         try {
-            const logs = await api.getAuditLogs()
-            setAuditLogs(logs)
+            const page = await api.getAuditLogs()
+            setAuditLogs(page.items)
+            setLogsCursor(page.next_cursor)
         } catch (err) {
             console.error('Failed to fetch audit logs:', err)
         } finally {
@@ -37,6 +39,16 @@ export default function Dashboard() {
         }
     }
 
+    const fetchMoreLogs = async () => {
+        try {
+            const page = await api.getAuditLogs({ cursor: logsCursor })
+            setAuditLogs(prev => [...prev, ...page.items])
+            setLogsCursor(page.next_cursor)
+        } catch (err) {
+            console.error('Failed to fetch audit logs:', err)
+        }
+    }
+
     const features = [
         {
             id: 'clinical',
@@ -220,6 +232,9 @@ export default function Dashboard() {
                                             </span>
                                         </div>
                                     ))}
+                                    {logsCursor && (
+                                        <button className="tab-button" onClick={fetchMoreLogs}>Load more</button>
+                                    )}
                                 </div>
                             )}
                         </div>
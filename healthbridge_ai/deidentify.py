@@ -0,0 +1,277 @@
+"""
+Local rule-based PHI de-identification (HIPAA Safe Harbor).
+
+Every identifier pattern (URLs, emails, labelled record/account/plan
+numbers, SSNs, dates, phone and fax numbers, IP addresses, street and
+city/state/ZIP addresses, ages over 89, titled or labelled names) is one
+alternative of a single precompiled regex, so a note is scanned once and
+each match is replaced by a ``[KIND]`` placeholder as it is found. Runs of
+capitalized words are the last alternative: they are checked word by word
+against a name dictionary (first names and surnames), so ordinary
+capitalized words pass through at the cost of a set lookup.
+
+Names that are also common words or eponyms ("Will", "Grace", "Parkinson")
+are only redacted next to another name, after a title or in a labelled
+field. Safe Harbor keeps years, so a bare year is left alone; any date with
+a day or month is redacted whole.
+
+No pattern crosses a line break, so ``redact_stream`` de-identifies large
+documents line-bounded chunk by chunk in constant memory.
+"""
+import codecs
+import csv
+import os
+import re
+from collections import Counter
+from typing import BinaryIO, Dict, Iterable, Iterator, Optional, Set, Tuple
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DEIDENTIFY_NAMES_PATH = os.getenv("DEIDENTIFY_NAMES_PATH", os.path.join(DATA_DIR, "phi_names.csv"))
+# Longest stretch without a line break buffered by redact_stream before it cuts at a space.
+DEIDENTIFY_STREAM_MAX_LINE = int(os.getenv("DEIDENTIFY_STREAM_MAX_LINE", str(64 * 1024)))
+# Send the locally redacted text to the LLM for a second pass by default.
+DEIDENTIFY_LLM_REVIEW = os.getenv("DEIDENTIFY_LLM_REVIEW", "false").lower() == "true"
+
+# Dictionary names that are also common words, places or eponyms.
+AMBIGUOUS_NAMES = frozenset({
+    "will", "grace", "hope", "joy", "faith", "mark", "bill", "rose", "may", "june", "april", "august",
+    "long", "price", "hill", "wood", "woods", "green", "black", "white", "gray", "young", "king", "cook",
+    "ward", "rice", "stone", "fox", "hunt", "hunter", "lane", "mason", "ray", "berry", "grant", "hart",
+    "reed", "brown", "cole", "ford", "foster", "bell", "wilson", "graves", "parkinson", "alzheimer",
+    "crohn", "hodgkin", "cushing", "addison", "huntington", "virginia", "washington", "charlotte",
+    "jordan", "alexander", "mills", "wells", "west", "rivera", "christian", "russell", "henry", "jack",
+})
+
+# Alternations are factored by first letter so a failed branch costs one comparison.
+_MONTH = (r"(?:J(?:an(?:uary)?|une?|uly?)|F(?:eb(?:ruary)?)|M(?:ar(?:ch)?|ay)|A(?:pr(?:il)?|ug(?:ust)?)"
+          r"|S(?:ep(?:t(?:ember)?)?)|O(?:ct(?:ober)?)|N(?:ov(?:ember)?)|D(?:ec(?:ember)?))")
+_TITLE = r"(?:Dr|M(?:rs?|s|iss)|Prof)"
+_WORD = r"[A-Z][A-Za-z]*(?:['-][A-Za-z]+)*"
+# A capitalized word that does not start a date ("March 3") or a title ("Dr. Lee").
+_NAME_WORD = rf"\b(?=[A-Z])(?!{_MONTH}\.?[ \t]+\d|{_TITLE}\b\.?[ \t]){_WORD}"
+_STREET = (r"(?:Street|St|Avenue|Ave|Road|Rd|Boulevard|Blvd|Lane|Ln|Drive|Dr|Court|Ct|Way|Place|Pl"
+           r"|Terrace|Ter|Circle|Cir|Parkway|Pkwy|Highway|Hwy)")
+_ID_LABEL = (r"(?i:(?=[adghilmnps])(?:MRN|MR[ \t]*#|medical[ \t]+record(?:[ \t]+(?:number|no\.?|#))?|acct|account(?:[ \t]+(?:number|no\.?|#))?"
+             r"|member[ \t]+id|policy(?:[ \t]+(?:number|no\.?|#))?|health[ \t]+plan(?:[ \t]+(?:id|number))?"
+             r"|(?:insurance|medicare|medicaid|subscriber|group)(?:[ \t]+(?:id|number|no\.?|#))?|patient[ \t]+id|id(?:[ \t]+(?:number|no\.?|#))?"
+             r"|license(?:[ \t]+(?:number|no\.?|#))?|DEA(?:[ \t]+#)?|NPI|SSN|social[ \t]+security(?:[ \t]+number)?)\b)")
+# Between a label and its value: "MRN: 1", "Medicaid #: 1", "Policy no. 1".
+_ID_SEPARATOR = r"[ \t]*(?:#[ \t]*:?|:)?[ \t]*"
+# Month and day numbers for slash dates without a year ("1/15", "03/2024"); at least one side
+# has two digits so fractions ("1/2 tab", "3/4 of doses") are left alone, as are pain scores.
+_MONTH_NUM = r"(?:0?[1-9]|1[0-2])"
+_DAY_NUM = r"(?:0?[1-9]|[12]\d|3[01])"
+_PHONE = r"(?<![\d-])(?:\+?1[ .-]?)?(?:\(\d{3}\)[ .-]?|\d{3}[ .-])\d{3}[ .-]\d{4}(?![\d-])"
+
+# Identifiers starting with a digit.
+_NUMERIC = "|".join([
+    r"(?P<SSN>(?<!\d)\d{3}-\d{2}-\d{4}(?!\d))",
+    r"(?P<DATE>\d{4}[-/]\d{1,2}[-/]\d{1,2}(?:[T ]\d{1,2}:\d{2}(?::\d{2}(?:\.\d+)?)?Z?)?\b"
+    r"|(?<![\d/])\d{1,2}[/-]\d{1,2}[/-](?:\d{4}|\d{2})(?![\d/])"
+    rf"|(?<![\d/]){_MONTH_NUM}/(?:19|20)\d{{2}}(?![\d/])"
+    rf"|(?<![\d/])(?<!pain )(?<!pain: )(?=\d\d|\d/\d\d){_MONTH_NUM}/{_DAY_NUM}(?![\d/])(?![ \t]*pain)"
+    rf"|\d{{1,2}}(?:st|nd|rd|th)?(?:[ \t]+of)?(?:[ \t]+|-){_MONTH}\.?(?:-\d{{4}}|-\d{{2}}|,?[ \t]+\d{{4}})?\b)",
+    rf"(?P<PHONE>{_PHONE})",
+    r"(?P<IP>(?:\d{1,3}\.){3}\d{1,3}\b)",
+    rf"(?P<ADDRESS>\d{{1,6}}[ \t]+(?:[A-Z][A-Za-z]*\.?[ \t]+){{1,4}}{_STREET}\b\.?"
+    r"(?:,?[ \t]*(?:Apt|Suite|Unit|#)\.?[ \t]*[A-Za-z0-9-]+)?)",
+    r"(?P<AGE>(?:9\d|1[0-4]\d)[ \t-]*(?:years?|yrs?|y/?o)\b(?:[ \t-]*old)?)",
+])
+# Identifiers starting with a letter; CAPS (a run of capitalized words) must stay last.
+_WORDY = "|".join([
+    r"(?P<URL>(?:https?://|www\.)[^\s<>\"]+)",
+    rf"(?P<ID>{_ID_LABEL}{_ID_SEPARATOR}(?=[A-Za-z0-9-]*\d)[A-Za-z0-9][A-Za-z0-9-]{{3,}})",
+    rf"(?P<DATE_TEXT>(?=[A-Z]){_MONTH}\.?(?:[ \t]+\d{{1,2}}(?:st|nd|rd|th)?(?:,?[ \t]+\d{{4}})?|,?[ \t]+\d{{4}})\b)",
+    r"(?P<ADDRESS_TEXT>(?=[A-Z])[A-Z][a-z]+(?:[ \t][A-Z][a-z]+)?,[ \t]*[A-Z]{2}[ \t]+\d{5}(?:-\d{4})?\b)",
+    r"(?P<AGE_TEXT>(?=[Aa])(?i:age[ds]?)(?:[ \t]*:[ \t]*|[ \t]+)(?:9\d|1[0-4]\d)\b)",
+    rf"(?P<TITLED>(?=[DMP]){_TITLE}\.?[ \t]+{_WORD}(?:[ \t]+{_WORD})?)",
+    # A "Name:" field is a name in any case ("smith, john"); after "Patient:" only capitalized words are.
+    r"(?P<FIELD>(?i:(?=[fFlLnNpP])(?:(?:patient|full|last|first)[ \t]+)?name[ \t]*:[ \t]*"
+    r"[a-z][a-z'-]*(?:,?[ \t]+[a-z][a-z'-]*){0,2})"
+    rf"|(?i:(?=[pP])(?:patient|pt)[ \t]*:)[ \t]*{_WORD}(?:[ \t]+{_WORD}){{0,2}})",
+    rf"(?P<CAPS>{_NAME_WORD}(?:[ \t]+{_NAME_WORD}){{0,3}})",
+])
+# One precompiled scan. Everything but "(555) ..." / "+1 ..." phone numbers starts
+# at a word boundary, which rejects positions inside a word with a single test;
+# the rest dispatches on the first character. Group names ending in _TEXT or
+# _INTL are second spellings of the kind before the underscore.
+PATTERN = re.compile(
+    rf"\b(?:(?P<EMAIL>[\w.+-]+@[\w-]+(?:\.[\w-]+)+\b)|(?=\d)(?:{_NUMERIC})|{_WORDY})"
+    rf"|(?=[(+])(?P<PHONE_INTL>{_PHONE})"
+)
+
+_WORDS_RE = re.compile(r"\S+")
+_ID_VALUE_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9-]{3,}$")
+_SSN_LABEL_RE = re.compile(r"(?i)ssn|social")
+_LABEL_RE = re.compile(r"\D+")
+_TITLE_PREFIX_RE = re.compile(rf"{_TITLE}\.?[ \t]+")
+_POSSESSIVE = ("'s", "’s")
+_PLACEHOLDER_RE = re.compile(r"\[(?:NAME|DATE|PHONE|EMAIL|ID|SSN|URL|IP|ADDRESS|AGE)\]")
+
+
+def load_names(path: str = DEIDENTIFY_NAMES_PATH) -> Tuple[Set[str], Set[str]]:
+    """(first names, surnames), lowercased, from a ``name,type`` CSV (type first or last)."""
+    first, last = set(), set()
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            (first if row["type"].strip().lower() == "first" else last).add(row["name"].strip().lower())
+    return first, last
+
+
+class Deidentifier:
+    """Single-pass Safe Harbor redaction with a name dictionary."""
+
+    def __init__(self, first_names: Iterable[str] = (), surnames: Iterable[str] = (),
+                 ambiguous: Iterable[str] = AMBIGUOUS_NAMES):
+        self.first_names = {n.lower() for n in first_names}
+        self.surnames = {n.lower() for n in surnames}
+        self.ambiguous = frozenset(n.lower() for n in ambiguous)
+
+    def _name_run(self, run: str) -> Optional[str]:
+        """``run`` with its name words collapsed to [NAME], or None if it holds no name."""
+        if " " not in run and "\t" not in run:
+            # Most runs are one capitalized word ("Continue", "Labs").
+            key = run.lower()
+            possessive = key.endswith(_POSSESSIVE)
+            if possessive:
+                key = key[:-2]
+            if key in self.ambiguous or (key not in self.first_names and key not in self.surnames):
+                return None
+            return "[NAME]" + run[-2:] if possessive else "[NAME]"
+        words = [(m.start(), m.end(), m.group()) for m in _WORDS_RE.finditer(run)]
+        keys = []
+        for _, _, word in words:
+            key = word.lower()
+            if key.endswith(_POSSESSIVE):
+                key = key[:-2]
+            keys.append(key)
+        known = [key in self.first_names or key in self.surnames for key in keys]
+        marked = [hit and key not in self.ambiguous for key, hit in zip(keys, known)]
+        if not any(marked):
+            return None
+        for i, key in enumerate(keys):
+            if marked[i]:
+                continue
+            # A word next to a name is part of it if it is a known (if ambiguous) name,
+            # or the word right after a first name (an unlisted surname).
+            after_first = i > 0 and marked[i - 1] and keys[i - 1] in self.first_names
+            near = (i > 0 and marked[i - 1]) or (i + 1 < len(keys) and marked[i + 1])
+            if (known[i] and near) or after_first:
+                marked[i] = True
+        out, position, i = [], 0, 0
+        while i < len(words):
+            if not marked[i]:
+                i += 1
+                continue
+            start = words[i][0]
+            while i + 1 < len(words) and marked[i + 1]:
+                i += 1
+            end, word = words[i][1], words[i][2]
+            out.append(run[position:start])
+            out.append("[NAME]")
+            if word.lower().endswith(_POSSESSIVE):
+                out.append(word[-2:])
+            position = end
+            i += 1
+        out.append(run[position:])
+        return "".join(out)
+
+    def _replace(self, match: "re.Match", counts: Counter) -> str:
+        kind = match.lastgroup.split("_")[0]
+        text = match.group()
+        if kind == "CAPS":
+            redacted = self._name_run(text)
+            if redacted is None:
+                return text
+            counts["NAME"] += redacted.count("[NAME]")
+            return redacted
+        if kind == "TITLED":
+            title = _TITLE_PREFIX_RE.match(text).group()
+            counts["NAME"] += 1
+            return f"{title}[NAME]{text[-2:] if text.lower().endswith(_POSSESSIVE) else ''}"
+        if kind == "FIELD":
+            label = text[:text.index(":") + 1]
+            counts["NAME"] += 1
+            return f"{label} [NAME]"
+        if kind == "ID":
+            value = _ID_VALUE_RE.search(text)
+            kind = "SSN" if _SSN_LABEL_RE.match(text) else "ID"
+            counts[kind] += 1
+            return f"{text[:value.start()]}[{kind}]"
+        counts[kind] += 1
+        if kind == "AGE" and text[0].isalpha():
+            # "aged 95": keep the label
+            return f"{_LABEL_RE.match(text).group()}[AGE]"
+        return f"[{kind}]"
+
+    def redact(self, text: str, counts: Optional[Counter] = None) -> Tuple[str, Counter]:
+        """De-identify ``text``; returns it with redactions counted per kind (added to ``counts`` if given)."""
+        counts = Counter() if counts is None else counts
+        return PATTERN.sub(lambda m: self._replace(m, counts), text), counts
+
+    def redact_stream(self, chunks: Iterable[str], counts: Optional[Counter] = None) -> Iterator[str]:
+        """
+        De-identify text arriving in arbitrary chunks. Text is redacted up to
+        the last complete line (or last space of an over-long line), so memory
+        is bounded by DEIDENTIFY_STREAM_MAX_LINE plus one chunk.
+        """
+        counts = Counter() if counts is None else counts
+        pending = ""
+        for chunk in chunks:
+            pending += chunk
+            cut = pending.rfind("\n") + 1
+            if not cut and len(pending) > DEIDENTIFY_STREAM_MAX_LINE:
+                cut = pending.rfind(" ", 0, len(pending) - 256) + 1
+            if cut:
+                yield self.redact(pending[:cut], counts)[0]
+                pending = pending[cut:]
+        if pending:
+            yield self.redact(pending, counts)[0]
+
+    def redact_file(self, f: BinaryIO, counts: Optional[Counter] = None,
+                    chunk_size: int = 64 * 1024) -> Iterator[str]:
+        """``redact_stream`` over a binary file (e.g. a spooled upload), decoded as UTF-8."""
+        def chunks():
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            for block in iter(lambda: f.read(chunk_size), b""):
+                yield decoder.decode(block)
+            yield decoder.decode(b"", final=True)
+        return self.redact_stream(chunks(), counts)
+
+
+_default: Optional[Deidentifier] = None
+
+
+def get_engine() -> Deidentifier:
+    global _default
+    if _default is None:
+        first, last = load_names() if os.path.exists(DEIDENTIFY_NAMES_PATH) else (set(), set())
+        _default = Deidentifier(first, last)
+    return _default
+
+
+def deidentify(text: str) -> Dict[str, object]:
+    """{"text": de-identified text, "redactions": {kind: count}} using the default engine."""
+    redacted, counts = get_engine().redact(text)
+    return {"text": redacted, "redactions": dict(counts)}
+
+
+REVIEW_PROMPT = (
+    "TASK: Review a de-identified clinical note (HIPAA Safe Harbor)\n\n"
+    "Identifiers have already been replaced with placeholders such as [NAME], [DATE], [PHONE], [ID] and "
+    "[ADDRESS]. Replace any of the 18 HIPAA identifiers that remain with the matching placeholder. "
+    "Do not change anything else, and keep every existing placeholder.\n\n"
+    "NOTE:\n{text}\n\nOUTPUT: Return the note text ONLY."
+)
+
+
+def review_prompt(redacted_text: str) -> str:
+    """Prompt for the optional LLM second pass; it only ever sees already-redacted text."""
+    return REVIEW_PROMPT.format(text=redacted_text)
+
+
+def accept_review(redacted_text: str, reviewed_text: str) -> Optional[str]:
+    """The reviewer's text if it kept every placeholder, else None (keep the local result)."""
+    if not reviewed_text or len(_PLACEHOLDER_RE.findall(reviewed_text)) < len(_PLACEHOLDER_RE.findall(redacted_text)):
+        return None
+    return reviewed_text
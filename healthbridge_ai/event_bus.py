@@ -0,0 +1,436 @@
+"""
+Durable, batched event bus backed by an append-only local log.
+
+A local stand-in for Pub/Sub. ``publish`` puts an event on a bounded
+in-memory queue and returns at once. A writer thread drains the queue and
+appends events in batches of up to EVENT_BATCH_SIZE, or whatever arrived
+within EVENT_FLUSH_INTERVAL_MS, with one write and one fsync per batch. When
+the queue is full, publishers block for up to EVENT_PUBLISH_TIMEOUT_SECONDS
+(backpressure) and then get ``EventBusFull``. Events are serialized in
+``publish``, so a payload that is not JSON-serializable fails in the caller.
+
+A batch that fails to append is retried EVENT_WRITE_RETRIES times with
+exponential backoff, then appended to ``<EVENT_SPILL_DIR>/<topic>.jsonl``
+and replayed into the topic after its next successful append. Only events
+that could not be written or spilled are dropped, and get_stats() counts them.
+
+Each topic is a directory of JSON-lines segment files
+(``<EVENT_LOG_DIR>/<topic>/0000000001.log``, ...). A new segment starts once
+the active one reaches EVENT_SEGMENT_BYTES. Appends hold an exclusive
+``flock`` on the topic, so several processes can publish to the same log.
+
+Consumers read a topic from a position ``"<segment>:<byte offset>"`` with
+``EventLogReader``. ``Consumer`` also persists a committed position per
+consumer group, which gives at-least-once delivery.
+"""
+import asyncio
+import atexit
+import fcntl
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+EVENT_LOG_DIR = os.getenv("EVENT_LOG_DIR", "./event_log")
+EVENT_SEGMENT_BYTES = int(os.getenv("EVENT_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+EVENT_BATCH_SIZE = int(os.getenv("EVENT_BATCH_SIZE", "500"))
+EVENT_FLUSH_INTERVAL_MS = int(os.getenv("EVENT_FLUSH_INTERVAL_MS", "50"))
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "10000"))
+EVENT_PUBLISH_TIMEOUT_SECONDS = float(os.getenv("EVENT_PUBLISH_TIMEOUT_SECONDS", "5"))
+EVENT_FSYNC = os.getenv("EVENT_FSYNC", "true").lower() not in ("0", "false", "no")
+EVENT_WRITE_RETRIES = int(os.getenv("EVENT_WRITE_RETRIES", "3"))
+EVENT_RETRY_BACKOFF_MS = int(os.getenv("EVENT_RETRY_BACKOFF_MS", "100"))
+EVENT_SPILL_DIR = os.getenv("EVENT_SPILL_DIR", "./event_spill")
+
+_SEGMENT_SUFFIX = ".log"
+
+
+class EventBusFull(Exception):
+    """The publish queue stayed full for longer than the publish timeout."""
+
+
+def _topic_dir(directory: str, topic: str) -> str:
+    safe = "".join(ch if ch.isalnum() or ch in "._-" else "_" for ch in topic)
+    return os.path.join(directory, safe)
+
+
+def _segments(topic_dir: str) -> List[int]:
+    try:
+        names = os.listdir(topic_dir)
+    except FileNotFoundError:
+        return []
+    return sorted(int(name[:-len(_SEGMENT_SUFFIX)]) for name in names
+                  if name.endswith(_SEGMENT_SUFFIX) and name[:-len(_SEGMENT_SUFFIX)].isdigit())
+
+
+def _segment_path(topic_dir: str, segment: int) -> str:
+    return os.path.join(topic_dir, f"{segment:010d}{_SEGMENT_SUFFIX}")
+
+
+def _encode(record: Dict[str, Any]) -> bytes:
+    return (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def _append_spill(path: str, payload: bytes) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "ab") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _take_spill(path: str) -> bytes:
+    """Read and remove a spill file, minus any line a crash left unfinished."""
+    if not os.path.exists(path):
+        return b""
+    with open(path, "rb") as f:
+        payload = f.read()
+    os.remove(path)
+    return payload[:payload.rfind(b"\n") + 1]
+
+
+class SegmentLog:
+    """Appends batches of records to one topic's segment files."""
+
+    def __init__(self, directory: str, topic: str, segment_bytes: int = EVENT_SEGMENT_BYTES, fsync: bool = EVENT_FSYNC):
+        self.topic_dir = _topic_dir(directory, topic)
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        os.makedirs(self.topic_dir, exist_ok=True)
+        self._lock_path = os.path.join(self.topic_dir, ".lock")
+
+    def append(self, records: List[Dict[str, Any]]) -> None:
+        self.append_lines(b"".join(_encode(record) for record in records))
+
+    def append_lines(self, payload: bytes) -> None:
+        """Append already-encoded, newline-terminated JSON lines in one write."""
+        with open(self._lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                segments = _segments(self.topic_dir)
+                segment = segments[-1] if segments else 1
+                path = _segment_path(self.topic_dir, segment)
+                size = os.path.getsize(path) if os.path.exists(path) else 0
+                if size and not _ends_with_newline(path, size):
+                    # A writer died mid-line; terminate it so readers can move past it.
+                    with open(path, "ab") as f:
+                        f.write(b"\n")
+                    size += 1
+                if size and size + len(payload) > self.segment_bytes:
+                    segment += 1
+                    path = _segment_path(self.topic_dir, segment)
+                fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, payload)
+                    if self.fsync:
+                        os.fsync(fd)
+                finally:
+                    os.close(fd)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _ends_with_newline(path: str, size: int) -> bool:
+    with open(path, "rb") as f:
+        f.seek(size - 1)
+        return f.read(1) == b"\n"
+
+
+class EventBus:
+    """Bounded queue in front of per-topic segment logs, flushed by a writer thread."""
+
+    def __init__(self, directory: str = EVENT_LOG_DIR, batch_size: int = EVENT_BATCH_SIZE,
+                 flush_interval_ms: int = EVENT_FLUSH_INTERVAL_MS, queue_size: int = EVENT_QUEUE_SIZE,
+                 segment_bytes: int = EVENT_SEGMENT_BYTES, fsync: bool = EVENT_FSYNC,
+                 write_retries: int = EVENT_WRITE_RETRIES, retry_backoff_ms: int = EVENT_RETRY_BACKOFF_MS,
+                 spill_dir: str = EVENT_SPILL_DIR):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.write_retries = write_retries
+        self.retry_backoff = retry_backoff_ms / 1000
+        self.spill_dir = spill_dir
+        # Items are (topic, encoded line); None stops the writer.
+        self._queue: "queue.Queue[Optional[Tuple[str, bytes]]]" = queue.Queue(maxsize=queue_size)
+        self._logs: Dict[str, SegmentLog] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.stats = {"published": 0, "written": 0, "batches": 0, "rejected": 0, "errors": 0,
+                      "retries": 0, "spilled": 0, "replayed": 0, "dropped": 0}
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="event-bus-writer", daemon=True)
+                self._thread.start()
+
+    def publish(self, topic: str, data: Dict[str, Any], timeout: float = EVENT_PUBLISH_TIMEOUT_SECONDS) -> str:
+        """
+        Queue an event; returns its id. Raises EventBusFull if the queue stays
+        full, and TypeError/ValueError if ``data`` is not JSON-serializable.
+        """
+        event_id, item = self._record(topic, data)
+        self._put(item, timeout)
+        return event_id
+
+    async def publish_async(self, topic: str, data: Dict[str, Any],
+                            timeout: float = EVENT_PUBLISH_TIMEOUT_SECONDS) -> str:
+        """``publish`` for async handlers: waits for queue space off the event loop."""
+        event_id, item = self._record(topic, data)
+        try:
+            self._queue.put_nowait(item)
+            self.stats["published"] += 1
+        except queue.Full:
+            await asyncio.get_running_loop().run_in_executor(None, self._put, item, timeout)
+        return event_id
+
+    def _record(self, topic: str, data: Dict[str, Any]) -> Tuple[str, Tuple[str, bytes]]:
+        event_id = uuid.uuid4().hex
+        line = _encode({"id": event_id, "topic": topic, "published_at": time.time(), "data": data})
+        self._ensure_started()
+        return event_id, (topic, line)
+
+    def _put(self, item: Tuple[str, bytes], timeout: float) -> None:
+        try:
+            self._queue.put(item, timeout=timeout)
+        except queue.Full:
+            self.stats["rejected"] += 1
+            raise EventBusFull(f"Event queue full; {item[0]} event not accepted")
+        self.stats["published"] += 1
+
+    def has_capacity(self) -> bool:
+        """Whether a publish would be queued right now without waiting."""
+        return not self._queue.full()
+
+    def flush(self) -> None:
+        """Block until every event queued so far has been written."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self) -> None:
+        """Write everything still queued and stop the writer thread."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            batch = [item]
+            stopping = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._write(batch)
+            for _ in range(len(batch) + (1 if stopping else 0)):
+                self._queue.task_done()
+            if stopping:
+                return
+
+    def _write(self, batch: List[Tuple[str, bytes]]) -> None:
+        by_topic: Dict[str, List[bytes]] = {}
+        for topic, line in batch:
+            by_topic.setdefault(topic, []).append(line)
+        for topic, lines in by_topic.items():
+            self._write_topic(topic, b"".join(lines), len(lines))
+
+    def _log(self, topic: str) -> SegmentLog:
+        log = self._logs.get(topic)
+        if log is None:
+            log = self._logs[topic] = SegmentLog(self.directory, topic, self.segment_bytes, self.fsync)
+        return log
+
+    def _spill_path(self, topic: str) -> str:
+        return _topic_dir(self.spill_dir, topic) + ".jsonl"
+
+    def _write_topic(self, topic: str, payload: bytes, count: int) -> None:
+        for attempt in range(self.write_retries + 1):
+            if attempt:
+                self.stats["retries"] += 1
+                time.sleep(self.retry_backoff * 2 ** (attempt - 1))
+            try:
+                self._log(topic).append_lines(payload)
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"Error writing {count} {topic} events (attempt {attempt + 1}): {e}")
+                continue
+            self.stats["written"] += count
+            self.stats["batches"] += 1
+            if os.path.exists(self._spill_path(topic)):
+                self._replay_spill(topic)
+            return
+        self._spill(topic, payload, count)
+
+    def _spill(self, topic: str, payload: bytes, count: int) -> None:
+        path = self._spill_path(topic)
+        try:
+            _append_spill(path, payload)
+            self.stats["spilled"] += count
+            print(f"Spilled {count} {topic} events to {path}")
+        except Exception as e:
+            self.stats["dropped"] += count
+            print(f"Dropped {count} {topic} events, spill to {path} failed: {e}")
+
+    def _replay_spill(self, topic: str) -> None:
+        """Append events spilled by earlier failures now that the topic accepts writes again."""
+        try:
+            payload = _take_spill(self._spill_path(topic))
+        except Exception as e:
+            print(f"Could not read {topic} spill file: {e}")
+            return
+        if not payload:
+            return
+        count = payload.count(b"\n")
+        try:
+            self._log(topic).append_lines(payload)
+        except Exception as e:
+            print(f"Replaying spilled {topic} events failed, keeping them for later: {e}")
+            self._spill(topic, payload, count)
+            return
+        self.stats["replayed"] += count
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["queued"] = self._queue.qsize()
+        stats["directory"] = self.directory
+        return stats
+
+
+class EventLogReader:
+    """Reads one topic's events in order from a ``"<segment>:<offset>"`` position."""
+
+    def __init__(self, topic: str, directory: str = EVENT_LOG_DIR):
+        self.topic = topic
+        self.topic_dir = _topic_dir(directory, topic)
+        self.skipped = 0
+
+    def read(self, position: Optional[str] = None, max_events: int = 1000) -> Tuple[List[Dict[str, Any]], str]:
+        """Up to ``max_events`` complete events after ``position``, and the position after them."""
+        segment, offset = _parse_position(position)
+        events: List[Dict[str, Any]] = []
+        for current in _segments(self.topic_dir):
+            if current < segment:
+                continue
+            if current > segment:
+                segment, offset = current, 0
+            with open(_segment_path(self.topic_dir, segment), "rb") as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        # Still being written; nothing after it is readable yet.
+                        return events, _format_position(segment, offset)
+                    offset += len(line)
+                    try:
+                        events.append(json.loads(line))
+                    except ValueError:
+                        self.skipped += 1
+                    if len(events) >= max_events:
+                        return events, _format_position(segment, offset)
+        return events, _format_position(segment, offset)
+
+    def position_for_time(self, since: float) -> str:
+        """
+        Start position that skips whole segments last written before ``since``
+        (epoch seconds). Every event published at or after ``since`` is at or
+        after this position; some earlier ones may be too.
+        """
+        for segment in _segments(self.topic_dir):
+            if os.path.getmtime(_segment_path(self.topic_dir, segment)) >= since:
+                return _format_position(segment, 0)
+        segments = _segments(self.topic_dir)
+        return _format_position(segments[-1] + 1 if segments else 1, 0)
+
+
+class Consumer:
+    """
+    A consumer group's cursor over a topic. ``poll`` returns the next events;
+    ``commit`` records that they were processed, so a restart resumes after them.
+    """
+
+    def __init__(self, topic: str, group: str, directory: str = EVENT_LOG_DIR):
+        self.reader = EventLogReader(topic, directory)
+        groups_dir = os.path.join(self.reader.topic_dir, "consumers")
+        os.makedirs(groups_dir, exist_ok=True)
+        self._offset_path = os.path.join(groups_dir, f"{group}.offset")
+        self.position = self._load()
+        self._pending: Optional[str] = None
+
+    def _load(self) -> str:
+        try:
+            with open(self._offset_path) as f:
+                return f.read().strip() or _format_position(1, 0)
+        except FileNotFoundError:
+            return _format_position(1, 0)
+
+    def poll(self, max_events: int = 1000) -> List[Dict[str, Any]]:
+        events, self._pending = self.reader.read(self._pending or self.position, max_events)
+        return events
+
+    def commit(self) -> None:
+        if self._pending is None or self._pending == self.position:
+            return
+        tmp = self._offset_path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(self._pending)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._offset_path)
+        self.position = self._pending
+
+    def rewind(self) -> None:
+        """Forget uncommitted polls; the next poll starts again from the committed position."""
+        self._pending = None
+
+
+def _parse_position(position: Optional[str]) -> Tuple[int, int]:
+    if not position:
+        return 1, 0
+    segment, offset = position.split(":", 1)
+    return int(segment), int(offset)
+
+
+def _format_position(segment: int, offset: int) -> str:
+    return f"{segment}:{offset}"
+
+
+_default_bus: Optional[EventBus] = None
+
+
+def get_bus() -> EventBus:
+    global _default_bus
+    if _default_bus is None:
+        _default_bus = EventBus()
+        atexit.register(_default_bus.close)
+    return _default_bus
+
+
+def publish(topic: str, data: Dict[str, Any]) -> str:
+    return get_bus().publish(topic, data)
+
+
+async def publish_async(topic: str, data: Dict[str, Any]) -> str:
+    return await get_bus().publish_async(topic, data)
+
+
+def get_stats() -> Dict[str, Any]:
+    return get_bus().get_stats()
@@ -0,0 +1,50 @@
+"""
+orjson-backed JSON responses.
+
+FastAPI passes whatever an endpoint returns through ``jsonable_encoder``,
+which walks the whole structure in Python (and introspects ORM objects)
+before the response class serializes it again. For large lists that walk
+dominates the request's CPU time.
+
+``FastJSONResponse`` is the default response class of both apps, so every
+response is at least rendered by orjson. Endpoints with large payloads go
+further: they build plain dicts/lists (explicit row projections for ORM
+results) and return ``FastJSONResponse(content)`` themselves, which skips
+``jsonable_encoder`` altogether.
+
+orjson serializes datetimes, UUIDs, dataclasses and NumPy values natively;
+``_default`` covers pydantic models, sets and Decimals.
+"""
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(value: Any) -> Any:
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    if hasattr(value, "dict") and hasattr(value, "__fields__"):
+        return value.dict()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=OPTIONS)
+
+
+def dumps_line(content: Any) -> bytes:
+    """One NDJSON line, newline included."""
+    return orjson.dumps(content, default=_default, option=OPTIONS | orjson.OPT_APPEND_NEWLINE)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
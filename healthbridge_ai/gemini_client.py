@@ -4,7 +4,17 @@ Uses Google's Gemini API to analyze clinical notes and extract structured data.
 """
 import os
 import json
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple, AsyncIterator
+
+import deidentify
+import interaction_index
+import json_stream
+import llm_cache
+import llm_gateway
+import llm_json
+import note_batching
+import note_chunking
+import terminology
 
 # Try to import Google Generative AI, fall back to mock if not available
 try:
@@ -20,6 +30,13 @@ if GEMINI_AVAILABLE:
     if api_key:
         genai.configure(api_key=api_key)
 
+GEMINI_MODEL = 'gemini-1.5-pro-latest'
+
+# Bump a version whenever its prompt (or the post-processing of its result) changes so stale cached responses are not served.
+ANALYSIS_PROMPT_VERSION = "analysis-v4"
+INTERACTIONS_PROMPT_VERSION = "interactions-v2"
+DEIDENTIFY_PROMPT_VERSION = "deidentify-v2"
+
 # System prompt based on HealthBridge_API_Prompt.md
 CLINICAL_ANALYSIS_PROMPT = """
 You are HealthBridge AI, an enterprise clinical intelligence engine designed for HIPAA-compliant healthcare data processing.
@@ -74,34 +91,63 @@ Return ONLY valid JSON with these sections:
 }
 """
 
+ANALYSIS_GENERATION_CONFIG = {
+    'temperature': 0.2,
+    'top_p': 0.95,
+    'max_output_tokens': 8192,
+}
+
+def _analysis_prompt(note_text: str) -> str:
+    return f"{CLINICAL_ANALYSIS_PROMPT}\n\nCLINICAL NOTE:\n{note_text}\n\nEXTRACT all medical entities and return structured JSON as specified."
+
+async def _generate_chunk_analysis(chunk_text: str) -> Dict[str, Any]:
+    """Analyze one section-aligned excerpt of a long note (or reuse a cached analysis). Raises on failure."""
+    async def generate():
+        prompt = note_chunking.build_chunk_prompt(CLINICAL_ANALYSIS_PROMPT, chunk_text)
+        result_text = await llm_gateway.generate_text(GEMINI_MODEL, prompt, generation_config=ANALYSIS_GENERATION_CONFIG)
+        return terminology.annotate_analysis(llm_json.parse_llm_json(result_text, "analysis"))
+
+    return await llm_cache.cached_call(
+        "analyze-chunk", llm_cache.normalize_text(chunk_text),
+        ANALYSIS_PROMPT_VERSION, GEMINI_MODEL, generate
+    )
+
+async def _generate_analysis(note_text: str) -> Dict[str, Any]:
+    """Analyze one note with Gemini (or reuse a cached analysis). Raises on failure."""
+    async def generate():
+        if note_chunking.should_chunk(note_text):
+            # Long notes: one prompt per group of sections, analyzed concurrently and merged.
+            # Medications from different chunks were never in one prompt: add the local table's interactions.
+            return interaction_index.annotate_analysis(
+                await note_chunking.analyze_chunked(note_text, _generate_chunk_analysis))
+        result_text = await llm_gateway.generate_text(GEMINI_MODEL, _analysis_prompt(note_text), generation_config=ANALYSIS_GENERATION_CONFIG)
+        # Parse JSON from response
+        return interaction_index.annotate_analysis(terminology.annotate_analysis(llm_json.parse_llm_json(result_text, "analysis")))
+
+    return await llm_cache.cached_call(
+        "analyze-note", llm_cache.normalize_text(note_text),
+        ANALYSIS_PROMPT_VERSION, GEMINI_MODEL, generate
+    )
+
+async def _generate_packed_analysis(items: List[Tuple[int, str]]) -> Dict[int, Dict[str, Any]]:
+    """Analyze several short notes in one prompt; each result is cached as if analyzed alone."""
+    prompt = note_batching.build_packed_prompt(CLINICAL_ANALYSIS_PROMPT, items)
+    result_text = await llm_gateway.generate_text(GEMINI_MODEL, prompt, generation_config=ANALYSIS_GENERATION_CONFIG)
+    results = note_batching.split_packed_response(llm_json.parse_llm_json(result_text, "packed_analysis", many=True))
+    for index, note_text in items:
+        if index in results:
+            terminology.annotate_analysis(results[index])
+            llm_cache.store("analyze-note", llm_cache.normalize_text(note_text),
+                            ANALYSIS_PROMPT_VERSION, GEMINI_MODEL, results[index])
+    return results
+
 async def analyze_clinical_note(patient_id: str, note_text: str, note_date: str = None) -> Dict[str, Any]:
     """
     Analyze clinical note using Gemini API.
     """
     if GEMINI_AVAILABLE and os.getenv("GOOGLE_API_KEY"):
         try:
-            model = genai.GenerativeModel('gemini-1.5-pro-latest')
-            
-            prompt = f"{CLINICAL_ANALYSIS_PROMPT}\n\nCLINICAL NOTE:\n{note_text}\n\nEXTRACT all medical entities and return structured JSON as specified."
-            
-            response = model.generate_content(
-                prompt,
-                generation_config={
-                    'temperature': 0.2,
-                    'top_p': 0.95,
-                    'max_output_tokens': 8192,
-                }
-            )
-            
-            # Parse JSON from response
-            result_text = response.text
-            # Remove markdown code blocks if present
-            if "```json" in result_text:
-                result_text = result_text.split("```json")[1].split("```")[0]
-            elif "```" in result_text:
-                result_text = result_text.split("```")[1].split("```")[0]
-            
-            result = json.loads(result_text.strip())
+            result = await _generate_analysis(note_text)
             result["patient_id"] = patient_id
             return result
             
@@ -111,6 +157,85 @@ async def analyze_clinical_note(patient_id: str, note_text: str, note_date: str
     else:
         return get_mock_analysis(patient_id, note_text)
 
+async def stream_clinical_note_analysis(patient_id: str, note_text: str) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Streaming variant of analyze_clinical_note.
+    Yields ("condition" | "medication" | "allergy" | "lab", entity) as soon as
+    each entity's JSON object closes in the model output, then ("result", analysis)
+    with the complete document, or ("error", detail) if generation fails.
+    """
+    if not (GEMINI_AVAILABLE and os.getenv("GOOGLE_API_KEY")):
+        result = get_mock_analysis(patient_id, note_text)
+    else:
+        normalized = llm_cache.normalize_text(note_text)
+        result = await llm_cache.lookup("analyze-note", normalized, ANALYSIS_PROMPT_VERSION, GEMINI_MODEL)
+        if result is None and note_chunking.should_chunk(note_text):
+            # Long notes: entities arrive per chunk as each one completes.
+            chunks = note_chunking.chunk_note(note_text)
+            merger = note_chunking.AnalysisMerger()
+            results = [None] * len(chunks)
+            try:
+                async for index, analysis in note_chunking.iter_chunk_analyses(chunks, _generate_chunk_analysis):
+                    results[index] = analysis
+                    for section, entity in merger.add(analysis):
+                        if section in json_stream.SECTION_EVENTS:
+                            yield json_stream.SECTION_EVENTS[section], entity
+            except Exception as e:
+                print(f"Gemini API error: {e}")
+                yield "error", {"detail": str(e)}
+                return
+            result = interaction_index.annotate_analysis(note_chunking.merge_analyses(results))
+            result["chunk_count"] = len(chunks)
+            llm_cache.store("analyze-note", normalized, ANALYSIS_PROMPT_VERSION, GEMINI_MODEL, result)
+            result["patient_id"] = patient_id
+            yield "result", result
+            return
+        if result is None:
+            parser = json_stream.IncrementalEntityParser()
+            try:
+                async for chunk in llm_gateway.stream_text(GEMINI_MODEL, _analysis_prompt(note_text), ANALYSIS_GENERATION_CONFIG):
+                    for section, entity in parser.feed(chunk):
+                        yield json_stream.SECTION_EVENTS[section], entity
+                result = interaction_index.annotate_analysis(terminology.annotate_analysis(llm_json.parse_llm_json(parser.text, "analysis")))
+            except Exception as e:
+                print(f"Gemini API error: {e}")
+                yield "error", {"detail": str(e)}
+                return
+            llm_cache.store("analyze-note", normalized, ANALYSIS_PROMPT_VERSION, GEMINI_MODEL, result)
+            result["patient_id"] = patient_id
+            yield "result", result
+            return
+
+    # Complete result already available (cache hit or mock): replay its entities.
+    result["patient_id"] = patient_id
+    for section, entity in json_stream.iter_entities(result):
+        yield json_stream.SECTION_EVENTS[section], entity
+    yield "result", result
+
+async def analyze_clinical_notes_batch(notes: List[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Analyze many notes, yielding per-note results as they complete.
+    Unlike analyze_clinical_note, failures are reported per note instead of
+    being replaced with mock data, so backfills never persist demo output.
+    """
+    texts = [note["note_text"] for note in notes]
+    if GEMINI_AVAILABLE and os.getenv("GOOGLE_API_KEY"):
+        stream = note_batching.stream_batch(
+            texts, _generate_analysis, _generate_packed_analysis,
+            lookup=lambda text: llm_cache.lookup("analyze-note", llm_cache.normalize_text(text),
+                                                 ANALYSIS_PROMPT_VERSION, GEMINI_MODEL)
+        )
+    else:
+        async def mock_analysis(text):
+            return get_mock_analysis(None, text)
+        stream = note_batching.stream_batch(texts, mock_analysis)
+
+    async for item in stream:
+        item["patient_id"] = notes[item["index"]].get("patient_id")
+        if item["status"] == "success":
+            item["result"]["patient_id"] = item["patient_id"]
+        yield item
+
 def get_mock_analysis(patient_id: str, note_text: str) -> Dict[str, Any]:
     """
     Mock clinical analysis for local development without Gemini API.
@@ -197,69 +322,68 @@ def get_mock_analysis(patient_id: str, note_text: str) -> Dict[str, Any]:
 
 async def check_drug_interactions(medications: List[str]) -> Dict[str, Any]:
     """
-    Check for drug-drug interactions using Gemini or mock logic.
+    Check for drug-drug interactions.
+    Pairs covered by the local interaction index are answered locally; only
+    the remaining pairs are sent to Gemini.
     """
-    interactions = []
+    local = interaction_index.check_medications(medications)
+    interactions = [dict(i, severity=i["severity"].upper()) for i in local["interactions"]]
+    unknown_pairs = local["unknown_pairs"]
+    pairs_not_checked = []
     
-    med_list_str = ", ".join(medications)
-    
-    if GEMINI_AVAILABLE and os.getenv("GOOGLE_API_KEY"):
-        try:
-            model = genai.GenerativeModel('gemini-1.5-pro-latest')
-            prompt = f"Check these medications for interactions: {med_list_str}. \nReturn ONLY a JSON object with an 'interactions' array containing objects with: drug_a, drug_b, severity (HIGH/MODERATE/LOW), mechanism, recommendation."
-            
-            response = model.generate_content(prompt)
-            result_text = response.text
-            if "```json" in result_text:
-                result_text = result_text.split("```json")[1].split("```")[0]
+    if unknown_pairs and GEMINI_AVAILABLE and os.getenv("GOOGLE_API_KEY"):
+        pair_list_str = "; ".join(f"{a} + {b}" for a, b in unknown_pairs)
+
+        async def generate():
+            prompt = f"Check these medication pairs for interactions: {pair_list_str}. \nReturn ONLY a JSON object with an 'interactions' array containing objects with: drug_a, drug_b, severity (HIGH/MODERATE/LOW), mechanism, recommendation."
             
-            data = json.loads(result_text.strip())
-            interactions = data.get("interactions", [])
-        except Exception:
-            # Fallback to mock
-            interactions = get_mock_interactions(medications)
+            result_text = await llm_gateway.generate_text(GEMINI_MODEL, prompt)
+            return llm_json.parse_llm_json(result_text, "interactions")
+
+        try:
+            data = await llm_cache.cached_call(
+                "check-interactions", llm_cache.normalize_medications(f"{a} + {b}" for a, b in unknown_pairs),
+                INTERACTIONS_PROMPT_VERSION, GEMINI_MODEL, generate
+            )
+            interactions.extend(data.get("interactions", []))
+        except Exception as e:
+            print(f"Gemini API error: {e}")
+            pairs_not_checked = unknown_pairs
     else:
-        interactions = get_mock_interactions(medications)
+        pairs_not_checked = unknown_pairs
     
     return {
         "status": "success",
         "medications_checked": medications,
         "interactions_found": len(interactions),
-        "interactions": interactions
+        "interactions": interactions,
+        "pairs_not_checked": [list(pair) for pair in pairs_not_checked]
     }
 
-def get_mock_interactions(medications: List[str]) -> List[Dict[str, Any]]:
-    interactions = []
-    med_set = set(med.lower() for med in medications)
-    
-    if "warfarin" in med_set and "aspirin" in med_set:
-        interactions.append({
-            "drug_a": "Warfarin",
-            "drug_b": "Aspirin",
-            "severity": "HIGH",
-            "mechanism": "Increased bleeding risk",
-            "recommendation": "Monitor INR closely. Consider alternative antiplatelet agent."
-        })
-    
-    if "lisinopril" in med_set and any("potassium" in m.lower() for m in medications):
-        interactions.append({
-            "drug_a": "Lisinopril",
-            "drug_b": "Potassium supplement",
-            "severity": "MODERATE",
-            "mechanism": "Risk of hyperkalemia",
-            "recommendation": "Monitor serum potassium levels regularly."
-        })
-async def de_identify_note(note_text: str) -> str:
-    """De-identify clinical note (HIPAA Safe Harbor) using Gemini."""
-    if GEMINI_AVAILABLE and os.getenv("GOOGLE_API_KEY"):
+async def de_identify_note(note_text: str, review: bool = deidentify.DEIDENTIFY_LLM_REVIEW) -> Dict[str, Any]:
+    """
+    De-identify clinical note (HIPAA Safe Harbor) with the local engine. With
+    ``review``, Gemini gets a second pass over the already-redacted text.
+    """
+    result = deidentify.deidentify(note_text)
+    result["reviewed"] = False
+    if review and GEMINI_AVAILABLE and os.getenv("GOOGLE_API_KEY"):
+        redacted = result["text"]
+
+        async def generate():
+            result_text = await llm_gateway.generate_text(GEMINI_MODEL, deidentify.review_prompt(redacted))
+            return result_text.strip()
+
         try:
-            model = genai.GenerativeModel('gemini-1.5-pro-latest')
-            prompt = f"TASK: De-identify Clinical Note (HIPAA Safe Harbor)\n\nCLINICAL NOTE:\n{note_text}\n\nINSTRUCTIONS:\n1. Remove all 18 HIPAA identifiers.\n2. Replace with generic placeholders like [PATIENT_NAME], [DATE].\n3. Preserve clinical context.\n\nOUTPUT: Return the de-identified text ONLY."
-            response = model.generate_content(prompt)
-            return response.text.strip()
-        except Exception:
-            return "[DE-IDENTIFIED] " + note_text[:100] + "..."
-    return "[DE-IDENTIFIED] " + note_text[:100] + "..."
+            # Keyed on the exact text: whitespace can be part of what gets redacted.
+            reviewed = deidentify.accept_review(redacted, await llm_cache.cached_call(
+                "de-identify", redacted, DEIDENTIFY_PROMPT_VERSION, GEMINI_MODEL, generate
+            ))
+            if reviewed is not None:
+                result["text"], result["reviewed"] = reviewed, True
+        except Exception as e:
+            print(f"De-identification review failed, keeping local result: {e}")
+    return result
 
 async def generate_patient_coaching(patient_context: Dict[str, Any]) -> List[Dict[str, Any]]:
     """
@@ -267,15 +391,10 @@ async def generate_patient_coaching(patient_context: Dict[str, Any]) -> List[Dic
     """
     if GEMINI_AVAILABLE and os.getenv("GOOGLE_API_KEY"):
         try:
-            model = genai.GenerativeModel('gemini-1.5-pro-latest')
             prompt = f"TASK: Generate Personalized Patient Adherence Coaching\n\nCONTEXT:\n{json.dumps(patient_context)}\n\nGENERATE JSON array of coaching cards with keys: medication, message (patient-friendly), timing, importance (high/medium/low)."
             
-            response = model.generate_content(prompt)
-            result_text = response.text
-            if "```json" in result_text:
-                result_text = result_text.split("```json")[1].split("```")[0]
-            
-            return json.loads(result_text.strip())
+            result_text = await llm_gateway.generate_text(GEMINI_MODEL, prompt)
+            return llm_json.parse_llm_json(result_text, "coaching", many=True)
         except Exception:
             return get_mock_coaching()
     else:
@@ -0,0 +1,176 @@
+"""
+Upload handling and image pre-processing for prescription OCR.
+
+Uploads are streamed in chunks into a spooled temporary file, which stays in
+memory while small and moves to disk past a threshold. They are rejected as
+soon as they exceed OCR_MAX_UPLOAD_MB. Before the model call an image is
+rotated upright from its EXIF orientation, shrunk so its long edge is at most
+OCR_MAX_DIMENSION pixels, converted to grayscale and re-encoded as JPEG. That
+resolution is plenty for printed or handwritten prescriptions, and a 12 MP
+phone photo drops from several MB to a few hundred KB. A perceptual hash of
+the prepared image is returned for near-duplicate detection (scan_dedupe).
+
+Pillow is optional: without it, or for input it cannot decode (e.g. a PDF),
+the original bytes are sent unchanged. An upload declared as a format Pillow
+reads (JPEG, PNG, ...) that fails to decode is corrupt and is rejected with
+UnsupportedImage instead.
+"""
+import asyncio
+import hashlib
+import io
+import os
+import tempfile
+import time
+from typing import Any, BinaryIO, Dict, Optional, Tuple
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+MAX_UPLOAD_BYTES = int(float(os.getenv("OCR_MAX_UPLOAD_MB", "15")) * 1024 * 1024)
+MAX_DIMENSION = int(os.getenv("OCR_MAX_DIMENSION", "1600"))
+JPEG_QUALITY = int(os.getenv("OCR_JPEG_QUALITY", "80"))
+GRAYSCALE = os.getenv("OCR_GRAYSCALE", "true").lower() not in ("0", "false", "no")
+
+# Uploads up to this size stay in memory; larger ones spill to a temp file.
+_SPOOL_MEMORY_BYTES = 1024 * 1024
+# dHash grid: HASH_SIZE x HASH_SIZE comparisons give a 256-bit hash.
+HASH_SIZE = 16
+_CHUNK_BYTES = 256 * 1024
+# Declared types Pillow decodes; a decode failure for one of these means a corrupt upload.
+_PILLOW_TYPES = {"image/jpeg", "image/jpg", "image/png", "image/webp", "image/gif", "image/bmp", "image/tiff"}
+
+_stats = {"images": 0, "passthrough": 0, "rejected": 0, "bytes_in": 0, "bytes_out": 0, "prep_seconds": 0.0}
+
+
+class UploadTooLarge(ValueError):
+    """The upload exceeded MAX_UPLOAD_BYTES."""
+
+
+class UnsupportedImage(ValueError):
+    """The upload claims to be an image Pillow reads but cannot be decoded."""
+
+
+async def spool_upload(upload, max_bytes: int = MAX_UPLOAD_BYTES) -> Tuple[BinaryIO, int]:
+    """
+    Copy an UploadFile into a SpooledTemporaryFile chunk by chunk.
+    Returns the file (rewound) and its size; raises UploadTooLarge.
+    """
+    declared = getattr(upload, "size", None)
+    if declared is not None and declared > max_bytes:
+        _stats["rejected"] += 1
+        raise UploadTooLarge(f"Upload is larger than {max_bytes // (1024 * 1024)} MB")
+
+    spooled = tempfile.SpooledTemporaryFile(max_size=_SPOOL_MEMORY_BYTES)
+    size = 0
+    while True:
+        chunk = await upload.read(_CHUNK_BYTES)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            spooled.close()
+            _stats["rejected"] += 1
+            raise UploadTooLarge(f"Upload is larger than {max_bytes // (1024 * 1024)} MB")
+        spooled.write(chunk)
+    spooled.seek(0)
+    return spooled, size
+
+
+def dhash(image, hash_size: int = HASH_SIZE) -> int:
+    """Difference hash: one bit per horizontally adjacent pair on a small grayscale grid."""
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] < pixels[offset + col + 1])
+    return value
+
+
+def _read_bounded(source: BinaryIO, max_bytes: int) -> Tuple[bytes, str]:
+    """Read ``source`` chunk by chunk, stopping as soon as it passes ``max_bytes``."""
+    digest = hashlib.sha256()
+    buffer = io.BytesIO()
+    while True:
+        chunk = source.read(_CHUNK_BYTES)
+        if not chunk:
+            break
+        if buffer.tell() + len(chunk) > max_bytes:
+            _stats["rejected"] += 1
+            raise UploadTooLarge(f"Upload is larger than {max_bytes // (1024 * 1024)} MB")
+        digest.update(chunk)
+        buffer.write(chunk)
+    return buffer.getvalue(), digest.hexdigest()
+
+
+def prepare_image(source: BinaryIO, mime_type: Optional[str],
+                  max_bytes: int = MAX_UPLOAD_BYTES) -> Tuple[bytes, str, Dict[str, Any]]:
+    """
+    Orient, downscale, grayscale and re-encode an image for OCR.
+    Returns ``(data, mime_type, info)``; ``info`` has the before/after sizes
+    and the ``sha256`` of the upload; for decodable images also the ``dhash``
+    of the prepared image. ``source`` is read in chunks and UploadTooLarge is
+    raised once it passes ``max_bytes``; UnsupportedImage is raised for a
+    corrupt JPEG, PNG, etc.
+    """
+    started = time.perf_counter()
+    source.seek(0)
+    raw, sha256 = _read_bounded(source, max_bytes)
+    info: Dict[str, Any] = {"original_bytes": len(raw), "processed": False, "sha256": sha256}
+
+    data, out_mime = raw, mime_type or "application/octet-stream"
+    if PIL_AVAILABLE:
+        try:
+            with Image.open(io.BytesIO(raw)) as image:
+                info["original_size"] = image.size
+                # For JPEGs, decode straight at a reduced scale instead of full resolution.
+                image.draft("L" if GRAYSCALE else "RGB", (MAX_DIMENSION, MAX_DIMENSION))
+                image = ImageOps.exif_transpose(image)
+                image.thumbnail((MAX_DIMENSION, MAX_DIMENSION))
+                image = image.convert("L" if GRAYSCALE else "RGB")
+                info["dhash"] = dhash(image)
+                buffer = io.BytesIO()
+                image.save(buffer, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+                info["processed_size"] = image.size
+            # Keep the original if re-encoding somehow made it bigger.
+            if buffer.tell() < len(raw):
+                data, out_mime = buffer.getvalue(), "image/jpeg"
+                info["processed"] = True
+        except Exception as e:
+            if (mime_type or "").lower() in _PILLOW_TYPES:
+                _stats["rejected"] += 1
+                raise UnsupportedImage(f"Could not decode the uploaded {mime_type} image") from e
+            print(f"OCR pre-processing skipped, sending original upload: {e}")
+
+    info["processed_bytes"] = len(data)
+    info["prep_seconds"] = round(time.perf_counter() - started, 4)
+    _stats["images" if info["processed"] else "passthrough"] += 1
+    _stats["bytes_in"] += len(raw)
+    _stats["bytes_out"] += len(data)
+    _stats["prep_seconds"] += info["prep_seconds"]
+    return data, out_mime, info
+
+
+async def prepare_upload(upload, max_bytes: int = MAX_UPLOAD_BYTES) -> Tuple[bytes, str, Dict[str, Any]]:
+    """Spool an UploadFile and pre-process it off the event loop."""
+    spooled, _ = await spool_upload(upload, max_bytes)
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, prepare_image, spooled, upload.content_type, max_bytes)
+    finally:
+        spooled.close()
+
+
+def get_stats() -> Dict[str, Any]:
+    stats = dict(_stats)
+    count = stats["images"] + stats["passthrough"]
+    stats["avg_bytes_in"] = stats["bytes_in"] // count if count else 0
+    stats["avg_bytes_out"] = stats["bytes_out"] // count if count else 0
+    stats["avg_prep_seconds"] = round(stats["prep_seconds"] / count, 4) if count else 0.0
+    stats["prep_seconds"] = round(stats["prep_seconds"], 3)
+    stats["pillow"] = PIL_AVAILABLE
+    return stats
@@ -0,0 +1,194 @@
+"""
+Local drug-drug interaction knowledge base.
+
+Drug names (brand, generic, with or without dose/form text) are normalized to
+a canonical ingredient ID through a synonym table, and curated interactions
+are held in a precomputed pair index. Checking a medication list is then
+n*(n-1)/2 dictionary lookups.
+
+The table lists known interactions; it does not prove any other pair safe.
+A pair with no entry (including any pair with a drug that does not resolve)
+is returned in ``unknown_pairs`` so callers send it to the LLM or report it
+as not checked.
+
+Tables are CSV (header row) or JSON (list of objects) with the columns
+``drug_a, drug_b, severity, mechanism, recommendation`` for interactions and
+``name, ingredient`` for synonyms.
+"""
+import csv
+import json
+import os
+import re
+from itertools import combinations
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+INTERACTIONS_PATH = os.getenv("DRUG_INTERACTIONS_PATH", os.path.join(DATA_DIR, "drug_interactions.csv"))
+SYNONYMS_PATH = os.getenv("DRUG_SYNONYMS_PATH", os.path.join(DATA_DIR, "drug_synonyms.csv"))
+
+SEVERITIES = ("High", "Moderate", "Low")
+
+_DOSE_RE = re.compile(r"\b\d+(?:\.\d+)?\s*(?:mg|mcg|µg|g|ml|meq|units?|iu|%)(?:/\w+)?\b")
+_NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+_FORM_WORDS = frozenset({
+    "tab", "tabs", "tablet", "tablets", "cap", "caps", "capsule", "capsules",
+    "oral", "po", "iv", "im", "sc", "solution", "suspension", "injection", "cream",
+    "er", "xr", "sr", "xl", "dr", "ec", "extended", "delayed", "release",
+    "daily", "qd", "bid", "tid", "qid", "prn", "once", "twice", "hs",
+    "hcl", "sodium", "mg", "mcg", "ml",
+})
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase, strip dose/form noise and punctuation: 'Coumadin 5mg tab' -> 'coumadin'."""
+    text = _DOSE_RE.sub(" ", name.lower())
+    tokens = [t for t in _NON_WORD_RE.sub(" ", text).split() if t not in _FORM_WORDS and not t.isdigit()]
+    return " ".join(tokens)
+
+
+def _read_rows(path: str) -> List[Dict[str, Any]]:
+    if path.endswith(".json"):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+class InteractionIndex:
+    """Synonym map plus pair index over canonical ingredient IDs."""
+
+    def __init__(self):
+        self._synonyms: Dict[str, str] = {}
+        self._pairs: Dict[Tuple[str, str], Dict[str, str]] = {}
+
+    @staticmethod
+    def _pair_key(a: str, b: str) -> Tuple[str, str]:
+        return (a, b) if a <= b else (b, a)
+
+    def add_synonym(self, name: str, ingredient: str) -> None:
+        ingredient = normalize_name(ingredient)
+        self._synonyms[normalize_name(name)] = ingredient
+        self._synonyms.setdefault(ingredient, ingredient)
+
+    def add_interaction(self, drug_a: str, drug_b: str, severity: str, mechanism: str, recommendation: str) -> None:
+        a = self.resolve(drug_a) or normalize_name(drug_a)
+        b = self.resolve(drug_b) or normalize_name(drug_b)
+        self._synonyms.setdefault(a, a)
+        self._synonyms.setdefault(b, b)
+        severity = severity.strip().capitalize()
+        if severity not in SEVERITIES:
+            raise ValueError(f"Unknown severity {severity!r} for {drug_a}/{drug_b}")
+        self._pairs[self._pair_key(a, b)] = {
+            "severity": severity,
+            "mechanism": mechanism.strip(),
+            "recommendation": recommendation.strip(),
+        }
+
+    def resolve(self, name: str) -> Optional[str]:
+        """Map a free-text drug name to its canonical ingredient ID, or None."""
+        normalized = normalize_name(name)
+        hit = self._synonyms.get(normalized)
+        if hit:
+            return hit
+        # Fall back to the longest known sub-phrase, e.g. 'aspirin low dose' -> 'aspirin'.
+        tokens = normalized.split()
+        for size in range(len(tokens) - 1, 0, -1):
+            for start in range(len(tokens) - size + 1):
+                hit = self._synonyms.get(" ".join(tokens[start:start + size]))
+                if hit:
+                    return hit
+        return None
+
+    def lookup(self, ingredient_a: str, ingredient_b: str) -> Optional[Dict[str, str]]:
+        return self._pairs.get(self._pair_key(ingredient_a, ingredient_b))
+
+    def check(self, medications: Iterable[str]) -> Dict[str, Any]:
+        """
+        Check every pair in a medication list.
+
+        Returns a dict with ``interactions`` (known hits, in the API's
+        drug_a/drug_b/severity/mechanism/recommendation shape),
+        ``unknown_pairs`` (pairs without an entry, which the index cannot
+        vouch for) and ``unresolved`` (names that did not map to an ingredient).
+        """
+        resolved: List[Tuple[str, Optional[str]]] = []
+        seen = set()
+        for med in medications:
+            if not med or not med.strip() or med in seen:
+                continue
+            seen.add(med)
+            resolved.append((med, self.resolve(med)))
+
+        interactions = []
+        unknown_pairs = []
+        for (name_a, id_a), (name_b, id_b) in combinations(resolved, 2):
+            if id_a is not None and id_a == id_b:
+                continue
+            hit = self._pairs.get(self._pair_key(id_a, id_b)) if id_a and id_b else None
+            if hit:
+                interactions.append({"drug_a": name_a, "drug_b": name_b, **hit, "source": "local"})
+            else:
+                unknown_pairs.append((name_a, name_b))
+
+        order = {s: i for i, s in enumerate(SEVERITIES)}
+        interactions.sort(key=lambda i: order[i["severity"]])
+        return {
+            "interactions": interactions,
+            "unknown_pairs": unknown_pairs,
+            "unresolved": [name for name, ingredient in resolved if ingredient is None],
+        }
+
+    @property
+    def ingredient_count(self) -> int:
+        return len(set(self._synonyms.values()))
+
+    @property
+    def pair_count(self) -> int:
+        return len(self._pairs)
+
+
+def load_index(interactions_path: str = INTERACTIONS_PATH, synonyms_path: Optional[str] = SYNONYMS_PATH) -> InteractionIndex:
+    """Build an index from a CSV/JSON interaction table and optional synonym table."""
+    index = InteractionIndex()
+    if synonyms_path and os.path.exists(synonyms_path):
+        for row in _read_rows(synonyms_path):
+            index.add_synonym(row["name"], row["ingredient"])
+    for row in _read_rows(interactions_path):
+        index.add_interaction(row["drug_a"], row["drug_b"], row["severity"],
+                              row.get("mechanism", ""), row.get("recommendation", ""))
+    return index
+
+
+_default_index: Optional[InteractionIndex] = None
+
+
+def get_index() -> InteractionIndex:
+    global _default_index
+    if _default_index is None:
+        _default_index = load_index()
+    return _default_index
+
+
+def check_medications(medications: Iterable[str]) -> Dict[str, Any]:
+    return get_index().check(medications)
+
+
+def annotate_analysis(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Add the table's interactions between the extracted medications to
+    ``clinical_validations.drug_interactions`` in place, skipping pairs the
+    model already reported. Every analysis path applies it, streamed or not;
+    a chunked one depends on it, since two medications listed in different
+    chunks were never in the same prompt.
+    """
+    medications = [m.get("drug_name") for m in (result.get("extracted_entities") or {}).get("medications") or []
+                   if isinstance(m, dict) and m.get("drug_name")]
+    # Parsed model output carries None for sections the model left out.
+    validations = result["clinical_validations"] = result.get("clinical_validations") or {}
+    interactions = validations["drug_interactions"] = validations.get("drug_interactions") or []
+    known = {frozenset((str(i.get("drug_a", "")).lower(), str(i.get("drug_b", "")).lower()))
+             for i in interactions if isinstance(i, dict)}
+    for hit in check_medications(medications)["interactions"]:
+        if frozenset((hit["drug_a"].lower(), hit["drug_b"].lower())) not in known:
+            interactions.append(dict(hit, severity=hit["severity"].upper()))
+    return result
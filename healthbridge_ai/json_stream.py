@@ -0,0 +1,113 @@
+"""
+Incremental JSON parser for streamed LLM output.
+
+Text is fed in arbitrary chunks as the model generates it. Whenever an object
+that is an element of a watched array (e.g. ``extracted_entities.conditions``)
+closes, it is decoded and returned immediately, long before the full document
+is complete. Anything before the first ``{`` (such as a markdown fence) is
+ignored.
+"""
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+ENTITY_SECTIONS = ("conditions", "medications", "allergies", "labs")
+# Server-sent event name for an entity from each section.
+SECTION_EVENTS = {"conditions": "condition", "medications": "medication", "allergies": "allergy", "labs": "lab"}
+
+
+class IncrementalEntityParser:
+    """Emit ``(section, object)`` for each completed object inside a watched array."""
+
+    def __init__(self, watched_paths: Optional[Iterable[Tuple[str, ...]]] = None):
+        if watched_paths is None:
+            watched_paths = [("extracted_entities", section) for section in ENTITY_SECTIONS]
+        self._watched = {tuple(path): path[-1] for path in watched_paths}
+        self._text = ""
+        self._pos = 0
+        self._started = False
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        # Each frame: [kind ('{' or '['), path, pending key, expecting key, start offset]
+        self._stack: List[list] = []
+        self._root_closed = False
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    def feed(self, chunk: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """Consume the next chunk; return entities whose objects closed within it."""
+        if self._root_closed or not chunk:
+            return []
+        self._text += chunk
+        text = self._text
+        emitted: List[Tuple[str, Dict[str, Any]]] = []
+        for ch in chunk:
+            pos = self._pos
+            self._pos += 1
+            if not self._started:
+                if ch != "{":
+                    continue
+                self._started = True
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    frame = self._stack[-1] if self._stack else None
+                    if frame and frame[0] == "{" and frame[3]:
+                        frame[2] = json.loads(text[self._string_start:pos + 1])
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = pos
+            elif ch == "{" or ch == "[":
+                path = self._child_path()
+                self._stack.append([ch, path, None, ch == "{", pos])
+            elif ch == "}" or ch == "]":
+                if not self._stack:
+                    continue
+                kind, path, _, _, start = self._stack.pop()
+                parent = self._stack[-1] if self._stack else None
+                if kind == "{" and parent and parent[0] == "[" and parent[1] in self._watched:
+                    try:
+                        emitted.append((self._watched[parent[1]], json.loads(text[start:pos + 1])))
+                    except ValueError:
+                        pass
+                if not self._stack:
+                    self._root_closed = True
+                    break
+            elif ch == ":":
+                if self._stack and self._stack[-1][0] == "{":
+                    self._stack[-1][3] = False
+            elif ch == ",":
+                if self._stack and self._stack[-1][0] == "{":
+                    self._stack[-1][3] = True
+                    self._stack[-1][2] = None
+        return emitted
+
+    def _child_path(self) -> Tuple[str, ...]:
+        if not self._stack:
+            return ()
+        kind, path, key, _, _ = self._stack[-1]
+        if kind == "{":
+            return path + (str(key),)
+        return path
+
+
+def iter_entities(result: Dict[str, Any], sections: Iterable[str] = ENTITY_SECTIONS):
+    """Yield ``(section, entity)`` from an already complete analysis (e.g. a cache hit)."""
+    entities = result.get("extracted_entities") or {}
+    for section in sections:
+        for entity in entities.get(section) or []:
+            yield section, entity
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,320 @@
+"""
+Content-addressed cache for LLM responses.
+
+Keys are a SHA-256 of the normalized input, the prompt version and the model
+name, so re-submitting the same note or medication list skips the Gemini call.
+Entries live in an in-memory LRU tier backed by a SQLite table stored in
+``healthbridge.db``; both tiers honour a TTL and a size cap.
+
+The memory tier is read inline. SQLite work runs on one background thread so
+it never blocks the event loop: a memory miss awaits the disk read there,
+writes are queued without waiting, and disk hits record their access time
+in batches instead of committing on every hit.
+
+Values are stored as JSON text so callers always get a private copy they are
+free to mutate.
+
+Cached values are model output about clinical notes and can contain PHI
+(names, dates, findings) for up to LLM_CACHE_TTL_SECONDS. Set
+LLM_CACHE_ENCRYPTION_KEY (a Fernet key) to encrypt values at rest in SQLite;
+otherwise they are stored in plaintext and LLM_CACHE_DB_PATH must be on
+storage protected like the rest of the PHI database.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+    CRYPTOGRAPHY_AVAILABLE = True
+    _DECODE_ERRORS = (ValueError, InvalidToken)
+except ImportError:
+    CRYPTOGRAPHY_AVAILABLE = False
+    _DECODE_ERRORS = (ValueError,)
+
+CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+CACHE_DB_PATH = os.getenv("LLM_CACHE_DB_PATH", "./healthbridge.db")
+CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+CACHE_MAX_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MAX_MEMORY_ENTRIES", "1024"))
+CACHE_MAX_ROWS = int(os.getenv("LLM_CACHE_MAX_ROWS", "100000"))
+CACHE_ENCRYPTION_KEY = os.getenv("LLM_CACHE_ENCRYPTION_KEY", "")
+
+# Run size-based eviction on the SQLite tier every N writes rather than on each one.
+_EVICT_EVERY = 256
+# Write the access times of disk hits once this many are pending (or with the next write).
+_TOUCH_BATCH = 64
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so trivially reformatted notes share a key."""
+    return " ".join(text.split())
+
+
+def normalize_medications(medications) -> str:
+    """Order- and case-insensitive representation of a medication list."""
+    return "\n".join(sorted({normalize_text(m).lower() for m in medications if m and m.strip()}))
+
+
+def make_key(kind: str, normalized_input: str, prompt_version: str, model_name: str) -> str:
+    digest = hashlib.sha256()
+    for part in (kind, prompt_version, model_name, normalized_input):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """Two-tier (memory LRU + SQLite) response cache; SQLite is only touched from its own thread."""
+
+    def __init__(self, db_path: str = CACHE_DB_PATH, ttl_seconds: int = CACHE_TTL_SECONDS,
+                 max_memory_entries: int = CACHE_MAX_MEMORY_ENTRIES, max_rows: int = CACHE_MAX_ROWS,
+                 encryption_key: str = CACHE_ENCRYPTION_KEY):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_entries = max_memory_entries
+        self.max_rows = max_rows
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm-cache")
+        self._writes = 0
+        self._pending_writes = 0
+        # key -> last access time of disk hits not yet written; owned by the cache thread.
+        self._touched: Dict[str, float] = {}
+        self._fernet = None
+        if encryption_key:
+            if not CRYPTOGRAPHY_AVAILABLE:
+                raise RuntimeError("LLM_CACHE_ENCRYPTION_KEY is set but the cryptography package is not installed")
+            self._fernet = Fernet(encryption_key.encode("ascii"))
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "write_errors": 0}
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_response_cache ("
+                " key TEXT PRIMARY KEY,"
+                " kind TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_llm_response_cache_accessed_at ON llm_response_cache (accessed_at)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _encode(self, encoded: str) -> str:
+        return self._fernet.encrypt(encoded.encode("utf-8")).decode("ascii") if self._fernet else encoded
+
+    def _decode(self, stored: str) -> str:
+        return self._fernet.decrypt(stored.encode("ascii")).decode("utf-8") if self._fernet else stored
+
+    def _memory_get(self, key: str, now: float) -> Optional[str]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            created_at, encoded = entry
+            if now - created_at <= self.ttl_seconds:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return encoded
+            del self._memory[key]
+            return None
+
+    def _disk_get(self, key: str, now: float) -> Optional[Any]:
+        """Cache thread: the stored value, decoded, or None on a miss."""
+        db = self._db()
+        row = db.execute("SELECT value, created_at FROM llm_response_cache WHERE key = ?", (key,)).fetchone()
+        if row is not None and now - row[1] <= self.ttl_seconds:
+            try:
+                encoded = self._decode(row[0])
+                value = json.loads(encoded)
+            except _DECODE_ERRORS as e:
+                # Written under another encryption setting or key: treat it as expired.
+                print(f"LLM cache entry unreadable, dropping it: {e}")
+                encoded = None
+            if encoded is not None:
+                self._touched[key] = now
+                if len(self._touched) >= _TOUCH_BATCH:
+                    self._flush_touched()
+                    db.commit()
+                with self._lock:
+                    self._remember(key, row[1], encoded)
+                    self.stats["disk_hits"] += 1
+                return value
+        if row is not None:
+            db.execute("DELETE FROM llm_response_cache WHERE key = ?", (key,))
+            db.commit()
+            self.stats["evictions"] += 1
+        self.stats["misses"] += 1
+        return None
+
+    def get(self, key: str) -> Optional[Any]:
+        """Blocking lookup for code not running on the event loop; use ``get_async`` there."""
+        now = time.time()
+        encoded = self._memory_get(key, now)
+        if encoded is not None:
+            return json.loads(encoded)
+        return self._executor.submit(self._disk_get, key, now).result()
+
+    async def get_async(self, key: str) -> Optional[Any]:
+        now = time.time()
+        encoded = self._memory_get(key, now)
+        if encoded is not None:
+            return json.loads(encoded)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._disk_get, key, now)
+
+    def set(self, key: str, value: Any, kind: str = "") -> None:
+        """Store ``value``: the memory tier at once, SQLite on the cache thread (not awaited)."""
+        now = time.time()
+        encoded = json.dumps(value)
+        with self._lock:
+            self._remember(key, now, encoded)
+            self.stats["stores"] += 1
+            self._pending_writes += 1
+        self._executor.submit(self._write, key, kind, encoded, now)
+
+    def _write(self, key: str, kind: str, encoded: str, now: float) -> None:
+        try:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO llm_response_cache (key, kind, value, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, kind, self._encode(encoded), now, now),
+            )
+            self._flush_touched()
+            db.commit()
+            self._writes += 1
+            if self._writes % _EVICT_EVERY == 0:
+                self._evict(now)
+        except Exception as e:
+            # The memory tier still has the value; the next identical request recomputes at worst.
+            self.stats["write_errors"] += 1
+            print(f"LLM cache write failed: {e}")
+        finally:
+            with self._lock:
+                self._pending_writes -= 1
+
+    def _flush_touched(self) -> None:
+        """Cache thread: write pending access times (the caller commits)."""
+        if self._touched:
+            self._db().executemany(
+                "UPDATE llm_response_cache SET accessed_at = ? WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def _remember(self, key: str, created_at: float, encoded: str) -> None:
+        self._memory[key] = (created_at, encoded)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self, now: float) -> None:
+        db = self._db()
+        expired = db.execute(
+            "DELETE FROM llm_response_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+        ).rowcount
+        (count,) = db.execute("SELECT COUNT(*) FROM llm_response_cache").fetchone()
+        overflow = max(0, count - self.max_rows)
+        if overflow:
+            db.execute(
+                "DELETE FROM llm_response_cache WHERE key IN ("
+                " SELECT key FROM llm_response_cache ORDER BY accessed_at LIMIT ?)",
+                (overflow,),
+            )
+        db.commit()
+        self.stats["evictions"] += expired + overflow
+
+    def flush(self) -> None:
+        """Block until queued writes and pending access times are in SQLite."""
+        def run():
+            self._flush_touched()
+            self._db().commit()
+        self._executor.submit(run).result()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+
+        def run():
+            self._touched.clear()
+            self._db().execute("DELETE FROM llm_response_cache")
+            self._db().commit()
+        self._executor.submit(run).result()
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+        stats["memory_entries"] = len(self._memory)
+        stats["pending_writes"] = self._pending_writes
+        stats["encrypted"] = self._fernet is not None
+        stats["enabled"] = CACHE_ENABLED
+        return stats
+
+
+_default_cache: Optional[ResponseCache] = None
+
+
+def get_cache() -> ResponseCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResponseCache()
+    return _default_cache
+
+
+def cacheable(value: Any) -> bool:
+    """
+    False for values marked ``cacheable = False``, such as output llm_json
+    had to repair: a truncated response is served once but not for a week.
+    """
+    return getattr(value, "cacheable", True)
+
+
+async def cached_call(kind: str, normalized_input: str, prompt_version: str, model_name: str,
+                      compute: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Return the cached response for this input, or await ``compute()`` and store it.
+    Exceptions from ``compute`` propagate and nothing is cached, and neither is
+    a value that is not ``cacheable`` (see below).
+    """
+    if not CACHE_ENABLED:
+        return await compute()
+    cache = get_cache()
+    key = make_key(kind, normalized_input, prompt_version, model_name)
+    hit = await cache.get_async(key)
+    if hit is not None:
+        return hit
+    value = await compute()
+    if cacheable(value):
+        cache.set(key, value, kind)
+    return value
+
+
+async def lookup(kind: str, normalized_input: str, prompt_version: str, model_name: str) -> Optional[Any]:
+    """Cached response for this input, or None (without computing anything)."""
+    if not CACHE_ENABLED:
+        return None
+    return await get_cache().get_async(make_key(kind, normalized_input, prompt_version, model_name))
+
+
+def store(kind: str, normalized_input: str, prompt_version: str, model_name: str, value: Any) -> None:
+    """Store a response produced outside ``cached_call`` (e.g. from a packed prompt)."""
+    if CACHE_ENABLED and cacheable(value):
+        get_cache().set(make_key(kind, normalized_input, prompt_version, model_name), value, kind)
+
+
+def get_stats() -> Dict[str, Any]:
+    return get_cache().get_stats()
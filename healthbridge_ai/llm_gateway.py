@@ -0,0 +1,180 @@
+"""
+Async gateway for Gemini calls.
+
+Every LLM round trip goes through here so request handlers never block the
+event loop. Calls use the SDK's native async API when it is available and
+otherwise run on a bounded thread pool. A per-worker semaphore caps how many
+generations are in flight at once. A thread-pool call that times out (or
+whose caller goes away) cannot be stopped, so it keeps its slot until the
+thread actually returns; the cap holds however many calls time out.
+
+This module is self-contained so it can be imported both as ``llm_gateway``
+inside the healthbridge_ai service and as ``healthbridge_ai.llm_gateway`` from
+the consolidated API.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+try:
+    import google.generativeai as genai
+    GEMINI_AVAILABLE = True
+except ImportError:
+    genai = None
+    GEMINI_AVAILABLE = False
+
+# Per-worker limits. uvicorn runs one event loop per worker process, so these
+# apply per worker rather than per deployment.
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+
+_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix="llm")
+_semaphores: Dict[int, asyncio.Semaphore] = {}
+
+_stats = {
+    "in_flight": 0,
+    "waiting": 0,
+    "completed": 0,
+    "failed": 0,
+    "timeouts": 0,
+    # Timed-out or cancelled thread-pool calls still running and holding a slot.
+    "abandoned": 0,
+    "total_seconds": 0.0,
+}
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    # One semaphore per running loop; Python 3.9 binds primitives at construction.
+    loop_id = id(asyncio.get_running_loop())
+    semaphore = _semaphores.get(loop_id)
+    if semaphore is None:
+        semaphore = _semaphores[loop_id] = asyncio.Semaphore(MAX_CONCURRENCY)
+    return semaphore
+
+
+async def run_blocking(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking callable on the LLM thread pool under the concurrency cap."""
+    loop = asyncio.get_running_loop()
+    return await _guarded(lambda: loop.run_in_executor(_executor, lambda: func(*args, **kwargs)))
+
+
+async def _guarded(make_awaitable: Callable[[], Any]) -> Any:
+    semaphore = _get_semaphore()
+    _stats["waiting"] += 1
+    try:
+        await semaphore.acquire()
+    finally:
+        _stats["waiting"] -= 1
+    _stats["in_flight"] += 1
+    started = time.perf_counter()
+    awaitable = make_awaitable()
+    # run_in_executor returns a Future for a thread that wait_for cannot stop; shield it
+    # so a timeout leaves it running, and release the slot only when the thread returns.
+    worker = awaitable if isinstance(awaitable, asyncio.Future) else None
+    try:
+        result = await asyncio.wait_for(asyncio.shield(worker) if worker else awaitable, timeout=TIMEOUT_SECONDS)
+        _stats["completed"] += 1
+        return result
+    except asyncio.TimeoutError:
+        _stats["timeouts"] += 1
+        _stats["failed"] += 1
+        raise
+    except Exception:
+        _stats["failed"] += 1
+        raise
+    finally:
+        _stats["in_flight"] -= 1
+        _stats["total_seconds"] += time.perf_counter() - started
+        if worker is not None and not worker.done():
+            _stats["abandoned"] += 1
+            worker.add_done_callback(lambda future: _release_abandoned(future, semaphore))
+        else:
+            semaphore.release()
+
+
+def _release_abandoned(future: asyncio.Future, semaphore: asyncio.Semaphore) -> None:
+    if not future.cancelled():
+        future.exception()  # retrieved so it is not logged as unhandled; the caller already gave up
+    _stats["abandoned"] -= 1
+    semaphore.release()
+
+
+async def generate_content(model_name: str, contents: Any, generation_config: Optional[Dict[str, Any]] = None):
+    """
+    Generate content with Gemini without blocking the event loop.
+    Returns the SDK response object.
+    """
+    if not GEMINI_AVAILABLE:
+        raise RuntimeError("google-generativeai is not installed")
+
+    model = genai.GenerativeModel(model_name)
+    kwargs = {}
+    if generation_config:
+        kwargs["generation_config"] = generation_config
+
+    if hasattr(model, "generate_content_async"):
+        return await _guarded(lambda: model.generate_content_async(contents, **kwargs))
+    return await run_blocking(model.generate_content, contents, **kwargs)
+
+
+async def generate_text(model_name: str, contents: Any, generation_config: Optional[Dict[str, Any]] = None) -> str:
+    """Convenience wrapper returning only the response text."""
+    response = await generate_content(model_name, contents, generation_config)
+    return response.text
+
+
+async def stream_text(model_name: str, contents: Any,
+                      generation_config: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+    """
+    Yield response text chunks as Gemini generates them.
+    The concurrency slot is held until the stream finishes; the overall
+    timeout does not apply since streams are expected to be long.
+    """
+    if not GEMINI_AVAILABLE:
+        raise RuntimeError("google-generativeai is not installed")
+
+    model = genai.GenerativeModel(model_name)
+    kwargs = {"stream": True}
+    if generation_config:
+        kwargs["generation_config"] = generation_config
+
+    semaphore = _get_semaphore()
+    _stats["waiting"] += 1
+    async with semaphore:
+        _stats["waiting"] -= 1
+        _stats["in_flight"] += 1
+        started = time.perf_counter()
+        try:
+            if hasattr(model, "generate_content_async"):
+                response = await model.generate_content_async(contents, **kwargs)
+                async for chunk in response:
+                    yield chunk.text
+            else:
+                loop = asyncio.get_running_loop()
+                iterator = iter(await loop.run_in_executor(
+                    _executor, lambda: model.generate_content(contents, **kwargs)))
+                done = object()
+                while True:
+                    chunk = await loop.run_in_executor(_executor, next, iterator, done)
+                    if chunk is done:
+                        break
+                    yield chunk.text
+            _stats["completed"] += 1
+        except Exception:
+            _stats["failed"] += 1
+            raise
+        finally:
+            _stats["in_flight"] -= 1
+            _stats["total_seconds"] += time.perf_counter() - started
+
+
+def get_stats() -> Dict[str, Any]:
+    """Snapshot of gateway counters for health/metrics endpoints."""
+    stats = dict(_stats)
+    stats["max_concurrency"] = MAX_CONCURRENCY
+    done = stats["completed"] + stats["failed"]
+    stats["avg_seconds"] = round(stats["total_seconds"] / done, 4) if done else 0.0
+    stats["total_seconds"] = round(stats["total_seconds"], 4)
+    return stats
@@ -0,0 +1,339 @@
+"""
+Shared JSON extraction and schema validation for LLM output.
+
+``extract_json`` finds the outermost JSON object or array in model output in
+a single scan. Along the way it skips markdown fences and surrounding prose,
+drops trailing commas, and repairs a truncated tail by cutting back to the
+last complete array element (or root member) and closing the open
+containers; a half-written entity is dropped, never kept in part.
+``parse_llm_json`` then validates the value against one of the response
+schemas below and counts successes, repairs and failures per schema.
+Repaired values come back as RepairedDict/RepairedList, which llm_cache
+returns to the caller but does not store, so a retry can do better.
+"""
+from typing import Any, Dict, List, Optional, Type, Union
+import json
+import re
+
+from pydantic import BaseModel, ValidationError
+
+try:
+    from pydantic import ConfigDict
+except ImportError:  # pydantic v1
+    ConfigDict = None
+
+Number = Union[int, float, str]
+
+
+class LLMJSONError(ValueError):
+    """Model output did not contain valid JSON matching the expected schema."""
+
+
+class _Lenient(BaseModel):
+    # LLMs add fields freely; keep them rather than failing the whole response.
+    if ConfigDict is not None:
+        model_config = ConfigDict(extra="allow")
+    else:
+        class Config:
+            extra = "allow"
+
+
+# --- Clinical analysis -------------------------------------------------------
+
+class Condition(_Lenient):
+    clinical_text: str
+    icd_10: Optional[str] = None
+    snomed_ct: Optional[str] = None
+    severity: Optional[str] = None
+    onset_date: Optional[str] = None
+    confidence: Optional[Number] = None
+    negated: Optional[bool] = None
+    requires_review: Optional[bool] = None
+
+
+class MedicationEntity(_Lenient):
+    drug_name: str
+    rxnorm_code: Optional[str] = None
+    dosage: Optional[str] = None
+    frequency: Optional[str] = None
+    route: Optional[str] = None
+    indication: Optional[str] = None
+    confidence: Optional[Number] = None
+
+
+class Allergy(_Lenient):
+    allergen: str
+    reaction: Optional[str] = None
+    severity: Optional[str] = None
+
+
+class Lab(_Lenient):
+    test_name: str
+    result: Optional[Number] = None
+    units: Optional[str] = None
+    loinc_code: Optional[str] = None
+    reference_range: Optional[str] = None
+
+
+class ExtractedEntities(_Lenient):
+    conditions: List[Condition] = []
+    medications: List[MedicationEntity] = []
+    allergies: List[Allergy] = []
+    labs: List[Lab] = []
+    social_determinants: List[Dict[str, Any]] = []
+
+
+class ClinicalAnalysis(_Lenient):
+    extracted_entities: ExtractedEntities
+    clinical_validations: Optional[Dict[str, Any]] = None
+    adherence_insights: Optional[Dict[str, Any]] = None
+    fhir_resources: Optional[Dict[str, Any]] = None
+    human_review_queue: List[Dict[str, Any]] = []
+
+
+class PackedAnalysis(_Lenient):
+    note_id: Union[int, str]
+    analysis: ClinicalAnalysis
+
+
+# --- Interactions -------------------------------------------------------------
+
+class Interaction(_Lenient):
+    drug_a: str
+    drug_b: str
+    severity: Optional[str] = None
+    mechanism: Optional[str] = None
+    recommendation: Optional[str] = None
+
+
+class InteractionReport(_Lenient):
+    interactions: List[Interaction] = []
+    food_interactions: List[Dict[str, Any]] = []
+    lifestyle_recommendations: List[str] = []
+    warnings: List[str] = []
+
+
+# --- Prescription OCR -----------------------------------------------------------
+
+class PrescriptionItem(_Lenient):
+    name: str
+    dosage: Optional[str] = None
+    frequency: Optional[str] = None
+    duration: Optional[str] = None
+
+
+class PrescriptionScan(_Lenient):
+    medications: List[PrescriptionItem] = []
+    raw_text: Optional[str] = None
+
+
+# --- Coaching -------------------------------------------------------------------
+
+class CoachingCard(_Lenient):
+    medication: Optional[str] = None
+    message: str
+    timing: Optional[str] = None
+    importance: Optional[str] = None
+
+
+SCHEMAS: Dict[str, Type[BaseModel]] = {
+    "analysis": ClinicalAnalysis,
+    "packed_analysis": PackedAnalysis,
+    "interactions": InteractionReport,
+    "ocr": PrescriptionScan,
+    "coaching": CoachingCard,
+}
+
+_stats: Dict[str, Dict[str, int]] = {}
+
+
+def _record(name: str, outcome: str) -> None:
+    counters = _stats.setdefault(name, {"attempts": 0, "success": 0, "repaired": 0, "failed": 0})
+    counters["attempts"] += 1
+    counters[outcome] += 1
+
+
+class RepairedDict(dict):
+    """A value ``parse_llm_json`` had to repair. llm_cache does not store it (``cacheable`` is False)."""
+    cacheable = False
+
+
+class RepairedList(list):
+    """A list ``parse_llm_json`` had to repair. llm_cache does not store it (``cacheable`` is False)."""
+    cacheable = False
+
+
+def extract_json(text: str) -> Any:
+    """
+    Return the outermost JSON value in ``text``.
+    Raises LLMJSONError if there is none or it cannot be repaired.
+    """
+    value, _ = _extract(text)
+    return value
+
+
+# A "[" opens JSON only if a value follows, so bracketed prose ("Here [note]: {...}") is skipped.
+_START_RE = re.compile(r'\{|\[(?=\s*(?:[\[{"\]\-\d]|true\b|false\b|null\b))')
+
+
+def _extract(text: str):
+    error = None
+    position = _find_start(text)
+    while position != -1:
+        candidate, repaired, end = _scan(text, position)
+        if candidate is not None:
+            try:
+                return _loads(candidate), repaired
+            except LLMJSONError as e:
+                error = error or e
+        else:
+            error = error or LLMJSONError(f"Mismatched {text[end - 1]!r} in model output")
+        # Not JSON after all (prose in brackets): look again after it.
+        match = _START_RE.search(text, end) if end < len(text) else None
+        position = match.start() if match else -1
+    raise error or LLMJSONError("No JSON object or array in model output")
+
+
+def _scan(text: str, start: int):
+    """
+    ``(candidate, repaired, end)`` for the value starting at ``start``:
+    the JSON text to load (None on a mismatched closer), whether it was
+    repaired, and where the scan stopped.
+    """
+    out: List[str] = []
+    stack: List[str] = []
+    in_string = escape = False
+    repaired = False
+    # Last position where the output can be cut and closed without keeping part of
+    # a value: between the elements of an array, or between the members of the root.
+    # Cutting inside an object that is an array element would keep half an entity
+    # (say, without its "negated" flag), so no cut is taken while one is open.
+    safe_len, safe_stack = 0, ""
+    arrays = open_elements = 0
+
+    for offset, ch in enumerate(text[start:], start):
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+
+        if ch == '"':
+            in_string = True
+            out.append(ch)
+        elif ch == "{" or ch == "[":
+            if ch == "[":
+                arrays += 1
+            elif arrays:
+                open_elements += 1
+            stack.append("}" if ch == "{" else "]")
+            out.append(ch)
+            if not open_elements and (ch == "[" or len(stack) == 1):
+                safe_len, safe_stack = len(out), "".join(stack)
+        elif ch == "}" or ch == "]":
+            if not stack or stack[-1] != ch:
+                return None, repaired, offset + 1
+            # Drop a trailing comma before the closer.
+            end = len(out)
+            while end and out[end - 1].isspace():
+                end -= 1
+            if end and out[end - 1] == ",":
+                del out[end - 1]
+                repaired = True
+            stack.pop()
+            if ch == "]":
+                arrays -= 1
+            elif arrays:
+                open_elements -= 1
+            out.append(ch)
+            if not stack:
+                return "".join(out), repaired, offset + 1
+            if not open_elements and (stack[-1] == "]" or len(stack) == 1):
+                safe_len, safe_stack = len(out), "".join(stack)
+        elif ch == ",":
+            if not open_elements and (stack[-1] == "]" or len(stack) == 1):
+                safe_len, safe_stack = len(out), "".join(stack)
+            out.append(ch)
+        else:
+            out.append(ch)
+
+    # Ran out of text before the root closed: keep the complete part.
+    candidate = "".join(out[:safe_len]).rstrip()
+    if candidate.endswith(","):
+        candidate = candidate[:-1]
+    return candidate + "".join(reversed(safe_stack)), True, len(text)
+
+
+def _find_start(text: str) -> int:
+    search_from = 0
+    fence = text.find("```")
+    if fence != -1:
+        newline = text.find("\n", fence)
+        search_from = newline + 1 if newline != -1 else fence + 3
+    match = _START_RE.search(text, search_from)
+    if match is None and search_from:
+        match = _START_RE.search(text)
+    return match.start() if match else -1
+
+
+def _loads(candidate: str) -> Any:
+    try:
+        return json.loads(candidate)
+    except ValueError as e:
+        raise LLMJSONError(f"Invalid JSON in model output: {e}") from e
+
+
+def _validate(model: Type[BaseModel], data: Any) -> Dict[str, Any]:
+    # Works with both Pydantic v1 and v2.
+    if hasattr(model, "model_validate"):
+        return model.model_validate(data).model_dump()
+    return model.parse_obj(data).dict()
+
+
+def parse_llm_json(text: str, schema: Optional[str] = None, many: bool = False) -> Any:
+    """
+    Extract JSON from model output and validate it against ``SCHEMAS[schema]``.
+    With ``many`` the value must be a list of that schema. Returns plain
+    dicts/lists with schema defaults filled in. Raises LLMJSONError.
+    """
+    name = schema or "untyped"
+    try:
+        value, repaired = _extract(text)
+        # Unwrapping a list below is counted as a repair but loses nothing, so it is still cached.
+        cacheable = not repaired
+        if schema:
+            model = SCHEMAS[schema]
+            if many:
+                if isinstance(value, dict) and len(value) == 1 and isinstance(next(iter(value.values())), list):
+                    # e.g. {"coaching_cards": [...]} when a bare array was requested
+                    value = next(iter(value.values()))
+                    repaired = True
+                if not isinstance(value, list):
+                    raise LLMJSONError(f"Expected a JSON array for {schema}")
+                value = [_validate(model, item) for item in value]
+            else:
+                value = _validate(model, value)
+    except (LLMJSONError, ValidationError) as e:
+        _record(name, "failed")
+        if isinstance(e, LLMJSONError):
+            raise
+        raise LLMJSONError(f"Model output does not match the {schema} schema: {e}") from e
+    _record(name, "repaired" if repaired else "success")
+    if not cacheable and isinstance(value, dict):
+        return RepairedDict(value)
+    if not cacheable and isinstance(value, list):
+        return RepairedList(value)
+    return value
+
+
+def get_stats() -> Dict[str, Any]:
+    """Parse counters per schema, with the share of outputs that were usable."""
+    stats = {}
+    for name, counters in _stats.items():
+        usable = counters["success"] + counters["repaired"]
+        stats[name] = dict(counters, success_rate=round(usable / counters["attempts"], 4))
+    return stats
@@ -1,12 +1,24 @@
 from fastapi import FastAPI, HTTPException, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
+import asyncio
 import os
-from gemini_client import analyze_clinical_note, check_drug_interactions
+import deidentify
+from gemini_client import analyze_clinical_note, analyze_clinical_notes_batch, check_drug_interactions, stream_clinical_note_analysis
+import fast_json
+import image_prep
+import json_stream
+import llm_cache
+import llm_gateway
+import llm_json
+import note_batching
+import scan_dedupe
+import terminology
 from vision_ocr import extract_prescription_data
 
-app = FastAPI(title="HealthBridge AI")
+app = FastAPI(title="HealthBridge AI", default_response_class=fast_json.FastJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -21,33 +33,81 @@ class ClinicalNote(BaseModel):
     note_text: str
     note_date: Optional[str] = None
 
+class BatchNotesRequest(BaseModel):
+    notes: List[ClinicalNote]
+
 class MedicationsRequest(BaseModel):
     medications: List[str]
 
+@app.on_event("startup")
+def load_terminology():
+    # Map (or compile) the terminology index and load the de-identification name
+    # dictionary now rather than on the first request.
+    terminology.get_index()
+    deidentify.get_engine()
+
 @app.get("/")
 def root():
     return {"status": "HealthBridge AI is running", "version": "1.0.0"}
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "service": "healthbridge-ai"}
+    return {"status": "healthy", "service": "healthbridge-ai", "llm_gateway": llm_gateway.get_stats(), "llm_cache": llm_cache.get_stats(), "llm_json": llm_json.get_stats(), "ocr": image_prep.get_stats(), "scan_dedupe": scan_dedupe.get_stats(), "terminology": terminology.get_stats()}
 
 @app.post("/analyze-note")
 async def analyze_note(note: ClinicalNote):
-    return await analyze_clinical_note(note.patient_id, note.note_text, note.note_date)
+    return fast_json.FastJSONResponse(await analyze_clinical_note(note.patient_id, note.note_text, note.note_date))
+
+@app.post("/analyze-note/stream")
+async def analyze_note_stream(note: ClinicalNote):
+    """Server-sent events: one event per entity as it is generated, then the full result."""
+    async def events():
+        async for event, data in stream_clinical_note_analysis(note.patient_id, note.note_text):
+            yield json_stream.sse_event(event, data)
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.post("/analyze-notes/batch")
+async def analyze_notes_batch(req: BatchNotesRequest):
+    """Streams one NDJSON line per note as each analysis completes."""
+    if len(req.notes) > note_batching.MAX_BATCH_NOTES:
+        raise HTTPException(status_code=413, detail=f"At most {note_batching.MAX_BATCH_NOTES} notes per batch")
+    async def ndjson():
+        async for item in analyze_clinical_notes_batch([note.dict() for note in req.notes]):
+            yield fast_json.dumps_line(item)
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
 
 @app.post("/scan-prescription")
 async def scan_prescription(file: UploadFile = File(...)):
-    return await extract_prescription_data(await file.read())
+    try:
+        return fast_json.FastJSONResponse(await extract_prescription_data(file))
+    except image_prep.UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except image_prep.UnsupportedImage as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Prescription scan timed out, try again shortly",
+                            headers={"Retry-After": "5"})
+    except llm_json.LLMJSONError as e:
+        raise HTTPException(status_code=502, detail=f"Could not read the prescription scan result: {e}")
+    except Exception as e:
+        print(f"Error in scan_prescription: {str(e)}")
+        raise HTTPException(status_code=502, detail=f"Failed to scan prescription: {str(e)}")
 
 @app.post("/check-interactions")
 async def check_interactions(req: MedicationsRequest):
-    return await check_drug_interactions(req.medications)
+    return fast_json.FastJSONResponse(await check_drug_interactions(req.medications))
 
 @app.post("/de-identify")
-async def de_identify(note: ClinicalNote):
+async def de_identify(note: ClinicalNote, review: Optional[bool] = None):
     from gemini_client import de_identify_note
-    return {"status": "success", "de_identified_text": await de_identify_note(note.note_text)}
+    result = await de_identify_note(note.note_text, deidentify.DEIDENTIFY_LLM_REVIEW if review is None else review)
+    return {"status": "success", "de_identified_text": result["text"], "redactions": result["redactions"],
+            "reviewed": result["reviewed"]}
+
+@app.post("/de-identify/stream")
+async def de_identify_stream(file: UploadFile = File(...)):
+    """De-identifies a plain-text upload of any size, streamed back line by line (local engine only)."""
+    return StreamingResponse(deidentify.get_engine().redact_file(file.file), media_type="text/plain; charset=utf-8")
 
 @app.post("/generate-coaching")
 async def generate_coaching(patient_context: Dict[str, Any]):
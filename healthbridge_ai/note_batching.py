@@ -0,0 +1,140 @@
+"""
+Batch analysis of many clinical notes.
+
+Short notes are packed several to a prompt while they fit the token budget;
+long notes get a prompt of their own. Prompts are fanned out with bounded
+concurrency and per-note results are yielded as soon as they complete, so a
+streaming (NDJSON) response never waits on the slowest note.
+
+Callers supply the model calls, which keeps this module independent of any
+particular prompt:
+
+  * ``analyze_single(text)`` returns one analysis dict and raises on failure
+  * ``analyze_packed([(index, text), ...])`` returns ``{index: analysis}``;
+    notes missing from its answer are retried through ``analyze_single``
+"""
+import asyncio
+import os
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+MAX_BATCH_NOTES = int(os.getenv("BATCH_MAX_NOTES", "1000"))
+# Input-token budget for one packed prompt and the size below which a note may be packed.
+PACK_TOKEN_BUDGET = int(os.getenv("BATCH_PACK_TOKEN_BUDGET", "4000"))
+SHORT_NOTE_TOKENS = int(os.getenv("BATCH_SHORT_NOTE_TOKENS", "600"))
+# Output tokens are the real limit on packing: each analysis is several hundred tokens.
+MAX_NOTES_PER_PACK = int(os.getenv("BATCH_MAX_NOTES_PER_PACK", "5"))
+
+PACKED_INSTRUCTIONS = """
+BATCH MODE:
+The notes below are independent and belong to different patients. Analyze each
+one separately; never carry findings from one note into another.
+Return ONLY a JSON array with one element per note, in this shape:
+[{"note_id": "<id from the NOTE header>", "analysis": <the JSON object described above>}]
+"""
+
+AnalyzeSingle = Callable[[str], Awaitable[Dict[str, Any]]]
+AnalyzePacked = Callable[[List[Tuple[int, str]]], Awaitable[Dict[int, Dict[str, Any]]]]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English clinical text)."""
+    return len(text) // 4 + 1
+
+
+def plan_groups(texts: Sequence[Tuple[int, str]], token_budget: int = PACK_TOKEN_BUDGET,
+                short_note_tokens: int = SHORT_NOTE_TOKENS,
+                max_per_pack: int = MAX_NOTES_PER_PACK) -> List[List[Tuple[int, str]]]:
+    """Greedily pack short notes into groups under the budget; long notes stay alone."""
+    groups: List[List[Tuple[int, str]]] = []
+    current: List[Tuple[int, str]] = []
+    current_tokens = 0
+    for index, text in texts:
+        tokens = estimate_tokens(text)
+        if tokens > short_note_tokens or max_per_pack <= 1:
+            groups.append([(index, text)])
+            continue
+        if current and (current_tokens + tokens > token_budget or len(current) >= max_per_pack):
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append((index, text))
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+def build_packed_prompt(system_prompt: str, items: Sequence[Tuple[int, str]]) -> str:
+    sections = [f"=== NOTE {index} ===\n{text}" for index, text in items]
+    return f"{system_prompt}\n{PACKED_INSTRUCTIONS}\nCLINICAL NOTES:\n" + "\n\n".join(sections)
+
+
+def split_packed_response(data: Any) -> Dict[int, Dict[str, Any]]:
+    """Map the model's ``[{"note_id", "analysis"}]`` answer back to note indexes."""
+    results: Dict[int, Dict[str, Any]] = {}
+    if not isinstance(data, list):
+        return results
+    for item in data:
+        if not isinstance(item, dict) or not isinstance(item.get("analysis"), dict):
+            continue
+        try:
+            results[int(str(item.get("note_id")).strip())] = item["analysis"]
+        except ValueError:
+            continue
+    return results
+
+
+async def stream_batch(texts: Sequence[str], analyze_single: AnalyzeSingle,
+                       analyze_packed: Optional[AnalyzePacked] = None,
+                       lookup: Optional[Callable[[str], Awaitable[Optional[Dict[str, Any]]]]] = None,
+                       max_concurrency: int = BATCH_MAX_CONCURRENCY) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield ``{"index", "status", "result"|"error"}`` for every note, in completion order.
+    ``lookup`` may return an already known (e.g. cached) analysis to skip the model.
+    """
+    pending: List[Tuple[int, str]] = []
+    for index, text in enumerate(texts):
+        hit = await lookup(text) if lookup else None
+        if hit is not None:
+            yield {"index": index, "status": "success", "cached": True, "result": hit}
+        else:
+            pending.append((index, text))
+    if not pending:
+        return
+
+    groups = plan_groups(pending) if analyze_packed else [[item] for item in pending]
+    semaphore = asyncio.Semaphore(max_concurrency)
+    queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+
+    async def run_single(index: int, text: str):
+        try:
+            result = await analyze_single(text)
+            await queue.put({"index": index, "status": "success", "result": result})
+        except Exception as e:
+            await queue.put({"index": index, "status": "error", "error": str(e)})
+
+    async def run_group(group: List[Tuple[int, str]]):
+        async with semaphore:
+            if len(group) == 1:
+                await run_single(*group[0])
+                return
+            try:
+                results = await analyze_packed(group)
+            except Exception as e:
+                print(f"Packed analysis failed, retrying notes individually: {e}")
+                results = {}
+            for index, text in group:
+                if index in results:
+                    await queue.put({"index": index, "status": "success", "packed": True, "result": results[index]})
+                else:
+                    await run_single(index, text)
+
+    tasks = [asyncio.ensure_future(run_group(group)) for group in groups]
+    try:
+        for _ in range(len(pending)):
+            yield await queue.get()
+    finally:
+        # The client may disconnect mid-stream; don't leave generations running.
+        for task in tasks:
+            if not task.done():
+                task.cancel()
@@ -0,0 +1,333 @@
+"""
+Section-aware chunking and parallel analysis of long clinical notes.
+
+A note too long for one analysis prompt (discharge summaries, long H&Ps) is
+split on its clinical section headers (HPI, Medications, Assessment/Plan,
+...) and the sections are packed in order into balanced chunks under a
+token budget. A section too long on its own is split at paragraph, then
+line, then sentence boundaries, so a negation ("denies chest pain") always
+stays in the same chunk as its finding. A chunk that starts mid-section
+repeats the section header and the line introducing a list that was cut
+("Patient denies the following:"), so list items keep their negation.
+
+Chunks are analyzed concurrently with a bounded fan-out and the per-chunk
+analyses are merged into one: an entity found in several sections is kept
+once, with the highest confidence and any fields the other mentions filled
+in. ``negated`` is part of an entity's identity, so "denies chest pain" in
+the ROS and "chest pain" in the HPI stay two findings.
+
+As in note_batching, callers supply the model call, which keeps this module
+independent of any particular prompt:
+
+  * ``analyze_chunk(text)`` returns one analysis dict and raises on failure
+"""
+import asyncio
+import copy
+import os
+import re
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Budget per chunk, in input tokens plus the expected output of its list items (see chunk_cost).
+CHUNK_TOKEN_BUDGET = int(os.getenv("NOTE_CHUNK_TOKEN_BUDGET", "3000"))
+# Output tokens the model writes per extracted entity; a list item is usually one entity.
+ENTITY_OUTPUT_TOKENS = 60
+# Notes up to this size (as chunk_cost) are analyzed in one prompt.
+CHUNK_MIN_NOTE_TOKENS = int(os.getenv("NOTE_CHUNK_MIN_NOTE_TOKENS", "3000"))
+CHUNK_MAX_CONCURRENCY = int(os.getenv("NOTE_CHUNK_MAX_CONCURRENCY", "8"))
+
+CHUNK_INSTRUCTIONS = """
+EXCERPT MODE:
+The note below is one excerpt of a longer clinical note, split at section
+boundaries; other sections are analyzed separately. Extract only what this
+excerpt states, keep negated findings ("denies", "no", "negative for") with
+negated set to true, and do not infer findings from sections that are not shown.
+"""
+
+AnalyzeChunk = Callable[[str], Awaitable[Dict[str, Any]]]
+
+_HEADER_NAMES = (
+    r"chief[ \t]+complaint|cc|history[ \t]+of[ \t]+(?:the[ \t]+)?present[ \t]+illness|hpi"
+    r"|past[ \t]+(?:medical|surgical)[ \t]+history|pmh|psh|family[ \t]+history|fh|social[ \t]+history|sh"
+    r"|review[ \t]+of[ \t]+systems|ros"
+    r"|(?:home|current|admission|discharge|outpatient)[ \t]+(?:medications|meds)"
+    r"|medications(?:[ \t]+on[ \t]+(?:admission|discharge))?|meds|allergies"
+    r"|physical[ \t]+exam(?:ination)?|exam|pe|vital[ \t]+signs|vitals"
+    r"|lab(?:oratory)?(?:s|[ \t]+(?:data|results))?|results|imaging|studies|procedures"
+    r"|(?:brief[ \t]+)?hospital[ \t]+course"
+    r"|assessment[ \t]*(?:and|&|/)[ \t]*plan|a[ \t]*(?:/|&)[ \t]*p|assessment|impression|plan"
+    r"|(?:admission|discharge|secondary|principal)?[ \t]*diagnos[ie]s|discharge[ \t]+(?:instructions|condition)"
+    r"|disposition|follow[ \t-]*up"
+)
+# A known section name alone on its line or followed by a colon, or any ALL-CAPS label with a colon.
+_HEADER_RE = re.compile(
+    rf"^[ \t]*(?:#+[ \t]*)?(?:(?i:(?P<name>{_HEADER_NAMES}))[ \t]*(?::|$)|(?P<caps>[A-Z][A-Z /&-]{{2,40}}):)",
+    re.MULTILINE,
+)
+_LIST_ITEM_RE = re.compile(r"^[ \t]*(?:[-*\u2022]|\d{1,3}[.)])[ \t]+\S", re.MULTILINE)
+_PARAGRAPH_RE = re.compile(r"\n[ \t]*\n")
+_SENTENCE_RE = re.compile(r"(?<=[.!?;])[ \t]+")
+_NORMALIZE_RE = re.compile(r"[^a-z0-9]+")
+
+# Field naming what an entity is, in order of preference, and fields that make two
+# mentions of it different findings (a negated mention, another dose or result).
+_IDENTITY_FIELDS = ("clinical_text", "drug_name", "allergen", "test_name", "finding", "name", "entity_type")
+_QUALIFIER_FIELDS = ("dosage", "result", "reason")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token, as in note_batching)."""
+    return len(text) // 4 + 1
+
+
+def chunk_cost(text: str) -> int:
+    """
+    Input tokens plus the output expected from list items. Generation time
+    follows output, and a 30-line medication list is a few hundred input
+    tokens but thirty entities to write out.
+    """
+    return estimate_tokens(text) + ENTITY_OUTPUT_TOKENS * len(_LIST_ITEM_RE.findall(text))
+
+
+def should_chunk(text: str, min_note_tokens: int = CHUNK_MIN_NOTE_TOKENS) -> bool:
+    return chunk_cost(text) > min_note_tokens
+
+
+def split_sections(text: str) -> List[Tuple[str, str]]:
+    """``(header, section text)`` in note order; text before the first header has header ""."""
+    sections: List[Tuple[str, str]] = []
+    starts = [(m.start(), (m.group("name") or m.group("caps")).strip()) for m in _HEADER_RE.finditer(text)]
+    if not starts or starts[0][0] > 0:
+        starts.insert(0, (0, ""))
+    for i, (start, header) in enumerate(starts):
+        end = starts[i + 1][0] if i + 1 < len(starts) else len(text)
+        if text[start:end].strip():
+            sections.append((header, text[start:end]))
+    return sections
+
+
+def _pack(pieces: Sequence[str], token_budget: int, joiner: str = "") -> List[str]:
+    """Greedily join consecutive pieces while they fit the budget."""
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for piece in pieces:
+        tokens = chunk_cost(piece)
+        if current and current_tokens + tokens > token_budget:
+            chunks.append(joiner.join(current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += tokens
+    if current:
+        chunks.append(joiner.join(current))
+    return chunks
+
+
+def _split_long(text: str, token_budget: int) -> List[str]:
+    """Split one over-long section at the coarsest boundary that brings its parts under the budget."""
+    for splitter, joiner in ((_PARAGRAPH_RE, "\n\n"), (re.compile(r"\n"), "\n"), (_SENTENCE_RE, " ")):
+        pieces = [p for p in splitter.split(text) if p.strip()]
+        if len(pieces) > 1:
+            parts: List[str] = []
+            for part in _pack(pieces, token_budget, joiner):
+                parts.extend(_split_long(part, token_budget) if chunk_cost(part) > token_budget else [part])
+            return parts
+    # One unbroken run-on sentence: cut at the last space under the budget.
+    limit = token_budget * 4
+    cut = text.rfind(" ", 0, limit)
+    cut = cut if cut > 0 else limit
+    return [text[:cut]] + _split_long(text[cut:].lstrip(), token_budget) if len(text) > limit else [text]
+
+
+def _lead_in(before: str) -> str:
+    """
+    The line ending in ':' that introduces the list or paragraph ``before``
+    ends inside ("Patient denies the following:"), or "" if a blank line or
+    the section header comes first.
+    """
+    lines = before.rstrip(" \t").split("\n")
+    if len(lines) > 1 and not lines[-1]:
+        lines.pop()
+    for line in reversed(lines):
+        line = line.strip()
+        if not line:
+            return ""
+        if line.endswith(":"):
+            return "" if _HEADER_RE.match(line) else line
+    return ""
+
+
+def chunk_note(text: str, token_budget: int = CHUNK_TOKEN_BUDGET) -> List[str]:
+    """
+    Split a note into chunks under ``token_budget``, cutting between sections
+    where possible. Chunks are balanced (the fewest that fit, of about equal
+    cost) because the slowest chunk sets the latency of the whole note.
+    """
+    sections = split_sections(text)
+    total = sum(chunk_cost(section) for _, section in sections)
+    target = min(token_budget, -(-total // max(1, -(-total // token_budget))))
+    # (header, lead-in, text, starts mid-section): a section over the target is cut into pieces
+    # of about a quarter of it, so chunks can be filled evenly.
+    pieces: List[Tuple[str, str, str, bool]] = []
+    for header, section in sections:
+        parts = [section] if chunk_cost(section) <= target else _split_long(section, max(1, target // 4))
+        position = 0
+        for i, part in enumerate(parts):
+            found = section.find(part, position)
+            position = found if found >= 0 else position
+            pieces.append((header, _lead_in(section[:position]) if i else "", part, i > 0))
+            position += len(part)
+
+    chunks: List[str] = []
+    current: List[str] = []
+    current_cost = 0
+    for header, lead_in, part, continued in pieces:
+        cost = chunk_cost(part)
+        if current and current_cost + cost > target:
+            chunks.append("".join(current))
+            current, current_cost = [], 0
+        if not current and continued:
+            # A chunk starting mid-section keeps its header, and the line introducing a list
+            # cut in two, so the model knows what it is reading ("Patient denies the following:").
+            context = ([f"{header} (continued):"] if header else []) + ([lead_in] if lead_in else [])
+            part = "\n".join(context + [part])
+        current.append(part if part.endswith("\n") else part + "\n")
+        current_cost += cost
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+def build_chunk_prompt(system_prompt: str, chunk: str) -> str:
+    return f"{system_prompt}\n{CHUNK_INSTRUCTIONS}\nCLINICAL NOTE EXCERPT:\n{chunk}"
+
+
+def _normalize(value: Any) -> str:
+    return _NORMALIZE_RE.sub(" ", str(value).lower()).strip() if value is not None else ""
+
+
+def _identity(item: Any) -> Tuple:
+    """What makes two list items the same finding."""
+    if not isinstance(item, dict):
+        return ("value", _normalize(item)) if isinstance(item, str) else ("value", repr(item))
+    if item.get("drug_a") and item.get("drug_b"):
+        return ("pair",) + tuple(sorted((_normalize(item["drug_a"]), _normalize(item["drug_b"]))))
+    for field in _IDENTITY_FIELDS:
+        if item.get(field):
+            qualifiers = tuple(_normalize(item.get(q)) for q in _QUALIFIER_FIELDS)
+            return (field, _normalize(item[field]), bool(item.get("negated"))) + qualifiers
+    return ("item", repr(sorted(item.items(), key=lambda kv: kv[0])))
+
+
+def _merge_value(base: Any, new: Any) -> Any:
+    """Combine two values for the same field: the first one that is set, the higher number, either flag."""
+    if base in (None, "", [], {}):
+        return copy.deepcopy(new)
+    if isinstance(base, dict) and isinstance(new, dict):
+        for key, value in new.items():
+            base[key] = _merge_value(base.get(key), value)
+        return base
+    if isinstance(base, list) and isinstance(new, list):
+        _merge_list(base, new, {_identity(item): item for item in base})
+        return base
+    if isinstance(base, bool) or isinstance(new, bool):
+        return bool(base) or bool(new)
+    if isinstance(base, (int, float)) and isinstance(new, (int, float)):
+        return max(base, new)
+    return base
+
+
+def _merge_list(base: List[Any], new: Sequence[Any], seen: Dict[Tuple, Any]) -> List[Any]:
+    """Append the items of ``new`` not already in ``base``; merge the rest into their match. Returns the added ones."""
+    added = []
+    for item in new:
+        key = _identity(item)
+        if key in seen:
+            if isinstance(seen[key], dict) and isinstance(item, dict):
+                _merge_value(seen[key], item)
+            continue
+        item = copy.deepcopy(item)
+        seen[key] = item
+        base.append(item)
+        added.append(item)
+    return added
+
+
+class MergedAnalysis(dict):
+    """A merged analysis; ``cacheable`` is False once any chunk analysis was not (see llm_cache)."""
+    cacheable = True
+
+
+class AnalysisMerger:
+    """Merge chunk analyses one at a time, reporting which entities are new."""
+
+    def __init__(self):
+        self.result: Dict[str, Any] = MergedAnalysis()
+        self._seen: Dict[int, Dict[Tuple, Any]] = {}
+
+    def add(self, analysis: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+        """Fold one analysis in; returns ``(section, entity)`` for extracted entities not seen before."""
+        if not getattr(analysis, "cacheable", True):
+            self.result.cacheable = False
+        added: List[Tuple[str, Dict[str, Any]]] = []
+        self._merge_dict(self.result, analysis, (), added)
+        return added
+
+    def _merge_dict(self, base: Dict[str, Any], new: Dict[str, Any], path: Tuple[str, ...], added: list) -> None:
+        for key, value in new.items():
+            if isinstance(value, dict) and isinstance(base.get(key), dict):
+                self._merge_dict(base[key], value, path + (key,), added)
+            elif isinstance(value, dict) and key not in base:
+                base[key] = {}
+                self._merge_dict(base[key], value, path + (key,), added)
+            elif isinstance(value, list) and isinstance(base.get(key, []), list):
+                items = base.setdefault(key, [])
+                seen = self._seen.setdefault(id(items), {_identity(item): item for item in items})
+                new_items = _merge_list(items, value, seen)
+                if path == ("extracted_entities",):
+                    added.extend((key, item) for item in new_items if isinstance(item, dict))
+            else:
+                base[key] = _merge_value(base.get(key), value)
+
+
+def merge_analyses(analyses: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """One analysis from the analyses of a note's chunks, in note order."""
+    merger = AnalysisMerger()
+    for analysis in analyses:
+        merger.add(analysis)
+    return merger.result
+
+
+async def iter_chunk_analyses(chunks: Sequence[str], analyze_chunk: AnalyzeChunk,
+                              max_concurrency: int = CHUNK_MAX_CONCURRENCY) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Yield ``(chunk index, analysis)`` in completion order, at most
+    ``max_concurrency`` chunks in flight. The first failure cancels the rest
+    and is raised: a merged analysis missing a section is not a result.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(index: int, chunk: str):
+        async with semaphore:
+            return index, await analyze_chunk(chunk)
+
+    tasks = [asyncio.ensure_future(run(index, chunk)) for index, chunk in enumerate(chunks)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def analyze_chunked(text: str, analyze_chunk: AnalyzeChunk, token_budget: int = CHUNK_TOKEN_BUDGET,
+                          max_concurrency: int = CHUNK_MAX_CONCURRENCY,
+                          chunks: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Chunk ``text``, analyze the chunks concurrently and merge the results in note order."""
+    chunks = chunks if chunks is not None else chunk_note(text, token_budget)
+    results: List[Optional[Dict[str, Any]]] = [None] * len(chunks)
+    async for index, analysis in iter_chunk_analyses(chunks, analyze_chunk, max_concurrency):
+        results[index] = analysis
+    merged = merge_analyses(results)
+    merged["chunk_count"] = len(chunks)
+    return merged
@@ -0,0 +1,266 @@
+"""
+Duplicate detection for prescription scans.
+
+Patients often upload the same prescription photo several times. Every
+scanned image is indexed with its OCR result under two keys:
+
+  * the SHA-256 of the uploaded bytes. A byte-identical re-upload (retry,
+    double submit) always reuses the stored result.
+  * a 256-bit perceptual hash (dHash from image_prep). A re-photographed
+    prescription lands within a few bits of the original.
+
+Perceptual reuse is opt-in (SCAN_DEDUPE_PERCEPTUAL). A whole-page perceptual
+hash cannot tell "Amoxicillin 500 mg" from "Amoxicillin 250 mg" on the same
+printed form; both hash within a bit of each other. A result reused this way
+is therefore marked ``requires_review``. While it is off, near-duplicates are
+still looked up and counted, so the potential saving shows in the stats.
+
+Perceptual lookups use multi-index hashing. The hash is split into
+max_distance + 1 chunks, and by the pigeonhole principle any hash within
+max_distance bits matches at least one chunk exactly. Only those bucket
+entries are compared bit by bit, so a lookup stays fast with hundreds of
+thousands of images. Everything persists in a SQLite table in
+``healthbridge.db``; the perceptual hashes are loaded into memory on first use.
+``lookup`` and ``store`` run the SQLite queries (and that first load) on a
+worker thread, so a scan never blocks the event loop.
+
+Stored results include the prescription transcription (PHI). Set
+SCAN_DEDUPE_ENCRYPTION_KEY (a Fernet key; defaults to LLM_CACHE_ENCRYPTION_KEY)
+to encrypt them at rest. Rows that cannot be decoded with the current setting
+are treated as misses.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+    CRYPTOGRAPHY_AVAILABLE = True
+    _DECODE_ERRORS = (ValueError, InvalidToken)
+except ImportError:
+    CRYPTOGRAPHY_AVAILABLE = False
+    _DECODE_ERRORS = (ValueError,)
+
+SCAN_DEDUPE_ENABLED = os.getenv("SCAN_DEDUPE_ENABLED", "true").lower() not in ("0", "false", "no")
+SCAN_DEDUPE_PERCEPTUAL = os.getenv("SCAN_DEDUPE_PERCEPTUAL", "false").lower() not in ("0", "false", "no")
+SCAN_DEDUPE_DB_PATH = os.getenv("SCAN_DEDUPE_DB_PATH", "./healthbridge.db")
+SCAN_DEDUPE_MAX_DISTANCE = int(os.getenv("SCAN_DEDUPE_MAX_DISTANCE", "8"))
+SCAN_DEDUPE_ENCRYPTION_KEY = os.getenv("SCAN_DEDUPE_ENCRYPTION_KEY", os.getenv("LLM_CACHE_ENCRYPTION_KEY", ""))
+HASH_BITS = 256
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class HammingIndex:
+    """In-memory multi-index over fixed-width hashes for radius-``max_distance`` search."""
+
+    def __init__(self, bits: int = HASH_BITS, max_distance: int = SCAN_DEDUPE_MAX_DISTANCE):
+        self.bits = bits
+        self.max_distance = max_distance
+        chunks = max_distance + 1
+        base, extra = divmod(bits, chunks)
+        self._spans: List[Tuple[int, int]] = []
+        shift = 0
+        for i in range(chunks):
+            width = base + (1 if i < extra else 0)
+            self._spans.append((shift, (1 << width) - 1))
+            shift += width
+        self._tables: List[Dict[int, List[int]]] = [defaultdict(list) for _ in self._spans]
+        self._hashes: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def add(self, value: int) -> None:
+        if value in self._hashes:
+            return
+        self._hashes.add(value)
+        for table, (shift, mask) in zip(self._tables, self._spans):
+            table[(value >> shift) & mask].append(value)
+
+    def nearest(self, value: int) -> Optional[Tuple[int, int]]:
+        """``(distance, hash)`` of the closest indexed hash within max_distance, or None."""
+        if value in self._hashes:
+            return 0, value
+        best: Optional[Tuple[int, int]] = None
+        seen: Set[int] = set()
+        for table, (shift, mask) in zip(self._tables, self._spans):
+            for candidate in table.get((value >> shift) & mask, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                distance = hamming(value, candidate)
+                if distance <= self.max_distance and (best is None or distance < best[0]):
+                    best = (distance, candidate)
+        return best
+
+
+class ScanIndex:
+    """Content- and perceptual-hash index of OCR results, persisted to SQLite."""
+
+    def __init__(self, db_path: str = SCAN_DEDUPE_DB_PATH, max_distance: int = SCAN_DEDUPE_MAX_DISTANCE,
+                 perceptual: bool = SCAN_DEDUPE_PERCEPTUAL, encryption_key: str = SCAN_DEDUPE_ENCRYPTION_KEY):
+        self.db_path = db_path
+        self.max_distance = max_distance
+        self.perceptual = perceptual
+        self._index: Optional[HammingIndex] = None
+        self._index_version: Optional[str] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._fernet = None
+        if encryption_key:
+            if not CRYPTOGRAPHY_AVAILABLE:
+                raise RuntimeError("SCAN_DEDUPE_ENCRYPTION_KEY is set but the cryptography package is not installed")
+            self._fernet = Fernet(encryption_key.encode("ascii"))
+        self.stats = {"exact_hits": 0, "perceptual_hits": 0, "near_duplicates_seen": 0, "misses": 0, "stores": 0,
+                      "unreadable": 0}
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS prescription_scans ("
+                " content_sha TEXT NOT NULL,"
+                " version TEXT NOT NULL,"
+                " phash TEXT,"
+                " result TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " PRIMARY KEY (version, content_sha))"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_prescription_scans_phash ON prescription_scans (version, phash)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _encode(self, result: Dict[str, Any]) -> str:
+        encoded = json.dumps(result)
+        return self._fernet.encrypt(encoded.encode("utf-8")).decode("ascii") if self._fernet else encoded
+
+    def _decode(self, stored: str) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(self._fernet.decrypt(stored.encode("ascii")).decode("utf-8") if self._fernet else stored)
+        except _DECODE_ERRORS as e:
+            # Written under another encryption setting or key: treat it as a miss.
+            print(f"Stored scan result unreadable, ignoring it: {e}")
+            self.stats["unreadable"] += 1
+            return None
+
+    def _loaded(self, version: str) -> HammingIndex:
+        # One prompt version is live per process; a version change starts a fresh index.
+        if self._index is None or self._index_version != version:
+            index = HammingIndex(HASH_BITS, self.max_distance)
+            for (hex_hash,) in self._db().execute(
+                "SELECT DISTINCT phash FROM prescription_scans WHERE version = ? AND phash IS NOT NULL", (version,)
+            ):
+                index.add(int(hex_hash, 16))
+            self._index, self._index_version = index, version
+        return self._index
+
+    def find(self, content_sha: str, phash: Optional[int], version: str) -> Optional[Tuple[Dict[str, Any], Optional[int]]]:
+        """
+        Stored result of a duplicate scan and its perceptual-hash distance
+        (None for a byte-identical upload), or None.
+        """
+        with self._lock:
+            row = self._db().execute(
+                "SELECT result FROM prescription_scans WHERE version = ? AND content_sha = ?",
+                (version, content_sha),
+            ).fetchone()
+            result = self._decode(row[0]) if row is not None else None
+            if result is not None:
+                self.stats["exact_hits"] += 1
+                return result, None
+
+            match = self._loaded(version).nearest(phash) if phash is not None else None
+            if match is None:
+                self.stats["misses"] += 1
+                return None
+            if not self.perceptual:
+                self.stats["near_duplicates_seen"] += 1
+                self.stats["misses"] += 1
+                return None
+            distance, stored_hash = match
+            row = self._db().execute(
+                "SELECT result FROM prescription_scans WHERE version = ? AND phash = ?"
+                " ORDER BY created_at DESC LIMIT 1",
+                (version, format(stored_hash, "x")),
+            ).fetchone()
+            result = self._decode(row[0]) if row is not None else None
+            if result is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["perceptual_hits"] += 1
+            return result, distance
+
+    def add(self, content_sha: str, phash: Optional[int], version: str, result: Dict[str, Any]) -> None:
+        with self._lock:
+            self._db().execute(
+                "INSERT OR REPLACE INTO prescription_scans (content_sha, version, phash, result, created_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (content_sha, version, format(phash, "x") if phash is not None else None,
+                 self._encode(result), time.time()),
+            )
+            self._db().commit()
+            if phash is not None:
+                self._loaded(version).add(phash)
+            self.stats["stores"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        hits = stats["exact_hits"] + stats["perceptual_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+        stats["indexed"] = len(self._index) if self._index is not None else 0
+        stats["max_distance"] = self.max_distance
+        stats["perceptual"] = self.perceptual
+        stats["enabled"] = SCAN_DEDUPE_ENABLED
+        stats["encrypted"] = self._fernet is not None
+        return stats
+
+
+_default_index: Optional[ScanIndex] = None
+
+
+def get_index() -> ScanIndex:
+    global _default_index
+    if _default_index is None:
+        _default_index = ScanIndex()
+    return _default_index
+
+
+async def lookup(info: Dict[str, Any], version: str) -> Optional[Dict[str, Any]]:
+    """
+    OCR result of an earlier scan of the same image, marked ``cached``.
+    ``info`` is the dict returned by image_prep.prepare_image.
+    """
+    if not SCAN_DEDUPE_ENABLED:
+        return None
+    found = await asyncio.get_running_loop().run_in_executor(
+        None, get_index().find, info["sha256"], info.get("dhash"), version)
+    if found is None:
+        return None
+    result, distance = found
+    result["cached"] = True
+    if distance is not None:
+        # Matched on appearance only; a changed dose can look identical.
+        result["requires_review"] = True
+        result["hash_distance"] = distance
+    return result
+
+
+async def store(info: Dict[str, Any], version: str, result: Dict[str, Any]) -> None:
+    if SCAN_DEDUPE_ENABLED:
+        await asyncio.get_running_loop().run_in_executor(
+            None, get_index().add, info["sha256"], info.get("dhash"), version, result)
+
+
+def get_stats() -> Dict[str, Any]:
+    return get_index().get_stats()
@@ -0,0 +1,503 @@
+"""
+Local terminology index for ICD-10-CM, RxNorm and SNOMED CT codes.
+
+Codes in LLM output are whatever the model produced. This index lets callers
+``canonicalize`` them (``e119`` -> ``E11.9``), confirm they exist with
+``lookup``, ``resolve`` a concept from its exact display name or synonym
+to fill in a missing or malformed code, and ``search`` concepts by prefix
+for autocomplete.
+
+Concepts are compiled into one file that is memory-mapped rather than
+parsed, so opening even a full release costs a header read. Per system the
+file holds:
+
+  * concepts sorted by code, so a code lookup is a binary search;
+  * every word-start suffix of every display name and synonym, normalized
+    and sorted ("type 2 diabetes", "2 diabetes", "diabetes"). All terms that
+    share a prefix form one contiguous run, so this array is a flattened
+    prefix trie; a first-byte table (the trie's root level) narrows each
+    search before bisecting.
+
+Sources are CSV (header row) with ``system,code,display,synonyms`` columns,
+synonyms separated by ``|`` and system one of icd10, rxnorm, snomed.
+load_index() recompiles TERMINOLOGY_INDEX_PATH whenever the sources change;
+to compile a large release ahead of time:
+
+    python -m healthbridge_ai.terminology build release.csv [more.csv ...] [-o terminology.idx]
+"""
+import argparse
+import csv
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import time
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+TERMINOLOGY_SOURCES = [p for p in os.getenv(
+    "TERMINOLOGY_SOURCES", os.path.join(DATA_DIR, "terminology_concepts.csv")).split(os.pathsep) if p]
+TERMINOLOGY_INDEX_PATH = os.getenv("TERMINOLOGY_INDEX_PATH", "./terminology.idx")
+TERMINOLOGY_SEARCH_LIMIT = int(os.getenv("TERMINOLOGY_SEARCH_LIMIT", "50"))
+
+SYSTEMS = {
+    "icd10": "http://hl7.org/fhir/sid/icd-10-cm",
+    "rxnorm": "http://www.nlm.nih.gov/research/umls/rxnorm",
+    "snomed": "http://snomed.info/sct",
+}
+# Word-start suffixes are indexed for the first few words of each name only.
+MAX_SUFFIX_WORDS = 8
+
+_MAGIC = b"HBTERM01"
+_FULL_NAME = 1
+_NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+_ICD10_RE = re.compile(r"^[A-Z][0-9][0-9A-Z][0-9A-Z]{0,4}$")
+_RXCUI_RE = re.compile(r"^(?:RXCUI:?)?0*([1-9][0-9]{0,8})$")
+_SNOMED_RE = re.compile(r"^[1-9][0-9]{5,17}$")
+
+# Verhoeff check digit tables (SNOMED CT identifiers end in one).
+_VERHOEFF_D = [
+    [0, 1, 2, 3, 4, 5, 6, 7, 8, 9], [1, 2, 3, 4, 0, 6, 7, 8, 9, 5], [2, 3, 4, 0, 1, 7, 8, 9, 5, 6],
+    [3, 4, 0, 1, 2, 8, 9, 5, 6, 7], [4, 0, 1, 2, 3, 9, 5, 6, 7, 8], [5, 9, 8, 7, 6, 0, 4, 3, 2, 1],
+    [6, 5, 9, 8, 7, 1, 0, 4, 3, 2], [7, 6, 5, 9, 8, 2, 1, 0, 4, 3], [8, 7, 6, 5, 9, 3, 2, 1, 0, 4],
+    [9, 8, 7, 6, 5, 4, 3, 2, 1, 0],
+]
+_VERHOEFF_P = [
+    [0, 1, 2, 3, 4, 5, 6, 7, 8, 9], [1, 5, 7, 6, 2, 8, 3, 0, 9, 4], [5, 8, 0, 3, 7, 9, 6, 1, 4, 2],
+    [8, 9, 1, 6, 0, 4, 3, 5, 2, 7], [9, 4, 5, 3, 1, 2, 6, 8, 7, 0], [4, 2, 8, 6, 5, 7, 3, 9, 0, 1],
+    [2, 7, 9, 3, 8, 0, 6, 4, 1, 5], [7, 0, 4, 6, 9, 1, 3, 2, 5, 8],
+]
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, punctuation to single spaces: "Alzheimer's Disease" -> 'alzheimer s disease'."""
+    return " ".join(_NON_WORD_RE.sub(" ", text.lower()).split())
+
+
+def _verhoeff_valid(digits: str) -> bool:
+    check = 0
+    for i, digit in enumerate(reversed(digits)):
+        check = _VERHOEFF_D[check][_VERHOEFF_P[i % 8][int(digit)]]
+    return check == 0
+
+
+def canonicalize(system: str, code: Optional[str]) -> Optional[str]:
+    """Canonical form of ``code`` in ``system``, or None if it is not a well-formed code."""
+    if not code:
+        return None
+    code = str(code).strip().upper()
+    if system == "icd10":
+        code = code.replace(".", "").replace(" ", "")
+        if not _ICD10_RE.match(code):
+            return None
+        return code if len(code) == 3 else f"{code[:3]}.{code[3:]}"
+    if system == "rxnorm":
+        match = _RXCUI_RE.match(code.replace(" ", ""))
+        return match.group(1) if match else None
+    if system == "snomed":
+        return code if _SNOMED_RE.match(code) and _verhoeff_valid(code) else None
+    raise ValueError(f"Unknown terminology system {system!r}")
+
+
+def _suffixes(name: str) -> Iterator[Tuple[str, int]]:
+    words = normalize_text(name).split()
+    for start in range(min(len(words), MAX_SUFFIX_WORDS)):
+        yield " ".join(words[start:]), _FULL_NAME if start == 0 else 0
+
+
+def read_concepts(paths: Iterable[str]) -> Iterator[Tuple[str, str, str, List[str]]]:
+    """(system, canonical code, display, synonyms) from CSV sources; malformed codes are skipped."""
+    for path in paths:
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                system = row["system"].strip().lower()
+                code = canonicalize(system, row["code"])
+                if code is None:
+                    continue
+                synonyms = [s.strip() for s in (row.get("synonyms") or "").split("|") if s.strip()]
+                yield system, code, row["display"].strip(), synonyms
+
+
+def compile_index(concepts: Iterable[Tuple[str, str, str, List[str]]], sources: Sequence[Dict[str, Any]] = ()) -> bytes:
+    """Serialize concepts into the memory-mappable index format."""
+    per_system: Dict[str, Dict[str, Tuple[str, List[str]]]] = {system: {} for system in SYSTEMS}
+    for system, code, display, synonyms in concepts:
+        entry = per_system[system].get(code)
+        if entry is None:
+            per_system[system][code] = (display, list(synonyms))
+        else:
+            entry[1].extend(synonyms)
+
+    blob = bytearray()
+    interned: Dict[bytes, int] = {}
+
+    def intern(value: bytes) -> Tuple[int, int]:
+        offset = interned.get(value)
+        if offset is None:
+            offset = interned[value] = len(blob)
+            blob.extend(value)
+        return offset, len(value)
+
+    concept_table, term_table, root = array("I"), array("I"), array("I")
+    ranges: Dict[str, Dict[str, List[int]]] = {}
+    for system, by_code in per_system.items():
+        first_concept, first_term = len(concept_table) // 4, len(term_table) // 4
+        terms: List[Tuple[bytes, int, int]] = []
+        for index, code in enumerate(sorted(by_code, key=lambda c: c.encode("utf-8"))):
+            display, synonyms = by_code[code]
+            concept = first_concept + index
+            concept_table.extend(intern(code.encode("utf-8")) + intern(display.encode("utf-8")))
+            seen = set()
+            for name in [display] + synonyms:
+                for term, flags in _suffixes(name):
+                    if term and (term, flags) not in seen:
+                        seen.add((term, flags))
+                        terms.append((term.encode("utf-8"), -flags, concept))
+            compact = code.replace(".", "").lower().encode("utf-8")
+            terms.append((compact, 0, concept))
+        terms.sort()
+        for term, flags, concept in terms:
+            term_table.extend(intern(term) + (concept, -flags))
+        last_term = len(term_table) // 4
+        # root[b] is the first term whose first byte is >= b; root[256] is the end.
+        position = 0
+        for byte in range(257):
+            while position < len(terms) and terms[position][0][0] < byte:
+                position += 1
+            root.append(first_term + position)
+        root[-1] = last_term
+        ranges[system] = {"concepts": [first_concept, len(concept_table) // 4], "terms": [first_term, last_term]}
+
+    sections = [("concepts", concept_table.tobytes()), ("terms", term_table.tobytes()),
+                ("root", root.tobytes()), ("strings", bytes(blob))]
+    header: Dict[str, Any] = {"byteorder": sys.byteorder, "systems": list(SYSTEMS), "ranges": ranges,
+                              "sources": list(sources), "sections": {}}
+    # Section offsets depend on the header length, which depends on the offsets: iterate to a fixed point.
+    length = 0
+    while True:
+        offset = _align(len(_MAGIC) + 4 + length)
+        for name, data in sections:
+            header["sections"][name] = [offset, len(data)]
+            offset = _align(offset + len(data))
+        encoded = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        if len(encoded) == length:
+            break
+        length = len(encoded)
+    out = bytearray(_MAGIC + struct.pack("<I", length) + encoded)
+    for name, data in sections:
+        out.extend(b"\0" * (header["sections"][name][0] - len(out)))
+        out.extend(data)
+    return bytes(out)
+
+
+def _align(offset: int) -> int:
+    return (offset + 3) & ~3
+
+
+class TerminologyIndex:
+    """Read-only view over a compiled index held in a buffer (usually a memory map)."""
+
+    def __init__(self, buffer, source: str = "<memory>"):
+        view = memoryview(buffer)
+        if bytes(view[:len(_MAGIC)]) != _MAGIC:
+            raise ValueError(f"{source} is not a terminology index")
+        (length,) = struct.unpack_from("<I", view, len(_MAGIC))
+        start = len(_MAGIC) + 4
+        self.header = json.loads(bytes(view[start:start + length]))
+        if self.header["byteorder"] != sys.byteorder:
+            raise ValueError(f"{source} was compiled on a {self.header['byteorder']}-endian machine")
+        self.source = source
+        self._buffer = buffer
+        self._view = view
+
+        def section(name):
+            offset, size = self.header["sections"][name]
+            return view[offset:offset + size]
+
+        self._concepts = section("concepts").cast("I")
+        self._terms = section("terms").cast("I")
+        self._root = section("root").cast("I")
+        self._strings = section("strings")
+        self._ranges = self.header["ranges"]
+        self._system_order = {system: i for i, system in enumerate(self.header["systems"])}
+
+    def close(self) -> None:
+        for view in (self._concepts, self._terms, self._root, self._strings, self._view):
+            view.release()
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+
+    def _string(self, offset: int, length: int) -> bytes:
+        return bytes(self._strings[offset:offset + length])
+
+    def _term(self, index: int) -> bytes:
+        base = index * 4
+        return self._string(self._terms[base], self._terms[base + 1])
+
+    def _concept(self, system: str, index: int) -> Dict[str, str]:
+        base = index * 4
+        concepts = self._concepts
+        return {
+            "system": system,
+            "code": self._string(concepts[base], concepts[base + 1]).decode("utf-8"),
+            "display": self._string(concepts[base + 2], concepts[base + 3]).decode("utf-8"),
+        }
+
+    def _term_range(self, system: str, prefix: bytes) -> Tuple[int, int]:
+        """[lo, hi) of the terms in ``system`` that start with ``prefix``."""
+        if prefix:
+            base = self._system_order[system] * 257
+            lo, end = self._root[base + prefix[0]], self._root[base + prefix[0] + 1]
+        else:
+            lo, end = self._ranges[system]["terms"]
+        hi = end
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term(mid) < prefix:
+                lo = mid + 1
+            else:
+                hi = mid
+        first, hi = lo, end
+        # Normalized terms are ASCII, so every extension of prefix sorts below prefix + 0xff.
+        upper = prefix + b"\xff"
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term(mid) < upper:
+                lo = mid + 1
+            else:
+                hi = mid
+        return first, lo
+
+    def lookup(self, system: str, code: Optional[str]) -> Optional[Dict[str, str]]:
+        """The concept for ``code`` (any formatting canonicalize accepts), or None."""
+        code = canonicalize(system, code)
+        if code is None:
+            return None
+        target = code.encode("utf-8")
+        lo, hi = self._ranges[system]["concepts"]
+        concepts = self._concepts
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._string(concepts[mid * 4], concepts[mid * 4 + 1]) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        end = self._ranges[system]["concepts"][1]
+        if lo < end and self._string(concepts[lo * 4], concepts[lo * 4 + 1]) == target:
+            return self._concept(system, lo)
+        return None
+
+    def _exact(self, system: str, text: str) -> Optional[Dict[str, str]]:
+        key = text.encode("utf-8")
+        lo, hi = self._term_range(system, key)
+        for index in range(lo, hi):
+            if self._terms[index * 4 + 3] & _FULL_NAME and self._term(index) == key:
+                return self._concept(system, self._terms[index * 4 + 2])
+        return None
+
+    def resolve(self, system: str, text: Optional[str]) -> Optional[Dict[str, str]]:
+        """
+        Concept whose display name or synonym is exactly ``text`` (after
+        normalization), or None. A sub-phrase is never enough: "old myocardial
+        infarction" must not resolve to "myocardial infarction".
+        """
+        normalized = normalize_text(text or "")
+        if not normalized:
+            return None
+        return self._exact(system, normalized)
+
+    def search(self, query: str, system: Optional[str] = None, limit: int = 10) -> List[Dict[str, str]]:
+        """
+        Concepts with a name, synonym, word-start within one, or code
+        beginning with ``query``. Shorter completions come first.
+        """
+        normalized = normalize_text(query)
+        if not normalized:
+            return []
+        keys = {normalized.encode("utf-8")}
+        if " " not in query.strip():
+            # Codes are indexed without punctuation: "E11.9" and "e119" both match E11.9.
+            keys.add(normalized.replace(" ", "").encode("utf-8"))
+        systems = [system] if system else list(self._ranges)
+        candidates = []
+        for name in systems:
+            seen = set()
+            for key in keys:
+                lo, hi = self._term_range(name, key)
+                for index in range(lo, min(hi, lo + limit * 20)):
+                    concept = self._terms[index * 4 + 2]
+                    if concept not in seen:
+                        seen.add(concept)
+                        candidates.append((self._term(index), name, concept))
+                    if len(seen) >= limit:
+                        break
+        candidates.sort()
+        results, seen = [], set()
+        for term, name, concept in candidates:
+            if (name, concept) in seen:
+                continue
+            seen.add((name, concept))
+            results.append(dict(self._concept(name, concept), matched=term.decode("utf-8")))
+            if len(results) == limit:
+                break
+        return results
+
+    def check(self, system: str, code: Optional[str], display: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Validate a (code, display) pair from model output. ``status`` is
+        ``verified`` (code is in the index), ``filled`` (no code; display is a
+        known name), ``corrected`` (code malformed; replaced by the concept
+        the display names), ``unverified`` (well-formed but not in the index,
+        kept as given, since the index may be a subset of the release),
+        ``invalid`` (malformed, display not a known name; code None) or
+        ``missing`` (no code and display not a known name).
+        """
+        canonical = canonicalize(system, code)
+        if canonical:
+            concept = self.lookup(system, canonical)
+            if concept:
+                return dict(concept, status="verified")
+            return {"system": system, "code": canonical, "display": display, "status": "unverified"}
+        by_display = self.resolve(system, display)
+        if by_display:
+            return dict(by_display, status="filled" if not code else "corrected")
+        return {"system": system, "code": None, "display": display,
+                "status": "invalid" if code else "missing"}
+
+    def concept_count(self, system: Optional[str] = None) -> int:
+        systems = [system] if system else list(self._ranges)
+        return sum(self._ranges[s]["concepts"][1] - self._ranges[s]["concepts"][0] for s in systems)
+
+    @property
+    def term_count(self) -> int:
+        return len(self._terms) // 4
+
+
+def _source_stamps(paths: Sequence[str]) -> List[Dict[str, Any]]:
+    stamps = []
+    for path in paths:
+        stat = os.stat(path)
+        stamps.append({"path": os.path.abspath(path), "mtime": stat.st_mtime, "size": stat.st_size})
+    return stamps
+
+
+def build(sources: Sequence[str] = tuple(TERMINOLOGY_SOURCES), output: str = TERMINOLOGY_INDEX_PATH) -> bytes:
+    """Compile ``sources`` and write the index to ``output`` atomically (best effort); returns the bytes."""
+    data = compile_index(read_concepts(sources), _source_stamps(sources))
+    tmp_path = f"{output}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, output)
+    except OSError as e:
+        print(f"Terminology index not cached at {output}: {e}")
+    return data
+
+
+def open_index(path: str) -> TerminologyIndex:
+    with open(path, "rb") as f:
+        return TerminologyIndex(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), path)
+
+
+_stats: Dict[str, Any] = {"load_seconds": None, "compiled": False, "index_path": None}
+
+
+def load_index(sources: Sequence[str] = tuple(TERMINOLOGY_SOURCES), path: str = TERMINOLOGY_INDEX_PATH) -> TerminologyIndex:
+    """Map the compiled index at ``path``, recompiling it first if it is missing or its sources changed."""
+    started = time.perf_counter()
+    index = None
+    if os.path.exists(path):
+        try:
+            index = open_index(path)
+            if sources and index.header.get("sources") != _source_stamps(sources):
+                index.close()
+                index = None
+        except (OSError, ValueError) as e:
+            print(f"Rebuilding terminology index {path}: {e}")
+            index = None
+    compiled = index is None
+    if compiled:
+        data = build(sources, path)
+        try:
+            index = open_index(path)
+        except (OSError, ValueError):
+            index = TerminologyIndex(data)
+    _stats.update(load_seconds=round(time.perf_counter() - started, 4), compiled=compiled, index_path=index.source)
+    return index
+
+
+_default_index: Optional[TerminologyIndex] = None
+
+
+def get_index() -> TerminologyIndex:
+    global _default_index
+    if _default_index is None:
+        _default_index = load_index()
+    return _default_index
+
+
+def search(query: str, system: Optional[str] = None, limit: int = 10) -> List[Dict[str, str]]:
+    return get_index().search(query, system, limit)
+
+
+def check(system: str, code: Optional[str], display: Optional[str] = None) -> Dict[str, Any]:
+    return get_index().check(system, code, display)
+
+
+# Code fields of the clinical analysis schema (see llm_json) and their systems.
+ANALYSIS_CODE_FIELDS = {
+    "conditions": (("icd_10", "icd10", "clinical_text"), ("snomed_ct", "snomed", "clinical_text")),
+    "medications": (("rxnorm_code", "rxnorm", "drug_name"),),
+}
+
+
+def annotate_analysis(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Canonicalize, verify and fill the codes of every extracted condition and
+    medication in place. Each entity gets ``code_status`` with the check()
+    status per code field; codes the index cannot vouch for are kept as-is.
+    """
+    index = get_index()
+    entities = result.get("extracted_entities") or {}
+    for group, fields in ANALYSIS_CODE_FIELDS.items():
+        for entity in entities.get(group) or []:
+            if not isinstance(entity, dict):
+                continue
+            statuses = {}
+            for field, system, text_field in fields:
+                checked = index.check(system, entity.get(field), entity.get(text_field))
+                statuses[field] = checked["status"]
+                if checked["code"]:
+                    entity[field] = checked["code"]
+            entity["code_status"] = statuses
+    return result
+
+
+def get_stats() -> Dict[str, Any]:
+    stats = dict(_stats)
+    if _default_index is not None:
+        stats.update({system: _default_index.concept_count(system) for system in SYSTEMS})
+        stats["terms"] = _default_index.term_count
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m healthbridge_ai.terminology")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="compile CSV sources into an index file")
+    build_parser.add_argument("sources", nargs="*", default=TERMINOLOGY_SOURCES)
+    build_parser.add_argument("-o", "--output", default=TERMINOLOGY_INDEX_PATH)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    build(args.sources, args.output)
+    index = open_index(args.output)
+    print(f"{args.output}: {index.concept_count()} concepts, {index.term_count} terms, "
+          f"{os.path.getsize(args.output) / 1e6:.1f} MB in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Prescription OCR using Gemini's vision input.
+Uploads are pre-processed by image_prep before they are sent to the model,
+and repeat scans of the same image are answered from scan_dedupe.
+"""
+import os
+import time
+from typing import Any, Dict
+
+import image_prep
+import llm_cache
+import llm_gateway
+import llm_json
+import scan_dedupe
+from gemini_client import GEMINI_AVAILABLE, GEMINI_MODEL
+
+# Bump whenever OCR_PROMPT changes so stored scan results are not reused.
+OCR_PROMPT_VERSION = "ocr-v1"
+
+OCR_PROMPT = """
+Analyze this prescription image.
+1. Extract all medications with their dosage, frequency, and duration.
+2. Provide a raw transcription of the relevant text.
+
+Return the result in valid JSON format:
+{
+    "medications": [
+        {"name": "...", "dosage": "...", "frequency": "...", "duration": "..."}
+    ],
+    "raw_text": "..."
+}
+"""
+
+
+async def extract_prescription_data(upload) -> Dict[str, Any]:
+    """
+    Extract medications from an uploaded prescription image.
+    Raises image_prep.UploadTooLarge or image_prep.UnsupportedImage for bad
+    uploads, asyncio.TimeoutError when the model call times out, and
+    llm_json.LLMJSONError when its output cannot be parsed.
+    """
+    started = time.perf_counter()
+    data, mime_type, info = await image_prep.prepare_upload(upload)
+
+    if not (GEMINI_AVAILABLE and os.getenv("GOOGLE_API_KEY")):
+        return get_mock_prescription()
+
+    dedupe_version = f"{OCR_PROMPT_VERSION}:{GEMINI_MODEL}"
+    duplicate = await scan_dedupe.lookup(info, dedupe_version)
+    if duplicate is not None:
+        return duplicate
+
+    text = await llm_gateway.generate_text(GEMINI_MODEL, [OCR_PROMPT, {"mime_type": mime_type, "data": data}])
+    result = llm_json.parse_llm_json(text, "ocr")
+    # Truncated or repaired output is returned once but never replayed to re-uploads
+    if llm_cache.cacheable(result):
+        await scan_dedupe.store(info, dedupe_version, result)
+    print(f"OCR scan: {info['original_bytes']} -> {info['processed_bytes']} bytes, "
+          f"prep {info['prep_seconds']:.3f}s, total {time.perf_counter() - started:.2f}s")
+    return result
+
+
+def get_mock_prescription() -> Dict[str, Any]:
+    return {
+        "medications": [
+            {"name": "Amoxicillin", "dosage": "500mg", "frequency": "Every 8 hours", "duration": "7 days"},
+            {"name": "Ibuprofen", "dosage": "400mg", "frequency": "As needed", "duration": "5 days"}
+        ],
+        "raw_text": "DEMO MODE: Amoxicillin 500mg - 1 tab TID x 7d. Ibuprofen 400mg PRN pain."
+    }
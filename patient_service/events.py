@@ -1,14 +1,22 @@
-import json
+import event_bus
 
-def publish_adherence_event(user_id: str, event_data: dict):
-    """Publishes adherence event to mock Pub/Sub."""
-    message = {
-        "event_type": "medication.adherence",
+ADHERENCE_TOPIC = "medication.adherence"
+
+
+def _adherence_message(user_id: str, event_data: dict) -> dict:
+    return {
+        "event_type": ADHERENCE_TOPIC,
         "user_id": user_id,
         "data": event_data,
         "timestamp": event_data.get("timestamp")
     }
-    
-    # Simulation
-    print(f"[Pub/Sub] Published adherence event: {json.dumps(message)}")
-    return "msg_id_adherence_123"
+
+
+def publish_adherence_event(user_id: str, event_data: dict):
+    """Publishes an adherence event to the local event log; returns the event id."""
+    return event_bus.publish(ADHERENCE_TOPIC, _adherence_message(user_id, event_data))
+
+
+async def publish_adherence_event_async(user_id: str, event_data: dict):
+    """publish_adherence_event for request handlers; waits for queue space off the event loop."""
+    return await event_bus.publish_async(ADHERENCE_TOPIC, _adherence_message(user_id, event_data))
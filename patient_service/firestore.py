@@ -1,29 +1,50 @@
 import uuid
 from datetime import datetime
+from typing import Optional
 
-# Mock database for MVP
-_MOCK_DB = {}
+from patient_store import ADHERENCE_MAX_WINDOW_DAYS, GRANULARITIES, PatientStore
+
+# Local stand-in for Firestore: an indexed in-memory store, snapshotted to disk (see patient_store)
+_STORE = PatientStore()
+
+def start():
+    """Load the last snapshot and start periodic snapshots."""
+    _STORE.start()
+
+def stop():
+    """Write a final snapshot."""
+    _STORE.stop()
 
 def add_medication(user_id: str, data: dict) -> dict:
     med_id = str(uuid.uuid4())
     data["id"] = med_id
     data["created_at"] = datetime.now().isoformat()
     
-    if user_id not in _MOCK_DB:
-        _MOCK_DB[user_id] = {"medications": [], "adherence": []}
-    
-    _MOCK_DB[user_id]["medications"].append(data)
+    _STORE.add_medication(user_id, data)
     return data
 
 def get_medications(user_id: str) -> list:
-    return _MOCK_DB.get(user_id, {}).get("medications", [])
+    return _STORE.get_medications(user_id)
 
 def log_adherence(user_id: str, data: dict) -> str:
+    """Store an adherence log and update the user's daily/weekly rollups atomically."""
     log_id = str(uuid.uuid4())
     data["id"] = log_id
     
-    if user_id not in _MOCK_DB:
-        _MOCK_DB[user_id] = {"medications": [], "adherence": []}
-        
-    _MOCK_DB[user_id]["adherence"].append(data)
+    _STORE.add_adherence(user_id, data)
     return log_id
+
+def get_adherence(user_id: str, start: Optional[datetime] = None, end: Optional[datetime] = None) -> list:
+    """Adherence logs with start <= timestamp < end (naive UTC), oldest first."""
+    return _STORE.get_adherence(user_id, start, end)
+
+def get_adherence_rollups(user_id: str, granularity: str, since: str) -> list:
+    """Rollup rows with period_start >= since (YYYY-MM-DD), oldest first."""
+    return _STORE.get_rollups(user_id, granularity, since)
+
+def rebuild_adherence_rollups(user_id: str = None) -> dict:
+    """Recompute rollups from the raw adherence logs (one user, or everyone); for backfills."""
+    return _STORE.rebuild_rollups(user_id)
+
+def get_stats() -> dict:
+    return _STORE.get_stats()
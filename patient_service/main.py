@@ -1,11 +1,13 @@
-from fastapi import FastAPI, HTTPException, Depends, Header
+from fastapi import FastAPI, HTTPException, Depends, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Literal, Optional
+from datetime import datetime, timedelta, timezone
 import os
 import firestore
 import auth
 import events
+import event_bus
 
 app = FastAPI(title="HealthBridge Patient Service")
 
@@ -37,9 +39,18 @@ async def get_current_user(authorization: str = Header(None)):
         raise HTTPException(status_code=401, detail="Invalid token")
     return user
 
+@app.on_event("startup")
+def load_store():
+    firestore.start()
+
+@app.on_event("shutdown")
+def snapshot_store():
+    firestore.stop()
+
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "service": "patient-service"}
+    return {"status": "healthy", "service": "patient-service", "event_bus": event_bus.get_stats(),
+            "store": firestore.get_stats()}
 
 @app.get("/medications", response_model=List[dict])
 async def list_medications(user: dict = Depends(get_current_user)):
@@ -51,12 +62,46 @@ async def add_medication(med: Medication, user: dict = Depends(get_current_user)
 
 @app.post("/adherence")
 async def log_adherence(log: AdherenceLog, user: dict = Depends(get_current_user)):
+    # Reject up front when the event queue is full, before anything is stored
+    if not event_bus.get_bus().has_capacity():
+        raise HTTPException(status_code=503, detail="Event queue is full, try again shortly",
+                            headers={"Retry-After": "1"})
     log_data = log.dict()
     res = firestore.log_adherence(user["uid"], log_data)
-    # Publish event for analytics
-    events.publish_adherence_event(user["uid"], log_data)
+    # Publish event for analytics; a copy, so the store's record is never shared with the writer thread
+    await events.publish_adherence_event_async(user["uid"], dict(log_data))
     return {"status": "success", "id": res}
 
+@app.get("/adherence")
+async def list_adherence(start: Optional[datetime] = None, end: Optional[datetime] = None,
+                         user: dict = Depends(get_current_user)):
+    """The user's adherence logs with start <= timestamp < end, oldest first."""
+    return firestore.get_adherence(user["uid"], _naive_utc(start), _naive_utc(end))
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+@app.get("/adherence/summary")
+async def adherence_summary(days: int = Query(30, ge=1, le=firestore.ADHERENCE_MAX_WINDOW_DAYS),
+                            granularity: Literal["day", "week"] = "day", user: dict = Depends(get_current_user)):
+    """Per-medication adherence per day or week, read from the rollups only."""
+    first = datetime.utcnow().date() - timedelta(days=days - 1)
+    if granularity == "week":
+        first -= timedelta(days=first.weekday())
+    medications = {}
+    for row in firestore.get_adherence_rollups(user["uid"], granularity, first.isoformat()):
+        entry = medications.setdefault(row["medication_id"], {"medication_id": row["medication_id"],
+                                                               "taken": 0, "missed": 0, "total": 0, "periods": []})
+        for field in ("taken", "missed", "total"):
+            entry[field] += row[field]
+        entry["periods"].append(row)
+    for entry in medications.values():
+        entry["adherence_rate"] = round(entry["taken"] / entry["total"], 4) if entry["total"] else None
+    return {"granularity": granularity, "days": days, "since": first.isoformat(),
+            "medications": list(medications.values())}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8080)
@@ -0,0 +1,407 @@
+"""
+In-memory patient store behind firestore.py.
+
+Users are indexed by user ID. Each UserRecord keeps:
+  * its medications in a dict keyed by record ID;
+  * its adherence logs in an AdherenceSeries: an ``array('q')`` of epoch
+    microseconds kept in time order, next to a list of the records in the
+    same order. A time-range scan is two bisects and a slice.
+  * daily and weekly adherence rollups, updated with each log. They are
+    keyed by (medication_id, date ordinal of the period start), and the
+    counts are packed into one int as ``total << 32 | taken``.
+Records use ``__slots__``. A user's adherence containers are only created
+with their first log.
+
+Writes for one user hold one of PATIENT_STORE_LOCK_STRIPES locks, chosen by
+hashing the user ID, so different users rarely contend.
+
+``snapshot`` streams every user to PATIENT_STORE_SNAPSHOT_PATH as pickled
+chunks of plain tuples (temp file, then rename). ``load`` rebuilds the store
+from it. Snapshots are trusted local files; never load one from elsewhere.
+Each user is copied under their lock, so a snapshot is consistent per user
+but not a single point in time across users.
+"""
+import gc
+import os
+import pickle
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+PATIENT_STORE_SNAPSHOT_PATH = os.getenv("PATIENT_STORE_SNAPSHOT_PATH", "./patient_store.snapshot")
+PATIENT_STORE_SNAPSHOT_INTERVAL_SECONDS = float(os.getenv("PATIENT_STORE_SNAPSHOT_INTERVAL_SECONDS", "60"))
+PATIENT_STORE_LOCK_STRIPES = int(os.getenv("PATIENT_STORE_LOCK_STRIPES", "64"))
+# Longest window /adherence/summary accepts, as in the API.
+ADHERENCE_MAX_WINDOW_DAYS = int(os.getenv("ADHERENCE_MAX_WINDOW_DAYS", "365"))
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_CHUNK_USERS = 10000
+TAKEN = "taken"
+# Same values as the API's /api/adherence/summary; each names a rollup attribute of _User.
+GRANULARITIES = {"day": "daily", "week": "weekly"}
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+class MedicationRecord:
+    __slots__ = ("id", "name", "dosage", "frequency", "created_at", "extra")
+
+    def __init__(self, id, name, dosage, frequency, created_at, extra=None):
+        self.id = id
+        self.name = name
+        self.dosage = dosage
+        self.frequency = frequency
+        self.created_at = created_at
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MedicationRecord":
+        known = ("id", "name", "dosage", "frequency", "created_at")
+        extra = {k: v for k, v in data.items() if k not in known} or None
+        return cls(data["id"], data.get("name"), data.get("dosage"), data.get("frequency"),
+                   data.get("created_at"), extra)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {"name": self.name, "dosage": self.dosage, "frequency": self.frequency}
+        if self.extra:
+            data.update(self.extra)
+        data["id"] = self.id
+        data["created_at"] = self.created_at
+        return data
+
+    def to_tuple(self) -> tuple:
+        return (self.id, self.name, self.dosage, self.frequency, self.created_at, self.extra)
+
+
+class AdherenceRecord:
+    __slots__ = ("id", "medication_id", "status", "timestamp", "extra")
+
+    def __init__(self, id, medication_id, status, timestamp, extra=None):
+        self.id = id
+        self.medication_id = medication_id
+        self.status = status
+        self.timestamp = timestamp
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "AdherenceRecord":
+        known = ("id", "medication_id", "status", "timestamp")
+        extra = {k: v for k, v in data.items() if k not in known} or None
+        return cls(data["id"], data.get("medication_id"), data.get("status"), data.get("timestamp"), extra)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {"medication_id": self.medication_id, "status": self.status, "timestamp": self.timestamp}
+        if self.extra:
+            data.update(self.extra)
+        data["id"] = self.id
+        return data
+
+    def to_tuple(self) -> tuple:
+        return (self.id, self.medication_id, self.status, self.timestamp, self.extra)
+
+
+class AdherenceSeries:
+    """Adherence records in timestamp order, with their epoch microseconds in a parallel array."""
+    __slots__ = ("epochs", "records")
+
+    def __init__(self, epochs: Optional[array] = None, records: Optional[List[AdherenceRecord]] = None):
+        self.epochs = epochs if epochs is not None else array("q")
+        self.records = records if records is not None else []
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def add(self, epoch: int, record: AdherenceRecord) -> None:
+        if not self.epochs or epoch >= self.epochs[-1]:
+            self.epochs.append(epoch)
+            self.records.append(record)
+            return
+        # Late arrival: insert in place, after any records with the same time
+        i = bisect_right(self.epochs, epoch)
+        self.epochs.insert(i, epoch)
+        self.records.insert(i, record)
+
+    def range(self, start: Optional[int] = None, end: Optional[int] = None) -> List[AdherenceRecord]:
+        """Records with start <= epoch < end (either bound may be None)."""
+        lo = bisect_left(self.epochs, start) if start is not None else 0
+        hi = bisect_left(self.epochs, end) if end is not None else len(self.epochs)
+        return self.records[lo:hi]
+
+
+class UserRecord:
+    __slots__ = ("medications", "adherence", "daily", "weekly")
+
+    def __init__(self):
+        self.medications: Dict[str, MedicationRecord] = {}
+        self.adherence: Optional[AdherenceSeries] = None
+        # {(medication_id, period start ordinal): total << 32 | taken}, one per granularity
+        self.daily: Optional[Dict[Tuple[str, int], int]] = None
+        self.weekly: Optional[Dict[Tuple[str, int], int]] = None
+
+
+def parse_timestamp(timestamp: Optional[str]) -> Optional[datetime]:
+    """Naive UTC datetime of an ISO-8601 string, or None."""
+    try:
+        when = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+    if when.tzinfo is not None:
+        when = when.astimezone(timezone.utc).replace(tzinfo=None)
+    return when
+
+
+def to_epoch_us(when: datetime) -> int:
+    return (when - _EPOCH) // _MICROSECOND
+
+
+def _count(user: UserRecord, record: AdherenceRecord, when: datetime) -> None:
+    increment = (1 << 32) | (record.status == TAKEN)
+    medication_id = record.medication_id or ""
+    day = when.toordinal()
+    if user.daily is None:
+        user.daily, user.weekly = {}, {}
+    key = (medication_id, day)
+    user.daily[key] = user.daily.get(key, 0) + increment
+    key = (medication_id, day - when.weekday())
+    user.weekly[key] = user.weekly.get(key, 0) + increment
+
+
+@contextmanager
+def _gc_paused() -> Iterator[None]:
+    # Building millions of small containers sets off the cyclic GC over and over, which makes up
+    # most of the cost of a snapshot load. None of these objects form cycles.
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+class PatientStore:
+    def __init__(self, snapshot_path: str = PATIENT_STORE_SNAPSHOT_PATH, lock_stripes: int = PATIENT_STORE_LOCK_STRIPES):
+        self.snapshot_path = snapshot_path
+        self._users: Dict[str, UserRecord] = {}
+        self._locks = [threading.Lock() for _ in range(lock_stripes)]
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        self._snapshot_writes = 0
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.stats = {"snapshots": 0, "last_snapshot_seconds": None, "last_load_seconds": None}
+
+    def _lock(self, user_id: str) -> threading.Lock:
+        return self._locks[hash(user_id) % len(self._locks)]
+
+    def _get_or_create(self, user_id: str) -> UserRecord:
+        user = self._users.get(user_id)
+        if user is None:
+            user = self._users[user_id] = UserRecord()
+        return user
+
+    @contextmanager
+    def user(self, user_id: str, create: bool = True) -> Iterator[Optional[UserRecord]]:
+        """The user's record (created if missing and ``create``), with the user's lock held."""
+        with self._lock(user_id):
+            yield self._get_or_create(user_id) if create else self._users.get(user_id)
+
+    def add_medication(self, user_id: str, data: Dict[str, Any]) -> None:
+        record = MedicationRecord.from_dict(data)
+        with self._lock(user_id):
+            self._get_or_create(user_id).medications[record.id] = record
+        self._written()
+
+    def get_medications(self, user_id: str) -> List[Dict[str, Any]]:
+        with self._lock(user_id):
+            user = self._users.get(user_id)
+            records = list(user.medications.values()) if user else []
+        return [record.to_dict() for record in records]
+
+    def get_medication(self, user_id: str, medication_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock(user_id):
+            user = self._users.get(user_id)
+            record = user.medications.get(medication_id) if user else None
+        return record.to_dict() if record else None
+
+    def add_adherence(self, user_id: str, data: Dict[str, Any]) -> None:
+        """
+        Store an adherence log and count it in the user's rollups, atomically.
+        A log with an unparseable timestamp is stored at the time it was
+        received but not counted, as in ``rebuild_rollups``.
+        """
+        record = AdherenceRecord.from_dict(data)
+        when = parse_timestamp(record.timestamp)
+        with self._lock(user_id):
+            user = self._get_or_create(user_id)
+            if user.adherence is None:
+                user.adherence = AdherenceSeries()
+            user.adherence.add(to_epoch_us(when or datetime.utcnow()), record)
+            if when is not None:
+                _count(user, record, when)
+        self._written()
+
+    def get_adherence(self, user_id: str, start: Optional[datetime] = None,
+                      end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Adherence logs with start <= timestamp < end (naive UTC), oldest first."""
+        with self._lock(user_id):
+            user = self._users.get(user_id)
+            records = user.adherence.range(
+                to_epoch_us(start) if start else None, to_epoch_us(end) if end else None
+            ) if user and user.adherence else []
+        return [record.to_dict() for record in records]
+
+    def get_rollups(self, user_id: str, granularity: str, since: str) -> List[Dict[str, Any]]:
+        """Rollup rows with period_start >= since (YYYY-MM-DD), by medication then period."""
+        first = date.fromisoformat(since).toordinal()
+        with self._lock(user_id):
+            user = self._users.get(user_id)
+            rollup = getattr(user, GRANULARITIES[granularity]) if user else None
+            items = [(key, packed) for key, packed in rollup.items() if key[1] >= first] if rollup else []
+        rows = []
+        for (medication_id, start), packed in sorted(items):
+            taken, total = packed & 0xFFFFFFFF, packed >> 32
+            rows.append({"taken": taken, "missed": total - taken, "total": total, "medication_id": medication_id,
+                         "period_start": date.fromordinal(start).isoformat()})
+        return rows
+
+    def rebuild_rollups(self, user_id: Optional[str] = None) -> Dict[str, int]:
+        """Recompute rollups from the stored logs (one user, or everyone); skips unparseable timestamps."""
+        events = skipped = 0
+        for uid in ([user_id] if user_id else list(self._users)):
+            with self._lock(uid):
+                user = self._users.get(uid)
+                if user is None or user.adherence is None:
+                    continue
+                user.daily = user.weekly = None
+                for record in user.adherence.records:
+                    when = parse_timestamp(record.timestamp)
+                    if when is None:
+                        skipped += 1
+                        continue
+                    _count(user, record, when)
+                    events += 1
+        return {"events": events, "skipped": skipped}
+
+    def _written(self) -> None:
+        with self._writes_lock:
+            self._writes += 1
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    # --- Snapshots ---
+
+    def _user_tuple(self, user_id: str) -> Optional[tuple]:
+        with self._lock(user_id):
+            user = self._users.get(user_id)
+            if user is None:
+                return None
+            return (
+                user_id,
+                [record.to_tuple() for record in user.medications.values()],
+                user.adherence.epochs.tobytes() if user.adherence else None,
+                [record.to_tuple() for record in user.adherence.records] if user.adherence else None,
+                list(user.daily.items()) if user.daily else None,
+                list(user.weekly.items()) if user.weekly else None,
+            )
+
+    def snapshot(self, path: Optional[str] = None) -> Dict[str, Any]:
+        """Write every user to ``path`` (default snapshot_path) atomically."""
+        path = path or self.snapshot_path
+        with self._snapshot_lock:
+            started = time.perf_counter()
+            writes = self._writes
+            user_ids = list(self._users)
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            tmp = f"{path}.tmp"
+            with _gc_paused(), open(tmp, "wb") as f:
+                # Each chunk is a separate pickle, so neither side holds the whole store at once.
+                header = {"version": SNAPSHOT_VERSION, "users": len(user_ids), "created_at": time.time()}
+                pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+                for i in range(0, len(user_ids), SNAPSHOT_CHUNK_USERS):
+                    chunk = [self._user_tuple(uid) for uid in user_ids[i:i + SNAPSHOT_CHUNK_USERS]]
+                    pickle.dump([entry for entry in chunk if entry is not None], f, protocol=pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+            self._snapshot_writes = writes
+            elapsed = time.perf_counter() - started
+            self.stats["snapshots"] += 1
+            self.stats["last_snapshot_seconds"] = round(elapsed, 3)
+            return {"users": len(user_ids), "bytes": os.path.getsize(path), "seconds": round(elapsed, 3)}
+
+    def load(self, path: Optional[str] = None) -> int:
+        """Replace the store's contents with a snapshot; returns the number of users (0 if none exists)."""
+        path = path or self.snapshot_path
+        if not os.path.exists(path):
+            return 0
+        started = time.perf_counter()
+        users: Dict[str, UserRecord] = {}
+        with _gc_paused(), open(path, "rb") as f:
+            header = pickle.load(f)
+            if header.get("version") != SNAPSHOT_VERSION:
+                raise ValueError(f"Unsupported patient store snapshot version {header.get('version')}")
+            while len(users) < header["users"]:
+                try:
+                    chunk = pickle.load(f)
+                except EOFError:
+                    break
+                for user_id, medications, epochs, adherence, daily, weekly in chunk:
+                    user = UserRecord.__new__(UserRecord)
+                    user.medications = {m[0]: MedicationRecord(*m) for m in medications}
+                    user.adherence = None
+                    if adherence is not None:
+                        series_epochs = array("q")
+                        series_epochs.frombytes(epochs)
+                        user.adherence = AdherenceSeries(series_epochs, [AdherenceRecord(*a) for a in adherence])
+                    user.daily = dict(daily) if daily else None
+                    user.weekly = dict(weekly) if weekly else None
+                    users[user_id] = user
+        self._users = users
+        # The loaded records live as long as the process; keep later collections from rescanning them.
+        gc.freeze()
+        self._writes = self._snapshot_writes = 0
+        self.stats["last_load_seconds"] = round(time.perf_counter() - started, 3)
+        return len(users)
+
+    def start(self, interval: float = PATIENT_STORE_SNAPSHOT_INTERVAL_SECONDS) -> None:
+        """Load the snapshot, then snapshot every ``interval`` seconds while there are new writes."""
+        loaded = self.load()
+        print(f"Patient store: loaded {loaded} users from {self.snapshot_path}")
+        if interval <= 0 or self._snapshot_thread is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                if self._writes != self._snapshot_writes:
+                    try:
+                        self.snapshot()
+                    except Exception as e:
+                        print(f"Patient store snapshot failed: {e}")
+
+        self._snapshot_thread = threading.Thread(target=run, name="patient-store-snapshot", daemon=True)
+        self._snapshot_thread.start()
+
+    def stop(self) -> None:
+        """Stop periodic snapshots and write a final one if anything changed."""
+        self._stop.set()
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join()
+            self._snapshot_thread = None
+        if self._writes != self._snapshot_writes:
+            self.snapshot()
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["users"] = len(self._users)
+        stats["unsnapshotted_writes"] = self._writes - self._snapshot_writes
+        stats["snapshot_path"] = self.snapshot_path
+        return stats
@@ -0,0 +1,96 @@
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from sqlalchemy import select  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+
+from api import adherence_stats, database, models  # noqa: E402
+
+
+def stats_for(user_id):
+    async def main():
+        engine = create_async_engine("sqlite+aiosqlite://")
+        async with engine.begin() as conn:
+            await conn.run_sync(database.Base.metadata.create_all)
+        today = (datetime.utcnow() - timedelta(hours=1)).isoformat()
+        async with async_sessionmaker(engine)() as db:
+            db.add_all([
+                models.AdherenceLog(medication_id="m1", status="taken", timestamp=today, user_id="alice"),
+                models.AdherenceLog(medication_id="m1", status="missed", timestamp=today, user_id="bob"),
+                models.AdherenceLog(medication_id="m2", status="taken", timestamp=today, user_id=None),
+            ])
+            await db.commit()
+            result = await adherence_stats.adherence_stats(db, days=7, user_id=user_id)
+        await engine.dispose()
+        return [(m["medication_id"], m["taken"], m["missed"]) for m in result["medications"]]
+    return asyncio.run(main())
+
+
+def test_stats_are_scoped_to_the_caller():
+    assert stats_for("alice") == [("m1", 1, 0)]
+    assert stats_for("bob") == [("m1", 0, 1)]
+
+
+def test_anonymous_callers_only_see_anonymous_logs():
+    assert stats_for("") == [("m2", 1, 0)]
+
+
+def test_anonymous_summary_only_covers_anonymous_logs():
+    from api import adherence_rollups
+
+    async def main():
+        engine = create_async_engine("sqlite+aiosqlite://")
+        async with engine.begin() as conn:
+            await conn.run_sync(database.Base.metadata.create_all)
+        now = datetime.utcnow().isoformat()
+        async with async_sessionmaker(engine)() as db:
+            await adherence_rollups.record(db, "alice", "m1", "taken", now)
+            await adherence_rollups.record(db, None, "m2", "missed", now)
+            await db.commit()
+            anonymous = await adherence_rollups.summary(db, 7, "day", "")
+            alice = await adherence_rollups.summary(db, 7, "week", "alice")
+        await engine.dispose()
+        return anonymous, alice
+
+    anonymous, alice = asyncio.run(main())
+    assert [m["medication_id"] for m in anonymous["medications"]] == ["m2"]
+    assert [m["medication_id"] for m in alice["medications"]] == ["m1"]
+
+
+def test_incremental_rollups_match_a_rebuild():
+    from api import adherence_rollups
+
+    async def rollup_rows(db):
+        rows = []
+        for model in adherence_rollups.ROLLUPS.values():
+            result = await db.execute(select(model.user_id, model.medication_id, model.period_start,
+                                             model.taken, model.missed, model.total))
+            rows.append(sorted(result.all()))
+        return rows
+
+    async def main():
+        engine = create_async_engine("sqlite+aiosqlite://")
+        async with engine.begin() as conn:
+            await conn.run_sync(database.Base.metadata.create_all)
+        now = datetime.utcnow()
+        logs = [("alice", "m1", "taken", now.isoformat()), ("alice", "m1", "missed", "yesterday"),
+                ("alice", "m2", "taken", (now - timedelta(days=9)).isoformat() + "Z"), ("bob", "m1", "taken", None)]
+        async with async_sessionmaker(engine)() as db:
+            for user_id, medication_id, status, timestamp in logs:
+                db.add(models.AdherenceLog(user_id=user_id, medication_id=medication_id, status=status,
+                                           timestamp=timestamp))
+                await adherence_rollups.record(db, user_id, medication_id, status, timestamp)
+            await db.commit()
+            incremental = await rollup_rows(db)
+            stats = await adherence_rollups.rebuild(db)
+            rebuilt = await rollup_rows(db)
+        await engine.dispose()
+        return incremental, rebuilt, stats
+
+    incremental, rebuilt, stats = asyncio.run(main())
+    assert incremental == rebuilt
+    assert (stats["events"], stats["skipped"]) == (2, 2)
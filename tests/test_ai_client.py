@@ -0,0 +1,123 @@
+import asyncio
+import os
+import sys
+
+import httpx
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "clinical_service"))
+
+import ai_client  # noqa: E402
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ai_client.time, "monotonic", clock)
+    return clock
+
+
+def open_breaker(threshold=3):
+    breaker = ai_client.CircuitBreaker(failure_threshold=threshold, reset_timeout=30)
+    for _ in range(threshold):
+        assert breaker.allow()
+        breaker.record_failure()
+    return breaker
+
+
+def test_opens_after_the_failure_threshold(clock):
+    breaker = ai_client.CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == ai_client.CLOSED and breaker.allow()
+    breaker.record_success()
+    # A success resets the count; only consecutive failures open the breaker.
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == ai_client.CLOSED
+    breaker.record_failure()
+    assert breaker.state == ai_client.OPEN
+    assert not breaker.allow()
+    assert breaker.get_stats()["short_circuited"] == 1
+
+
+def test_stays_open_for_the_cooldown(clock):
+    breaker = open_breaker()
+    clock.now += 29.9
+    assert not breaker.allow()
+    assert breaker.get_stats()["retry_in_seconds"] == pytest.approx(0.1)
+    clock.now += 0.1
+    assert breaker.allow()
+    assert breaker.state == ai_client.HALF_OPEN
+
+
+def test_half_open_allows_one_probe_and_closes_on_success(clock):
+    breaker = open_breaker()
+    clock.now += 30
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == ai_client.CLOSED and breaker.failures == 0
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens_for_another_cooldown(clock):
+    breaker = open_breaker()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == ai_client.OPEN
+    assert breaker.get_stats()["opened"] == 2
+    clock.now += 10
+    assert not breaker.allow()
+    clock.now += 20
+    assert breaker.allow()
+
+
+def test_cancelled_probe_frees_the_slot(clock):
+    breaker = open_breaker()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.release_probe()
+    assert breaker.state == ai_client.HALF_OPEN
+    assert breaker.allow()
+
+
+def test_analyze_note_reuses_the_pooled_client_and_fails_fast_when_open(monkeypatch, clock):
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        return httpx.Response(503 if len(calls) <= 2 else 200, json={"status": "success"})
+
+    monkeypatch.setattr(ai_client, "breaker", ai_client.CircuitBreaker(failure_threshold=2, reset_timeout=30))
+    monkeypatch.setattr(ai_client, "_client", httpx.AsyncClient(base_url="http://ai", transport=httpx.MockTransport(handler)))
+
+    async def main():
+        client = ai_client.get_client()
+        assert ai_client.get_client() is client
+        outcomes = []
+        for _ in range(3):
+            try:
+                outcomes.append(await ai_client.analyze_note({"note_text": "x"}))
+            except ai_client.AIServiceUnavailable as e:
+                outcomes.append(str(e))
+        clock.now += 30
+        outcomes.append(await ai_client.analyze_note({"note_text": "x"}))
+        await ai_client.close()
+        return outcomes
+
+    outcomes = asyncio.run(main())
+    assert outcomes[:3] == ["AI service returned 503", "AI service returned 503", "AI service circuit is open"]
+    assert outcomes[3] == {"status": "success"}
+    assert calls == ["/analyze-note"] * 3
+    assert ai_client.breaker.state == ai_client.CLOSED
@@ -0,0 +1,84 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from api import audit  # noqa: E402
+
+
+def run_sink(sink, actions):
+    async def main():
+        sink.start()
+        for action in actions:
+            await sink.log(action, "alice", "Success")
+        await sink.stop()
+    asyncio.run(main())
+
+
+def test_failed_batch_is_retried(monkeypatch, tmp_path):
+    written, failures = [], [2]
+
+    async def flaky_write(records):
+        if failures[0]:
+            failures[0] -= 1
+            raise RuntimeError("database is locked")
+        written.extend(records)
+
+    monkeypatch.setattr(audit, "write_batch", flaky_write)
+    sink = audit.AuditSink(flush_interval_ms=10, retry_backoff_ms=1, spill_path=str(tmp_path / "spill.jsonl"))
+    run_sink(sink, ["a", "b"])
+    assert [r["action"] for r in written] == ["a", "b"]
+    assert sink.get_stats()["retries"] == 2
+    assert sink.get_stats()["dropped"] == 0
+
+
+def test_batch_spills_and_is_replayed_after_recovery(monkeypatch, tmp_path):
+    written, down = [], [True]
+
+    async def write(records):
+        if down[0]:
+            raise RuntimeError("disk I/O error")
+        written.extend(records)
+
+    monkeypatch.setattr(audit, "write_batch", write)
+    spill_path = str(tmp_path / "spill.jsonl")
+    sink = audit.AuditSink(flush_interval_ms=10, write_retries=1, retry_backoff_ms=1, spill_path=spill_path)
+    run_sink(sink, ["lost?"])
+    assert written == [] and os.path.exists(spill_path)
+    assert sink.get_stats()["spilled"] == 1
+
+    down[0] = False
+    run_sink(sink, ["next"])
+    assert sorted(r["action"] for r in written) == ["lost?", "next"]
+    assert not os.path.exists(spill_path)
+    assert sink.get_stats()["replayed"] == 1
+
+
+def test_records_that_cannot_be_spilled_are_counted_as_dropped(monkeypatch, tmp_path):
+    async def write(records):
+        raise RuntimeError("disk I/O error")
+
+    monkeypatch.setattr(audit, "write_batch", write)
+    sink = audit.AuditSink(flush_interval_ms=10, write_retries=0,
+                           spill_path=str(tmp_path / "missing" / "spill.jsonl"))
+    run_sink(sink, ["a", "b", "c"])
+    assert sink.get_stats()["dropped"] == 3
+
+
+def test_timestamp_conversion_runs_once(tmp_path):
+    from sqlalchemy import create_engine, text
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'audit.db'}")
+    insert = text("INSERT INTO audit_logs (id, timestamp, action) VALUES (:id, :timestamp, 'a')")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE audit_logs (id VARCHAR PRIMARY KEY, timestamp VARCHAR, action VARCHAR,"
+                          " user VARCHAR, status VARCHAR)"))
+        conn.execute(insert, {"id": "old", "timestamp": "2024-01-02T03:04:05"})
+        audit.ensure_schema(conn)
+        # A later startup must not scan the table again.
+        conn.execute(insert, {"id": "marker", "timestamp": "2024-01-02T09:00:00"})
+        audit.ensure_schema(conn)
+        rows = dict(conn.execute(text("SELECT id, timestamp FROM audit_logs")).all())
+    engine.dispose()
+    assert rows == {"old": "2024-01-02 03:04:05", "marker": "2024-01-02T09:00:00"}
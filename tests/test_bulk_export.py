@@ -0,0 +1,63 @@
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "clinical_service"))
+sys.path.insert(0, os.path.join(ROOT, "healthbridge_ai"))
+
+import bulk_export  # noqa: E402
+
+
+def resources(count, on_each=None):
+    def fake_iter_resources(since=None, types=None, directory=None):
+        for i in range(count):
+            if on_each:
+                on_each(i)
+            yield "Condition", {"resourceType": "Condition", "id": str(i)}
+    return fake_iter_resources
+
+
+def test_delete_during_run_cancels_and_removes_files(monkeypatch, tmp_path):
+    jobs = bulk_export.ExportJobs(str(tmp_path))
+    job_id = jobs.create("http://test/fhir/$export", None, None, False)
+    deleted = []
+
+    def delete_midway(i):
+        if i == 5:
+            deleted.append(jobs.delete(job_id))
+            assert os.path.isdir(jobs.directory(job_id))
+
+    monkeypatch.setattr(bulk_export, "iter_resources", resources(100, delete_midway))
+    jobs.run(job_id)
+    assert deleted == [True]
+    assert jobs.get(job_id) is None
+    assert not os.path.exists(jobs.directory(job_id))
+
+
+def test_delete_after_completion_removes_files(monkeypatch, tmp_path):
+    monkeypatch.setattr(bulk_export, "iter_resources", resources(3))
+    jobs = bulk_export.ExportJobs(str(tmp_path))
+    job_id = jobs.create("http://test/fhir/$export", None, None, False)
+    jobs.run(job_id)
+    assert jobs.get(job_id)["result"]["counts"] == {"Condition": 3}
+    assert jobs.delete(job_id)
+    assert not os.path.exists(jobs.directory(job_id))
+    assert not jobs.delete(job_id)
+
+
+def test_finished_jobs_and_orphaned_directories_expire(monkeypatch, tmp_path):
+    monkeypatch.setattr(bulk_export, "iter_resources", resources(3))
+    jobs = bulk_export.ExportJobs(str(tmp_path), ttl_seconds=60)
+    job_id = jobs.create("http://test/fhir/$export", None, None, False)
+    jobs.run(job_id)
+    orphan = tmp_path / "left-by-an-earlier-process"
+    orphan.mkdir()
+    old = time.time() - 120
+    os.utime(orphan, (old, old))
+
+    assert jobs.expire() == 1
+    assert jobs.get(job_id) is not None and not orphan.exists()
+    assert jobs.expire(now=time.time() + 120) == 1
+    assert jobs.get(job_id) is None
+    assert not os.path.exists(jobs.directory(job_id))
@@ -0,0 +1,40 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from healthbridge_ai import deidentify  # noqa: E402
+
+
+def redact(text):
+    return deidentify.get_engine().redact(text)[0]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("seen 1/15", "seen [DATE]"),
+    ("since 03/2024", "since [DATE]"),
+    ("in 12/2023", "in [DATE]"),
+    ("on 15-Jan-2024", "on [DATE]"),
+    ("on 2024/03/01", "on [DATE]"),
+    ("on the 3rd of March", "on the [DATE]"),
+    ("Name: smith, john", "Name: [NAME]"),
+    ("Insurance ID: ABC12345", "Insurance ID: [ID]"),
+    ("Medicaid #: 99887766", "Medicaid #: [ID]"),
+    ("Medicare ID 1EG4-TE5-MK72", "Medicare ID [ID]"),
+    ("age: 95", "age: [AGE]"),
+])
+def test_identifier_formats_are_redacted(text, expected):
+    assert redact(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "BP 120/80, pain 10/10, 1/2 tab, 3/4 of doses",
+    "pain: 8/10",
+    "Patient: denies chest pain",
+    "History of Parkinson disease since 2019",
+    "a 45-year-old patient",
+])
+def test_clinical_text_is_kept(text):
+    assert redact(text) == text
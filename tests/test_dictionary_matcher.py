@@ -0,0 +1,50 @@
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "clinical_service"))
+
+from dictionary_matcher import DictionaryMatcher, Term  # noqa: E402
+
+TERMS = [
+    Term("diabetes", "CONDITION", "73211009", "Diabetes mellitus"),
+    Term("type 2 diabetes", "CONDITION", "44054006", "Type 2 diabetes mellitus"),
+    Term("2 diabetes mellitus", "CONDITION", "0", "Overlapping test term"),
+    Term("aspirin", "MEDICATION", "1191", "Aspirin"),
+    Term("asa", "MEDICATION", "1191", "Aspirin"),
+]
+
+
+def found(text, **kwargs):
+    return [(m.text, m.term.code) for m in DictionaryMatcher(TERMS).find_all(text, **kwargs)]
+
+
+def test_leftmost_longest_wins_overlaps():
+    assert found("Type 2 diabetes mellitus") == [("Type 2 diabetes", "44054006")]
+    assert found("type 2 diabetes mellitus", overlapping=True) == [
+        ("type 2 diabetes", "44054006"), ("2 diabetes mellitus", "0"), ("diabetes", "73211009")]
+
+
+def test_matches_only_whole_words():
+    assert found("prediabetes, aspirinate, Nasal spray") == []
+    assert found("(aspirin);ASA.") == [("aspirin", "1191"), ("ASA", "1191")]
+
+
+def test_matching_ignores_case_and_keeps_the_original_span():
+    matches = DictionaryMatcher(TERMS).find_all("On ASPIRIN for Diabetes")
+    assert [(m.start, m.end, m.text, m.term.display) for m in matches] == [
+        (3, 10, "ASPIRIN", "Aspirin"), (15, 23, "Diabetes", "Diabetes mellitus")]
+
+
+def test_length_changing_lowercase_keeps_offsets_aligned():
+    text = "İ aspirin"
+    [match] = DictionaryMatcher(TERMS).find_all(text)
+    assert text[match.start:match.end] == "aspirin"
+
+
+def test_nlp_entities_keep_the_matched_text_and_add_the_display_name():
+    import nlp
+
+    [entity] = nlp.analyze_clinical_text("Started METFORMIN today.")
+    assert (entity["text"], entity["display"], entity["type"]) == ("METFORMIN", "Metformin", "MEDICATION")
+    assert (entity["start"], entity["end"]) == (8, 17)
@@ -0,0 +1,91 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from healthbridge_ai import event_bus  # noqa: E402
+
+
+def make_bus(tmp_path, **kwargs):
+    kwargs.setdefault("fsync", False)
+    return event_bus.EventBus(str(tmp_path / "log"), flush_interval_ms=1, retry_backoff_ms=1,
+                              spill_dir=str(tmp_path / "spill"), **kwargs)
+
+
+def test_segments_roll_over_and_reader_resumes_from_positions(tmp_path):
+    bus = make_bus(tmp_path, segment_bytes=300, batch_size=1)
+    ids = [bus.publish("t", {"n": i}) for i in range(10)]
+    bus.close()
+    reader = event_bus.EventLogReader("t", str(tmp_path / "log"))
+    assert len(event_bus._segments(reader.topic_dir)) > 1
+
+    first, position = reader.read(max_events=4)
+    assert [e["data"]["n"] for e in first] == [0, 1, 2, 3]
+    rest, end = reader.read(position)
+    assert [e["id"] for e in first + rest] == ids
+    assert reader.read(end) == ([], end)
+    segment, offset = event_bus._parse_position(end)
+    assert offset == os.path.getsize(event_bus._segment_path(reader.topic_dir, segment))
+
+
+def test_reader_stops_at_a_partial_line(tmp_path):
+    bus = make_bus(tmp_path)
+    bus.publish("t", {"n": 1})
+    bus.close()
+    reader = event_bus.EventLogReader("t", str(tmp_path / "log"))
+    with open(event_bus._segment_path(reader.topic_dir, 1), "ab") as f:
+        f.write(b'{"id":"half')
+    events, position = reader.read()
+    assert len(events) == 1
+    assert reader.read(position) == ([], position)
+
+
+def test_consumer_commit_and_rewind(tmp_path):
+    bus = make_bus(tmp_path)
+    for i in range(5):
+        bus.publish("t", {"n": i})
+    bus.close()
+    directory = str(tmp_path / "log")
+    consumer = event_bus.Consumer("t", "g", directory)
+    assert [e["data"]["n"] for e in consumer.poll(2)] == [0, 1]
+    consumer.commit()
+    assert [e["data"]["n"] for e in consumer.poll(2)] == [2, 3]
+    consumer.rewind()
+    assert [e["data"]["n"] for e in consumer.poll(2)] == [2, 3]
+    # A restarted consumer resumes after the last commit.
+    assert [e["data"]["n"] for e in event_bus.Consumer("t", "g", directory).poll()] == [2, 3, 4]
+
+
+def test_unserializable_payload_fails_in_the_caller(tmp_path):
+    bus = make_bus(tmp_path)
+    with pytest.raises(TypeError):
+        bus.publish("t", {"when": object()})
+    bus.close()
+    assert bus.stats["published"] == 0
+
+
+def test_failed_appends_are_retried_then_spilled_and_replayed(tmp_path, monkeypatch):
+    bus = make_bus(tmp_path, write_retries=2)
+    failing = {"on": True}
+    append_lines = event_bus.SegmentLog.append_lines
+
+    def flaky(self, payload):
+        if failing["on"]:
+            raise OSError("disk full")
+        append_lines(self, payload)
+    monkeypatch.setattr(event_bus.SegmentLog, "append_lines", flaky)
+
+    bus.publish("t", {"n": 1})
+    bus.flush()
+    assert (bus.stats["retries"], bus.stats["spilled"], bus.stats["dropped"]) == (2, 1, 0)
+    assert os.path.exists(bus._spill_path("t"))
+
+    failing["on"] = False
+    bus.publish("t", {"n": 2})
+    bus.close()
+    assert bus.stats["replayed"] == 1
+    assert not os.path.exists(bus._spill_path("t"))
+    events, _ = event_bus.EventLogReader("t", str(tmp_path / "log")).read()
+    assert sorted(e["data"]["n"] for e in events) == [1, 2]
@@ -0,0 +1,39 @@
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from healthbridge_ai import image_prep  # noqa: E402
+
+
+class CountingReader(io.BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.bytes_read += len(chunk)
+        return chunk
+
+
+def test_prepare_image_stops_reading_at_the_limit():
+    source = CountingReader(b"\0" * (image_prep._CHUNK_BYTES * 8))
+    with pytest.raises(image_prep.UploadTooLarge):
+        image_prep.prepare_image(source, "application/pdf", max_bytes=image_prep._CHUNK_BYTES + 1)
+    assert source.bytes_read <= image_prep._CHUNK_BYTES * 2
+
+
+def test_prepare_image_passes_through_undecodable_input_under_the_limit():
+    data, mime_type, info = image_prep.prepare_image(io.BytesIO(b"%PDF-1.4 test"), "application/pdf")
+    assert (data, mime_type, info["original_bytes"], info["processed"]) == (b"%PDF-1.4 test", "application/pdf", 13, False)
+
+
+def test_corrupt_image_is_rejected_but_unknown_formats_pass_through():
+    with pytest.raises(image_prep.UnsupportedImage):
+        image_prep.prepare_image(io.BytesIO(b"\xff\xd8\xff\xe0 not really a jpeg"), "image/jpeg")
+    data, _, _ = image_prep.prepare_image(io.BytesIO(b"heic bytes"), "image/heic")
+    assert data == b"heic bytes"
@@ -0,0 +1,50 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from healthbridge_ai import interaction_index  # noqa: E402
+
+
+def make_index():
+    index = interaction_index.InteractionIndex()
+    index.add_synonym("Coumadin", "warfarin")
+    index.add_interaction("warfarin", "aspirin", "High", "Bleeding risk.", "Avoid.")
+    return index
+
+
+def test_known_pair_is_answered_locally():
+    result = make_index().check(["Coumadin 5mg", "aspirin"])
+    assert [(i["drug_a"], i["drug_b"], i["severity"]) for i in result["interactions"]] == [
+        ("Coumadin 5mg", "aspirin", "High")
+    ]
+    assert result["unknown_pairs"] == []
+
+
+def test_resolved_pair_without_entry_is_unknown_not_safe():
+    result = make_index().check(["warfarin", "clarithromycin", "losartan"])
+    assert result["interactions"] == []
+    assert ("warfarin", "clarithromycin") in result["unknown_pairs"]
+    assert ("clarithromycin", "losartan") in result["unknown_pairs"]
+    assert len(result["unknown_pairs"]) == 3
+
+
+def test_same_ingredient_is_not_a_pair():
+    result = make_index().check(["Coumadin", "warfarin"])
+    assert result == {"interactions": [], "unknown_pairs": [], "unresolved": []}
+
+
+def test_shipped_table_reports_missing_pairs():
+    for meds in (["warfarin", "clarithromycin"], ["losartan", "spironolactone"], ["verapamil", "clarithromycin"]):
+        result = interaction_index.check_medications(meds)
+        assert result["unknown_pairs"] == [tuple(meds)], meds
+
+
+def test_annotate_analysis_adds_interactions_across_chunks():
+    result = {"extracted_entities": {"medications": [{"drug_name": "Warfarin 5 mg"}, {"drug_name": "Metformin"},
+                                                     {"drug_name": "Aspirin 81 mg"}]},
+              "clinical_validations": {"drug_interactions": []}}
+    interactions = interaction_index.annotate_analysis(result)["clinical_validations"]["drug_interactions"]
+    assert [(i["drug_a"], i["drug_b"], i["severity"]) for i in interactions] == [("Warfarin 5 mg", "Aspirin 81 mg", "HIGH")]
+    interaction_index.annotate_analysis(result)
+    assert len(result["clinical_validations"]["drug_interactions"]) == 1
@@ -0,0 +1,92 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from healthbridge_ai import json_stream  # noqa: E402
+
+DOCUMENT = json.dumps({
+    "status": "success",
+    "summary": {"note": "braces { and [ inside strings", "conditions": [{"not": "watched"}]},
+    "extracted_entities": {
+        "conditions": [{"clinical_text": "say \"no\" to {pain}", "negated": True},
+                       {"clinical_text": "back\\slash ]", "icd_10": "M54.5"}],
+        "medications": [{"drug_name": "Warfarin", "dosage": {"amount": 5, "unit": "mg"}}],
+        "allergies": [],
+    },
+})
+
+
+def feed_in(chunks):
+    parser = json_stream.IncrementalEntityParser()
+    emitted = []
+    for chunk in chunks:
+        emitted.append(parser.feed(chunk))
+    return parser, emitted
+
+
+def expected():
+    entities = json.loads(DOCUMENT)["extracted_entities"]
+    return [("conditions", e) for e in entities["conditions"]] + [("medications", e) for e in entities["medications"]]
+
+
+def test_one_character_chunks_split_every_token():
+    parser, emitted = feed_in(["```json\n"] + list(DOCUMENT) + ["\n```"])
+    assert [entity for batch in emitted for entity in batch] == expected()
+    assert parser.text.startswith("```json\n")
+
+
+def test_entity_is_emitted_when_its_object_closes():
+    first_end = DOCUMENT.index("}", DOCUMENT.index("negated")) + 1
+    parser, emitted = feed_in([DOCUMENT[:first_end - 1], DOCUMENT[first_end - 1:first_end], DOCUMENT[first_end:]])
+    assert emitted[0] == []
+    assert emitted[1] == expected()[:1]
+    assert emitted[2] == expected()[1:]
+
+
+def test_escaped_quotes_and_backslashes_split_across_chunks():
+    escape = DOCUMENT.index('\\"no')
+    parser, emitted = feed_in([DOCUMENT[:escape + 1], DOCUMENT[escape + 1:]])
+    assert [entity for batch in emitted for entity in batch] == expected()
+
+
+def test_nothing_is_emitted_after_the_root_closes():
+    parser, emitted = feed_in([DOCUMENT, '{"extracted_entities": {"conditions": [{"x": 1}]}}'])
+    assert emitted[1] == []
+
+
+def test_sse_event_format():
+    assert json_stream.sse_event("condition", {"clinical_text": "a\nb"}) == \
+        'event: condition\ndata: {"clinical_text": "a\\nb"}\n\n'
+
+
+def test_streamed_result_gets_the_interaction_annotation(monkeypatch):
+    import asyncio
+
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "healthbridge_ai"))
+    import gemini_client
+
+    document = json.dumps({"status": "success", "extracted_entities": {
+        "medications": [{"drug_name": "Warfarin 5 mg"}, {"drug_name": "Aspirin 81 mg"}]}})
+
+    async def stream_text(model, contents, generation_config=None):
+        for i in range(0, len(document), 7):
+            yield document[i:i + 7]
+
+    async def lookup(*args):
+        return None
+
+    monkeypatch.setattr(gemini_client, "GEMINI_AVAILABLE", True)
+    monkeypatch.setenv("GOOGLE_API_KEY", "test")
+    monkeypatch.setattr(gemini_client.llm_gateway, "stream_text", stream_text)
+    monkeypatch.setattr(gemini_client.llm_cache, "lookup", lookup)
+    monkeypatch.setattr(gemini_client.llm_cache, "store", lambda *args: None)
+
+    async def collect():
+        return [item async for item in gemini_client.stream_clinical_note_analysis("p1", "short note")]
+
+    events = asyncio.run(collect())
+    assert [event for event, _ in events] == ["medication", "medication", "result"]
+    interactions = events[-1][1]["clinical_validations"]["drug_interactions"]
+    assert [(i["drug_a"], i["drug_b"]) for i in interactions] == [("Warfarin 5 mg", "Aspirin 81 mg")]
@@ -0,0 +1,47 @@
+import asyncio
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from healthbridge_ai import llm_cache  # noqa: E402
+
+
+def stored_rows(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT key, value, accessed_at FROM llm_response_cache").fetchall()
+
+
+def test_disk_hits_are_read_off_the_loop_and_touched_in_batches(tmp_path):
+    path = str(tmp_path / "cache.db")
+    writer = llm_cache.ResponseCache(path)
+    writer.set("k", {"a": 1})
+    writer.flush()
+    (_, _, written_at), = stored_rows(path)
+
+    reader = llm_cache.ResponseCache(path, max_memory_entries=0)
+
+    async def read():
+        return [await reader.get_async("k") for _ in range(3)]
+
+    assert asyncio.run(read()) == [{"a": 1}] * 3
+    assert reader.stats["disk_hits"] == 3
+    assert stored_rows(path)[0][2] == written_at
+    reader.flush()
+    assert stored_rows(path)[0][2] > written_at
+
+
+def test_values_are_encrypted_at_rest_with_a_key(tmp_path):
+    fernet = pytest.importorskip("cryptography.fernet")
+    key = fernet.Fernet.generate_key().decode()
+    path = str(tmp_path / "cache.db")
+    cache = llm_cache.ResponseCache(path, encryption_key=key)
+    cache.set("k", {"patient": "Jane Doe"})
+    cache.flush()
+    assert "Jane" not in stored_rows(path)[0][1]
+    assert llm_cache.ResponseCache(path, encryption_key=key).get("k") == {"patient": "Jane Doe"}
+    # Read without the key, the entry is dropped rather than served or raised.
+    assert llm_cache.ResponseCache(path).get("k") is None
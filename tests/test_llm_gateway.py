@@ -0,0 +1,48 @@
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from healthbridge_ai import llm_gateway  # noqa: E402
+
+
+def test_timed_out_thread_keeps_its_slot_until_it_returns(monkeypatch):
+    monkeypatch.setattr(llm_gateway, "MAX_CONCURRENCY", 1)
+    monkeypatch.setattr(llm_gateway, "TIMEOUT_SECONDS", 0.05)
+    monkeypatch.setattr(llm_gateway, "_semaphores", {})
+    gate = threading.Event()
+    ran = []
+
+    async def main():
+        with pytest.raises(asyncio.TimeoutError):
+            await llm_gateway.run_blocking(gate.wait, 5)
+        assert llm_gateway.get_stats()["abandoned"] == 1
+        second = asyncio.ensure_future(llm_gateway.run_blocking(ran.append, "second"))
+        await asyncio.sleep(0.1)
+        # The first call's thread is still running, so the second has not started.
+        assert ran == [] and not second.done()
+        gate.set()
+        await second
+        assert ran == ["second"]
+        assert llm_gateway.get_stats()["abandoned"] == 0
+
+    asyncio.run(main())
+
+
+def test_slot_is_released_after_an_error(monkeypatch):
+    monkeypatch.setattr(llm_gateway, "MAX_CONCURRENCY", 1)
+    monkeypatch.setattr(llm_gateway, "_semaphores", {})
+
+    def fail():
+        raise RuntimeError("model error")
+
+    async def main():
+        with pytest.raises(RuntimeError):
+            await llm_gateway.run_blocking(fail)
+        return await llm_gateway.run_blocking(lambda: "ok")
+
+    assert asyncio.run(main()) == "ok"
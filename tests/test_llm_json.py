@@ -0,0 +1,44 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from healthbridge_ai import llm_cache, llm_json  # noqa: E402
+
+
+def test_truncated_entity_is_dropped_not_kept_in_part():
+    text = ('{"extracted_entities": {"conditions": [{"clinical_text": "fever", "negated": false},'
+            ' {"clinical_text": "chest pain", "negated')
+    value = llm_json.parse_llm_json(text, "analysis")
+    assert [c["clinical_text"] for c in value["extracted_entities"]["conditions"]] == ["fever"]
+    assert not llm_cache.cacheable(value)
+
+
+def test_truncated_nested_value_is_cut_at_an_array_element():
+    assert llm_json.extract_json('[{"name": "a", "tags": ["x"]}, {"name": "b", "tags": ["x", "y') == [
+        {"name": "a", "tags": ["x"]}]
+    assert llm_json.extract_json('{"a": 1, "b": {"c": 2, "d') == {"a": 1}
+
+
+def test_bracketed_prose_before_json_is_skipped():
+    assert llm_json.extract_json('Here [note]: {"a": [1, 2]}') == {"a": [1, 2]}
+    assert llm_json.extract_json('See [1] above (and [ref]).\n```json\n{"a": 1}\n```') == {"a": 1}
+
+
+def test_clean_output_is_cacheable():
+    assert llm_cache.cacheable(llm_json.parse_llm_json('{"interactions": []}', "interactions"))
+
+
+def test_repaired_output_is_returned_but_not_cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, "_default_cache", llm_cache.ResponseCache(str(tmp_path / "cache.db")))
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return llm_json.parse_llm_json('{"interactions": [{"drug_a": "a", "drug_b": "b"}, {"drug_a": "c"', "interactions")
+
+    for _ in range(2):
+        result = asyncio.run(llm_cache.cached_call("check-interactions", "a\nb\nc", "v1", "model", compute))
+        assert [i["drug_a"] for i in result["interactions"]] == ["a"]
+    assert len(calls) == 2
@@ -0,0 +1,55 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from healthbridge_ai import note_chunking  # noqa: E402
+
+SYMPTOMS = [f"symptom {i}" for i in range(70)]
+
+
+def make_note():
+    return ("HPI:\n" + "Patient presents with cough. " * 300 + "\n\n"
+            "Review of Systems:\nPatient denies the following:\n" + "\n".join(f"- {s}" for s in SYMPTOMS) + "\n\n"
+            "Plan:\n" + "Continue current medications. " * 200 + "\n")
+
+
+def test_split_list_keeps_header_and_lead_in():
+    chunks = note_chunking.chunk_note(make_note(), token_budget=1500)
+    with_items = [c for c in chunks if "- symptom" in c]
+    assert len(with_items) > 1
+    for chunk in with_items:
+        assert "Patient denies the following:" in chunk
+        assert chunk.startswith(("Review of Systems", "HPI"))
+    assert sum(c.count("- symptom") for c in chunks) == len(SYMPTOMS)
+
+
+def test_lead_in_ends_at_blank_line():
+    assert note_chunking._lead_in("ROS:\nPatient denies the following:\n- fever\n") == "Patient denies the following:"
+    assert note_chunking._lead_in("Patient denies the following:\n- fever\n\nExam was normal.") == ""
+    assert note_chunking._lead_in("Review of Systems:\n- fever\n") == ""
+
+
+def test_merge_keeps_negated_and_affirmed_findings_apart():
+    merged = note_chunking.merge_analyses([
+        {"extracted_entities": {"conditions": [{"clinical_text": "Chest pain", "negated": True, "confidence": 80}]}},
+        {"extracted_entities": {"conditions": [{"clinical_text": "chest pain", "confidence": 70},
+                                               {"clinical_text": "chest pain", "negated": True, "confidence": 95}]}},
+    ])
+    conditions = merged["extracted_entities"]["conditions"]
+    assert [(c.get("negated", False), c["confidence"]) for c in conditions] == [(True, 95), (False, 70)]
+
+
+def test_analyze_chunked_merges_in_note_order():
+    async def analyze(chunk):
+        await asyncio.sleep(0.001 * (10 - chunk.count("- symptom") % 10))
+        items = [line[2:] for line in chunk.splitlines() if line.startswith("- symptom")]
+        negated = "Patient denies the following:" in chunk
+        return {"extracted_entities": {"conditions": [{"clinical_text": s, "negated": negated} for s in items]}}
+
+    merged = asyncio.run(note_chunking.analyze_chunked(make_note(), analyze, token_budget=1500))
+    conditions = merged["extracted_entities"]["conditions"]
+    assert [c["clinical_text"] for c in conditions] == SYMPTOMS
+    assert all(c["negated"] for c in conditions)
+    assert merged["chunk_count"] > 1
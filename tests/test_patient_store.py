@@ -0,0 +1,104 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "patient_service"))
+
+import patient_store  # noqa: E402
+
+
+def rollups(store, user_id):
+    return {granularity: store.get_rollups(user_id, granularity, "2000-01-01")
+            for granularity in patient_store.GRANULARITIES}
+
+
+def test_incremental_rollups_match_a_rebuild():
+    store = patient_store.PatientStore(snapshot_path="")
+    now = datetime.utcnow()
+    for i, (medication_id, status, timestamp) in enumerate([
+            ("m1", "taken", now.isoformat()), ("m1", "missed", "not a time"),
+            ("m2", "taken", (now - timedelta(days=9)).isoformat() + "Z"), ("m1", "taken", None)]):
+        store.add_adherence("alice", {"id": str(i), "medication_id": medication_id, "status": status,
+                                      "timestamp": timestamp})
+    incremental = rollups(store, "alice")
+    assert store.rebuild_rollups("alice") == {"events": 2, "skipped": 2}
+    assert rollups(store, "alice") == incremental
+    # Unparseable logs are still stored, just not counted.
+    assert len(store.get_adherence("alice")) == 4
+
+
+def populated_store(snapshot_path=""):
+    store = patient_store.PatientStore(snapshot_path=snapshot_path, lock_stripes=4)
+    store.add_medication("alice", {"id": "m1", "name": "Metformin", "dosage": "500mg", "frequency": "BID",
+                                   "created_at": "2026-01-01T00:00:00", "notes": "with food"})
+    store.add_medication("bob", {"id": "m2", "name": "Lisinopril", "dosage": "10mg", "frequency": "daily",
+                                 "created_at": "2026-01-01T00:00:00"})
+    # Out of order on purpose: late arrivals are inserted in time order.
+    for log_id, timestamp, status in [("a", "2026-03-02T08:00:00", "taken"), ("b", "2026-03-01T08:00:00", "taken"),
+                                      ("c", "2026-03-02T08:00:00+02:00", "missed"), ("d", "2026-03-09T08:00:00Z", "taken")]:
+        store.add_adherence("alice", {"id": log_id, "medication_id": "m1", "status": status, "timestamp": timestamp,
+                                      "source": "app"})
+    return store
+
+
+def test_adherence_is_indexed_by_time_and_user():
+    store = populated_store()
+    assert [r["id"] for r in store.get_adherence("alice")] == ["b", "c", "a", "d"]
+    assert [r["id"] for r in store.get_adherence("alice", datetime(2026, 3, 2), datetime(2026, 3, 2, 8))] == ["c"]
+    assert [r["id"] for r in store.get_adherence("alice", start=datetime(2026, 3, 2, 8))] == ["a", "d"]
+    assert store.get_adherence("bob") == [] and store.get_adherence("nobody") == []
+    assert store.get_adherence("alice")[0]["source"] == "app"
+    assert [m["name"] for m in store.get_medications("alice")] == ["Metformin"]
+    assert store.get_medication("alice", "m1")["notes"] == "with food"
+    assert store.get_medication("alice", "m2") is None
+
+
+def test_rollups_count_per_day_and_week():
+    store = populated_store()
+    daily = store.get_rollups("alice", "day", "2026-03-02")
+    assert [(r["period_start"], r["taken"], r["missed"]) for r in daily] == [("2026-03-02", 1, 1), ("2026-03-09", 1, 0)]
+    weekly = store.get_rollups("alice", "week", "2026-01-01")
+    assert [(r["period_start"], r["taken"], r["total"]) for r in weekly] == [("2026-02-23", 1, 1),
+                                                                             ("2026-03-02", 1, 2), ("2026-03-09", 1, 1)]
+
+
+def test_rebuild_rollups_for_one_user_or_everyone():
+    store = populated_store()
+    before = rollups(store, "alice")
+    with store.user("alice") as user:
+        user.daily = {("m1", 1): 99}
+    assert store.rebuild_rollups("alice") == {"events": 4, "skipped": 0}
+    assert rollups(store, "alice") == before
+    assert store.rebuild_rollups() == {"events": 4, "skipped": 0}
+    assert rollups(store, "alice") == before
+
+
+def test_snapshot_and_load_round_trip(tmp_path, monkeypatch):
+    path = str(tmp_path / "patients.snapshot")
+    monkeypatch.setattr(patient_store, "SNAPSHOT_CHUNK_USERS", 1)
+    store = populated_store(path)
+    store.add_adherence("carol", {"id": "z", "medication_id": "m9", "status": "taken", "timestamp": "2026-03-03"})
+    assert store.snapshot()["users"] == 3
+    assert store.get_stats()["unsnapshotted_writes"] == 0
+
+    loaded = patient_store.PatientStore(snapshot_path=path)
+    assert loaded.load() == 3
+    for user_id in ("alice", "bob", "carol"):
+        assert loaded.get_medications(user_id) == store.get_medications(user_id)
+        assert loaded.get_adherence(user_id) == store.get_adherence(user_id)
+        assert rollups(loaded, user_id) == rollups(store, user_id)
+    # The loaded series keeps its index: range queries and late inserts still work.
+    loaded.add_adherence("alice", {"id": "e", "medication_id": "m1", "status": "taken", "timestamp": "2026-03-01T09:00:00"})
+    assert [r["id"] for r in loaded.get_adherence("alice", end=datetime(2026, 3, 2))] == ["b", "e"]
+    assert patient_store.PatientStore(snapshot_path=str(tmp_path / "missing")).load() == 0
+
+
+def test_load_rejects_other_snapshot_versions(tmp_path, monkeypatch):
+    path = str(tmp_path / "patients.snapshot")
+    populated_store(path).snapshot()
+    monkeypatch.setattr(patient_store, "SNAPSHOT_VERSION", 2)
+    with pytest.raises(ValueError):
+        patient_store.PatientStore(snapshot_path=path).load()
@@ -0,0 +1,29 @@
+import os
+import sys
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from api import models, principals  # noqa: E402
+from api.database import Base  # noqa: E402
+
+
+def test_username_change_drops_old_and_new_entries():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    exp = int(time.time()) + 3600
+    principals.cache.clear()
+    with Session(engine) as session:
+        user = models.User(username="alice", full_name="Alice", password_hash="x")
+        session.add(user)
+        session.commit()
+        principals.cache.put("alice", exp, user)
+        principals.cache.put("alice2", exp, user)
+
+        user.username = "alice2"
+        session.commit()
+    assert principals.cache.get("alice", exp) is None
+    assert principals.cache.get("alice2", exp) is None
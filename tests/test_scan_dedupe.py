@@ -0,0 +1,51 @@
+import asyncio
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from healthbridge_ai import scan_dedupe  # noqa: E402
+
+
+def test_lookup_and_store_run_sqlite_off_the_event_loop(monkeypatch, tmp_path):
+    index = scan_dedupe.ScanIndex(str(tmp_path / "scans.db"), perceptual=True)
+    monkeypatch.setattr(scan_dedupe, "_default_index", index)
+    threads = []
+    for name in ("find", "add"):
+        method = getattr(index, name)
+
+        def record(*args, _method=method):
+            threads.append(threading.get_ident())
+            return _method(*args)
+        monkeypatch.setattr(index, name, record)
+
+    info = {"sha256": "abc", "dhash": 0b1011}
+    near = {"sha256": "def", "dhash": 0b1010}
+
+    async def main():
+        assert await scan_dedupe.lookup(info, "v1") is None
+        await scan_dedupe.store(info, "v1", {"medications": [{"name": "amoxicillin"}]})
+        return threading.get_ident(), await scan_dedupe.lookup(info, "v1"), await scan_dedupe.lookup(near, "v1")
+
+    loop_thread, exact, similar = asyncio.run(main())
+    assert exact["cached"] and "requires_review" not in exact
+    assert similar["requires_review"] and similar["hash_distance"] == 1
+    assert threads and loop_thread not in threads
+
+
+def test_encrypted_results_are_not_stored_in_plaintext(tmp_path):
+    from cryptography.fernet import Fernet
+
+    path = str(tmp_path / "scans.db")
+    index = scan_dedupe.ScanIndex(path, encryption_key=Fernet.generate_key().decode())
+    index.add("abc", None, "v1", {"raw_text": "Amoxicillin 500mg"})
+    with open(path, "rb") as f:
+        assert b"Amoxicillin" not in f.read()
+    assert index.find("abc", None, "v1") == ({"raw_text": "Amoxicillin 500mg"}, None)
+
+    # Another key (or none) cannot read the row; it is a miss, not an error.
+    other = scan_dedupe.ScanIndex(path, encryption_key=Fernet.generate_key().decode())
+    assert other.find("abc", None, "v1") is None
+    assert scan_dedupe.ScanIndex(path).find("abc", None, "v1") is None
+    assert other.stats["unreadable"] == 1
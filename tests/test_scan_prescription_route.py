@@ -0,0 +1,31 @@
+import asyncio
+import importlib.util
+import os
+import sys
+
+import pytest
+from fastapi import HTTPException
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "healthbridge_ai"))
+
+spec = importlib.util.spec_from_file_location("healthbridge_ai_main", os.path.join(ROOT, "healthbridge_ai", "main.py"))
+ai_main = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(ai_main)
+
+
+@pytest.mark.parametrize("error, status", [
+    (ai_main.image_prep.UploadTooLarge("too big"), 413),
+    (ai_main.image_prep.UnsupportedImage("corrupt"), 415),
+    (asyncio.TimeoutError(), 503),
+    (ai_main.llm_json.LLMJSONError("truncated"), 502),
+    (RuntimeError("model unavailable"), 502),
+])
+def test_scan_errors_map_to_http_statuses(monkeypatch, error, status):
+    async def failing(upload):
+        raise error
+    monkeypatch.setattr(ai_main, "extract_prescription_data", failing)
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(ai_main.scan_prescription(None))
+    assert raised.value.status_code == status
+    assert raised.value.detail
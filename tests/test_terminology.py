@@ -0,0 +1,46 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from healthbridge_ai import terminology  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def index():
+    return terminology.TerminologyIndex(terminology.compile_index(
+        terminology.read_concepts(terminology.TERMINOLOGY_SOURCES)))
+
+
+@pytest.mark.parametrize("system, code, display", [
+    ("icd10", "I25.2", "Old myocardial infarction"),
+    ("icd10", "Z86.79", "Personal history of myocardial infarction"),
+    ("icd10", "E11.22", "Type 2 diabetes mellitus with diabetic chronic kidney disease"),
+    ("rxnorm", "1234567", "metformin extended release"),
+])
+def test_well_formed_unknown_code_is_kept_unverified(index, system, code, display):
+    result = index.check(system, code, display)
+    assert result["status"] == "unverified"
+    assert result["code"] == code
+
+
+def test_known_code_is_verified_and_canonicalized(index):
+    result = index.check("icd10", "i219", "anything")
+    assert (result["code"], result["status"]) == ("I21.9", "verified")
+
+
+def test_exact_name_or_synonym_fills_and_corrects(index):
+    assert index.check("icd10", None, "Heart attack")["code"] == "I21.9"
+    assert index.check("icd10", None, "Heart attack")["status"] == "filled"
+    corrected = index.check("rxnorm", "not-a-code", "Glucophage")
+    assert (corrected["code"], corrected["status"]) == ("6809", "corrected")
+
+
+def test_sub_phrase_does_not_resolve(index):
+    assert index.resolve("icd10", "old myocardial infarction") is None
+    assert index.resolve("rxnorm", "metformin extended release") is None
+    assert index.check("icd10", None, "old myocardial infarction")["status"] == "missing"
+    assert index.check("icd10", "XYZ", "old myocardial infarction") == {
+        "system": "icd10", "code": None, "display": "old myocardial infarction", "status": "invalid"}